@@ -11,6 +11,7 @@ Usage:
   python baseline_joke_gen.py --interactive
   python baseline_joke_gen.py --enhanced "Your prompt here" --num-jokes 3
   python baseline_joke_gen.py --enhanced "Your prompt here" --save-raw --output jokes.json
+  python baseline_joke_gen.py --enhanced "Your prompt here" -n 200 --chunk-size 5 --parallel 8
 """
 
 import sys
@@ -19,8 +20,11 @@ import json
 import argparse
 import os
 import re
-from openai import OpenAI
-from utils.config import get_api_base_url, get_openai_key, DEFAULT_MODEL
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import get_openai_key, DEFAULT_MODEL
+from utils.deadline import DeadlineExceeded, deadline_expired
+from utils.llm import chat_completion, stage_output_limits
 
 def _extract_json_from_text(text):
     """
@@ -194,7 +198,95 @@ def _parse_jokes_from_response(raw_content):
     
     return jokes_data
 
-def generate_joke(prompt: str, num_jokes: int = 1, model: str = DEFAULT_MODEL, enhanced: bool = False, save_raw: bool = False) -> tuple:
+def _build_prompts(prompt: str, num_jokes: int, enhanced: bool) -> tuple:
+    """Return the (system, user) prompts for a baseline request."""
+    if enhanced:
+        # Enhanced prompt that includes some elements from the multi-stage approach
+        # but still in a single step, now with a clear JSON example
+        system_prompt = (
+            "You are a professional comedy writer with expertise in joke construction. "
+            "Create original, well-crafted jokes based on the given theme. "
+            "Consider different joke types (observational, character-based, absurdist, etc.) "
+            "and tones (witty, sarcastic, lighthearted, etc.) to create diverse jokes. "
+            "Format your output as well-structured JSON."
+        )
+        
+        user_prompt = (
+            f"Theme: {prompt}\n\n"
+            f"Please generate {num_jokes} distinct, high-quality joke(s) about this theme. For each joke:\n"
+            f"1. Think about a specific angle or observation related to the theme\n"
+            f"2. Consider what joke structure would work best (setup-punchline, misdirection, character-based, etc.)\n"
+            f"3. Include key elements that make the joke work (irony, absurdity, wordplay, etc.)\n"
+            f"4. Use an appropriate tone for maximum comedic effect\n"
+            f"5. Write a complete, polished joke\n\n"
+            f"Format your response as a JSON object using EXACTLY this structure:\n\n"
+            f"{{\n"
+            f"  \"jokes\": [\n"
+            f"    {{\n"
+            f"      \"text\": \"The actual joke goes here with setup and punchline.\",\n"
+            f"      \"type\": \"The style of joke (Observational, Wordplay, etc.)\",\n"
+            f"      \"approach\": \"Brief explanation of the comedic technique used\",\n"
+            f"      \"tone\": \"The emotional tone (Sarcastic, Absurd, etc.)\"\n"
+            f"    }},\n"
+            f"    {{\n"
+            f"      \"text\": \"A second joke if multiple were requested.\",\n"
+            f"      \"type\": \"Another joke style\",\n"
+            f"      \"approach\": \"Another comedic technique\",\n"
+            f"      \"tone\": \"Another tone\"\n"
+            f"    }}\n"
+            f"  ]\n"
+            f"}}\n"
+            f"```\n\n"
+            f"Make sure your response contains only this JSON object and nothing else."
+        )
+    else:
+        # Basic prompt - simpler but still with clear JSON example
+        system_prompt = (
+            "You are a professional comedy writer. Create funny, original jokes based on the given prompt. "
+            "Each joke should be concise, clever, and entertaining. "
+            "Return your output as JSON."
+        )
+        
+        user_prompt = (
+            f"Write {num_jokes} funny joke(s) about: {prompt}.\n\n"
+            f"Format your response as a JSON object using EXACTLY this structure:\n\n"
+            f"{{\n"
+            f"  \"jokes\": [\n"
+            f"    {{\n"
+            f"      \"text\": \"The full joke goes here.\",\n"
+            f"      \"type\": \"The type of joke (Pun, One-liner, etc.)\"\n"
+            f"    }},\n"
+            f"    {{\n"
+            f"      \"text\": \"Another joke if more than one is requested.\",\n"
+            f"      \"type\": \"Another joke type\"\n"
+            f"    }}\n"
+            f"  ]\n"
+            f"}}\n"
+            f"```\n\n"
+            f"Return ONLY the JSON. Include exactly {num_jokes} joke(s) in your response."
+        )
+    
+    return system_prompt, user_prompt
+
+def _build_jokes(parsed_jokes: list, prompt: str, model: str, enhanced: bool) -> list:
+    """Convert parsed joke dicts into baseline joke records."""
+    jokes = []
+    for joke_data in parsed_jokes:
+        if isinstance(joke_data, dict) and "text" in joke_data:
+            jokes.append({
+                "id": str(uuid.uuid4()),
+                "prompt": prompt,
+                "text": joke_data["text"],
+                "type": joke_data.get("type", "General"),
+                "tone": joke_data.get("tone", "Standard"),
+                "approach": joke_data.get("approach", "Direct humor"),
+                "model": model,
+                "method": "enhanced_baseline" if enhanced else "basic_baseline"
+            })
+    return jokes
+
+def generate_joke(prompt: str, num_jokes: int = 1, model: str = DEFAULT_MODEL, enhanced: bool = False, save_raw: bool = False,
+                  batch_note: str = None) -> tuple:
     """
     Generate jokes directly from a prompt without using the multi-stage framework.
     
@@ -204,6 +296,7 @@ def generate_joke(prompt: str, num_jokes: int = 1, model: str = DEFAULT_MODEL, e
         model: The OpenAI model to use
         enhanced: Whether to use an enhanced prompt for fairer comparison
         save_raw: Whether to return the raw LLM response
+        batch_note: Optional extra instruction appended to the prompt (used by chunked generation)
         
     Returns:
         tuple: (list of joke dictionaries, raw response if save_raw=True else None)
@@ -216,117 +309,42 @@ def generate_joke(prompt: str, num_jokes: int = 1, model: str = DEFAULT_MODEL, e
     print(f"Using {'enhanced' if enhanced else 'basic'} prompting")
     
     try:
-        # Use API endpoint from configuration
-        api_base_url = get_api_base_url()
-        api_key = get_openai_key()
-        
-        client = OpenAI(base_url=api_base_url, api_key=api_key)
-        
-        if not api_key:
+        if not get_openai_key():
             print("Error: OPENAI_API_KEY not configured")
             return [], None
         
-        if enhanced:
-            # Enhanced prompt that includes some elements from the multi-stage approach
-            # but still in a single step, now with a clear JSON example
-            system_prompt = (
-                "You are a professional comedy writer with expertise in joke construction. "
-                "Create original, well-crafted jokes based on the given theme. "
-                "Consider different joke types (observational, character-based, absurdist, etc.) "
-                "and tones (witty, sarcastic, lighthearted, etc.) to create diverse jokes. "
-                "Format your output as well-structured JSON."
-            )
-            
-            user_prompt = (
-                f"Theme: {prompt}\n\n"
-                f"Please generate {num_jokes} distinct, high-quality joke(s) about this theme. For each joke:\n"
-                f"1. Think about a specific angle or observation related to the theme\n"
-                f"2. Consider what joke structure would work best (setup-punchline, misdirection, character-based, etc.)\n"
-                f"3. Include key elements that make the joke work (irony, absurdity, wordplay, etc.)\n"
-                f"4. Use an appropriate tone for maximum comedic effect\n"
-                f"5. Write a complete, polished joke\n\n"
-                f"Format your response as a JSON object using EXACTLY this structure:\n\n"
-                f"{{\n"
-                f"  \"jokes\": [\n"
-                f"    {{\n"
-                f"      \"text\": \"The actual joke goes here with setup and punchline.\",\n"
-                f"      \"type\": \"The style of joke (Observational, Wordplay, etc.)\",\n"
-                f"      \"approach\": \"Brief explanation of the comedic technique used\",\n"
-                f"      \"tone\": \"The emotional tone (Sarcastic, Absurd, etc.)\"\n"
-                f"    }},\n"
-                f"    {{\n"
-                f"      \"text\": \"A second joke if multiple were requested.\",\n"
-                f"      \"type\": \"Another joke style\",\n"
-                f"      \"approach\": \"Another comedic technique\",\n"
-                f"      \"tone\": \"Another tone\"\n"
-                f"    }}\n"
-                f"  ]\n"
-                f"}}\n"
-                f"```\n\n"
-                f"Make sure your response contains only this JSON object and nothing else."
-            )
-        else:
-            # Basic prompt - simpler but still with clear JSON example
-            system_prompt = (
-                "You are a professional comedy writer. Create funny, original jokes based on the given prompt. "
-                "Each joke should be concise, clever, and entertaining. "
-                "Return your output as JSON."
-            )
-            
-            user_prompt = (
-                f"Write {num_jokes} funny joke(s) about: {prompt}.\n\n"
-                f"Format your response as a JSON object using EXACTLY this structure:\n\n"
-                f"{{\n"
-                f"  \"jokes\": [\n"
-                f"    {{\n"
-                f"      \"text\": \"The full joke goes here.\",\n"
-                f"      \"type\": \"The type of joke (Pun, One-liner, etc.)\"\n"
-                f"    }},\n"
-                f"    {{\n"
-                f"      \"text\": \"Another joke if more than one is requested.\",\n"
-                f"      \"type\": \"Another joke type\"\n"
-                f"    }}\n"
-                f"  ]\n"
-                f"}}\n"
-                f"```\n\n"
-                f"Return ONLY the JSON. Include exactly {num_jokes} joke(s) in your response."
-            )
+        system_prompt, user_prompt = _build_prompts(prompt, num_jokes, enhanced)
+        
+        if batch_note:
+            user_prompt += f"\n\n{batch_note}"
         
         # Call API with appropriate prompt
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+        raw_response_content = chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
+            model=model,
             temperature=0.8,
+            stage="baseline",
+            **stage_output_limits("baseline", items=num_jokes),
         )
         
-        raw_response_content = response.choices[0].message.content
         print(f"Raw LLM Response (first 200 chars): {raw_response_content[:200]}...")
         
         # Parse jokes from the response
         parsed_jokes = _parse_jokes_from_response(raw_response_content)
         
-        jokes = []
-        for i, joke_data in enumerate(parsed_jokes[:num_jokes]):  # Limit to requested number
-            if isinstance(joke_data, dict) and "text" in joke_data:
-                joke = {
-                    "id": str(uuid.uuid4()),
-                    "prompt": prompt,
-                    "text": joke_data["text"],
-                    "type": joke_data.get("type", "General"),
-                    "tone": joke_data.get("tone", "Standard"),
-                    "approach": joke_data.get("approach", "Direct humor"),
-                    "model": model,
-                    "method": "enhanced_baseline" if enhanced else "basic_baseline"
-                }
-                jokes.append(joke)
-                print(f"\nJoke {i+1}:\n{joke['text']}")
-                print(f"Type: {joke['type']}, Tone: {joke['tone']}")
+        jokes = _build_jokes(parsed_jokes[:num_jokes], prompt, model, enhanced)  # Limit to requested number
+        for i, joke in enumerate(jokes):
+            print(f"\nJoke {i+1}:\n{joke['text']}")
+            print(f"Type: {joke['type']}, Tone: {joke['tone']}")
         
         return jokes, raw_response_content if save_raw else None
     
+    except DeadlineExceeded as e:
+        print(f"Baseline chunk not generated: {e}")
+        return [], None
     except Exception as e:
         print(f"Error generating jokes: {str(e)}")
         import traceback
@@ -334,51 +352,320 @@ def generate_joke(prompt: str, num_jokes: int = 1, model: str = DEFAULT_MODEL, e
         return [], None
 
 
-def interactive_mode(enhanced: bool = False, save_raw: bool = False, output_file: str = None):
-    """Run the joke generator in interactive mode"""
+def _joke_key(text: str) -> tuple:
+    """Normalized word tuple used to detect duplicate jokes."""
+    return tuple(re.findall(r"[a-z0-9']+", text.lower()))
+
+def _is_duplicate(words: tuple, seen: list, threshold: float = 0.8) -> bool:
+    """True if words match an earlier joke exactly or by word-set Jaccard similarity >= threshold."""
+    word_set = set(words)
+    for other_words, other_set in seen:
+        if words == other_words:
+            return True
+        union = word_set | other_set
+        if union and len(word_set & other_set) / len(union) >= threshold:
+            return True
+    return False
+
+def generate_jokes_chunked(prompt: str, num_jokes: int, chunk_size: int = None, model: str = DEFAULT_MODEL,
+                           enhanced: bool = False, save_raw: bool = False, max_parallel: int = None) -> tuple:
+    """
+    Generate a large baseline set as parallel requests of chunk_size jokes each.
+    
+    One completion for hundreds of jokes is slow and often truncated or
+    malformed; small chunks stay well-formed and run concurrently, so the set
+    takes roughly the time of one chunk per wave of max_parallel requests.
+    Chunk results are merged and near-duplicates (same words, or word-set
+    Jaccard similarity >= 0.8) dropped; one follow-up round tops up any
+    shortfall.
+    
+    Args:
+        prompt: The joke prompt or theme
+        num_jokes: Number of jokes to generate
+        chunk_size: Jokes per request (default: BASELINE_CHUNK_SIZE from configuration)
+        model: The OpenAI model to use
+        enhanced: Whether to use an enhanced prompt for fairer comparison
+        save_raw: Whether to return the raw LLM responses
+        max_parallel: Concurrent requests (default: BASELINE_MAX_PARALLEL from configuration)
+        
+    Returns:
+        tuple: (list of joke dictionaries, joined raw responses if save_raw=True else None)
+    """
+    from utils.config import BASELINE_CHUNK_SIZE, BASELINE_MAX_PARALLEL
+    chunk_size = max(1, chunk_size or BASELINE_CHUNK_SIZE)
+    max_parallel = max(1, max_parallel or BASELINE_MAX_PARALLEL)
+    if num_jokes <= chunk_size:
+        return generate_joke(prompt, num_jokes, model, enhanced=enhanced, save_raw=save_raw)
+    
+    jokes, raw_responses, seen = [], [], []
+    
+    def run_round(count: int, round_label: str):
+        sizes = [chunk_size] * (count // chunk_size) + ([count % chunk_size] if count % chunk_size else [])
+        print(f"\nGenerating {count} baseline jokes as {len(sizes)} parallel chunks of up to {chunk_size} ({round_label})")
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(sizes)), thread_name_prefix="baseline-chunk") as executor:
+            futures = [
+                executor.submit(
+                    generate_joke, prompt, size, model, enhanced, save_raw,
+                    f"This is batch {i + 1} of {len(sizes)} generated in parallel: pick angles, "
+                    f"joke types and tones that other batches are unlikely to use."
+                )
+                for i, size in enumerate(sizes)
+            ]
+            for future in futures:
+                chunk_jokes, raw = future.result()
+                if raw:
+                    raw_responses.append(raw)
+                for joke in chunk_jokes:
+                    words = _joke_key(joke["text"])
+                    if len(jokes) < num_jokes and words and not _is_duplicate(words, seen):
+                        seen.append((words, set(words)))
+                        jokes.append(joke)
+    
+    run_round(num_jokes, "initial round")
+    if len(jokes) < num_jokes and not deadline_expired():
+        run_round(num_jokes - len(jokes), "top-up after dedup")
+    
+    print(f"\nMerged {len(jokes)} unique baseline jokes (requested {num_jokes})")
+    return jokes, "\n\n".join(raw_responses) if save_raw else None
+
+
+class StreamBuffer:
+    """
+    Content fragments of one streaming generation, shared between the thread
+    that receives them and the display.
+
+    follow() replays everything received so far and then the live fragments,
+    so a batch can be shown whether it is finished, half-streamed or not yet
+    started.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.cancelled = False
+        self.content = None
+        self.error = None
+
+    def append(self, fragment: str):
+        with self._cond:
+            self.chunks.append(fragment)
+            self._cond.notify_all()
+
+    def finish(self, content: str = None, error: Exception = None):
+        with self._cond:
+            self.content = content if content is not None else "".join(self.chunks)
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Ask the generating thread to close its stream."""
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def follow(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                if i >= len(self.chunks):
+                    return
+                fragment = self.chunks[i]
+            i += 1
+            yield fragment
+
+
+class _JokeTextStreamer:
+    """
+    Prints the "text" values of a streaming {"jokes": [...]} response as they
+    arrive, decoding JSON string escapes on the fly.
+    """
+
+    _TEXT_KEY = re.compile(r'"text"\s*:\s*"')
+    _ESCAPES = {"n": "\n", "t": "\t", "r": "", '"': '"', "\\": "\\", "/": "/", "b": "", "f": ""}
+
+    def __init__(self, limit: int = None):
+        self.raw = ""
+        self.pos = 0
+        self.in_text = False
+        self.count = 0
+        self.limit = limit
+
+    def feed(self, fragment: str):
+        self.raw += fragment
+        while self.pos < len(self.raw):
+            if not self.in_text:
+                if self.limit is not None and self.count >= self.limit:
+                    return
+                match = self._TEXT_KEY.search(self.raw, self.pos)
+                if not match:
+                    # Keep the tail in case the key is split across fragments
+                    self.pos = max(self.pos, len(self.raw) - 16)
+                    return
+                self.pos = match.end()
+                self.in_text = True
+                self.count += 1
+                print(f"\nJoke {self.count}:")
+                continue
+
+            char = self.raw[self.pos]
+            if char == "\\":
+                if self.pos + 1 >= len(self.raw):
+                    return
+                code = self.raw[self.pos + 1]
+                if code == "u":
+                    if self.pos + 6 > len(self.raw):
+                        return
+                    try:
+                        out = chr(int(self.raw[self.pos + 2:self.pos + 6], 16))
+                    except ValueError:
+                        out = ""
+                    self.pos += 6
+                else:
+                    out = self._ESCAPES.get(code, code)
+                    self.pos += 2
+                sys.stdout.write(out)
+            elif char == '"':
+                self.in_text = False
+                self.pos += 1
+                sys.stdout.write("\n")
+            else:
+                sys.stdout.write(char)
+                self.pos += 1
+        sys.stdout.flush()
+
+
+def _start_generation(prompt: str, num_jokes: int, model: str, enhanced: bool,
+                      avoid: list = None) -> StreamBuffer:
+    """Stream a batch of jokes into a StreamBuffer from a background thread."""
+    from utils.llm import stream_chat_completion
+
+    system_prompt, user_prompt = _build_prompts(prompt, num_jokes, enhanced)
+    if avoid:
+        user_prompt += "\n\nDo not repeat or paraphrase these earlier jokes:\n" + "\n".join(
+            f"- {text}" for text in avoid[-20:])
+    buffer = StreamBuffer()
+
+    def run():
+        try:
+            content = stream_chat_completion(
+                [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+                model=model,
+                temperature=0.8,
+                stage="baseline",
+                on_delta=buffer.append,
+                should_stop=lambda: buffer.cancelled,
+                **stage_output_limits("baseline", items=num_jokes),
+            )
+            buffer.finish(content)
+        except Exception as e:
+            buffer.finish(error=e)
+
+    threading.Thread(target=run, daemon=True, name="interactive-stream").start()
+    return buffer
+
+
+def _append_turn(output_file: str, turn: dict):
+    """Append one session turn to a JSON Lines file."""
+    try:
+        with open(output_file, "a") as f:
+            f.write(json.dumps(turn) + "\n")
+    except OSError as e:
+        print(f"Error saving session turn: {e}")
+
+
+def _save_sessions(output_file: str, sessions: list):
+    """Write the session's turns so far as one {"sessions": [...]} JSON file."""
+    try:
+        with open(output_file, "w") as f:
+            json.dump({"sessions": sessions}, f, indent=2)
+    except OSError as e:
+        print(f"Error saving session results: {e}")
+
+
+def interactive_mode(enhanced: bool = False, save_raw: bool = False, output_file: str = None,
+                     model: str = DEFAULT_MODEL):
+    """
+    Run the joke generator in interactive mode.
+    
+    Jokes stream to the terminal as they are generated. While the user reads a
+    batch, the next batch for the same theme is generated in the background,
+    so "more" (or just Enter) usually shows it instantly; starting a new theme
+    cancels that prefetch. As soon as a turn completes it is appended to
+    output_file as one JSON line if the path ends in .jsonl; any other path
+    gets the whole session as one {"sessions": [...]} JSON file, rewritten
+    after every turn.
+    """
     print("===== Baseline Joke Generator (Interactive Mode) =====")
     print(f"Using {'enhanced' if enhanced else 'basic'} prompting")
     print(f"{'Saving' if save_raw else 'Not saving'} raw LLM responses")
-    print("Type 'exit' or 'quit' to end the session\n")
+    append_turns = bool(output_file) and output_file.endswith(".jsonl")
+    if output_file:
+        print(f"{'Appending each turn to' if append_turns else 'Saving the session to'} {output_file}")
+    print("Type 'more' or press Enter for more jokes on the current theme, 'exit' or 'quit' to end the session\n")
     
-    all_results = {"sessions": []}
+    theme, num_jokes, shown, prefetch = None, 1, [], None
+    sessions = []
     
     while True:
-        prompt = input("\nEnter a joke prompt/theme: ")
+        try:
+            prompt = input("\nEnter a joke prompt/theme: ").strip()
+        except EOFError:
+            prompt = "exit"
         if prompt.lower() in ['exit', 'quit']:
+            if prefetch is not None:
+                prefetch.cancel()
             print("Exiting interactive mode.")
             break
-            
-        try:
-            num_jokes = int(input("How many jokes would you like? [1-5]: "))
-            num_jokes = max(1, min(5, num_jokes))  # Limit between 1-5
-        except ValueError:
-            num_jokes = 1
-            print("Invalid number, generating 1 joke.")
         
-        jokes, raw_response = generate_joke(prompt, num_jokes, enhanced=enhanced, save_raw=save_raw)
+        if prompt.lower() in ['', 'more']:
+            if theme is None:
+                continue
+            buffer = prefetch if prefetch is not None else _start_generation(theme, num_jokes, model, enhanced, shown)
+            print(f"\nMore jokes about '{theme}'{' (prefetched)' if buffer.done else ''}:")
+        else:
+            if prefetch is not None:
+                prefetch.cancel()
+            try:
+                num_jokes = int(input("How many jokes would you like? [1-5]: "))
+                num_jokes = max(1, min(5, num_jokes))  # Limit between 1-5
+            except (ValueError, EOFError):
+                num_jokes = 1
+                print("Invalid number, generating 1 joke.")
+            theme, shown = prompt, []
+            buffer = _start_generation(theme, num_jokes, model, enhanced)
+        prefetch = None
+        
+        streamer = _JokeTextStreamer(limit=num_jokes)
+        for fragment in buffer.follow():
+            streamer.feed(fragment)
+        if buffer.error is not None:
+            print(f"Error generating jokes: {buffer.error}")
+            continue
+        
+        jokes = _build_jokes(_parse_jokes_from_response(buffer.content)[:num_jokes], theme, model, enhanced)
+        if not streamer.count:
+            for i, joke in enumerate(jokes):
+                print(f"\nJoke {i+1}:\n{joke['text']}")
+        shown.extend(joke["text"] for joke in jokes)
+        
+        # Generate the next batch while the user reads this one
+        prefetch = _start_generation(theme, num_jokes, model, enhanced, shown)
         
-        # Add to results if we're keeping track
         if output_file:
-            session_result = {
-                "prompt": prompt,
-                "jokes": jokes
-            }
-            if save_raw and raw_response:
-                session_result["raw_response"] = raw_response
-                
-            all_results["sessions"].append(session_result)
+            turn = {"prompt": theme, "jokes": jokes}
+            if save_raw:
+                turn["raw_response"] = buffer.content
+            if append_turns:
+                _append_turn(output_file, turn)
+            else:
+                sessions.append(turn)
+                _save_sessions(output_file, sessions)
         
         print("\n" + "-"*50)
-    
-    # Save results if an output file was specified
-    if output_file and all_results["sessions"]:
-        try:
-            with open(output_file, 'w') as f:
-                json.dump(all_results, f, indent=2)
-            print(f"\nSession results saved to {output_file}")
-        except Exception as e:
-            print(f"Error saving session results: {e}")
 
 
 def main():
@@ -389,8 +676,13 @@ def main():
     parser.add_argument("-i", "--interactive", action="store_true", help="Run in interactive mode")
     parser.add_argument("-e", "--enhanced", action="store_true", help="Use enhanced prompting for fairer comparison")
     parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Model to use")
-    parser.add_argument("-o", "--output", help="Output JSON file to save jokes")
+    parser.add_argument("-o", "--output", help="Output file to save jokes (JSON; in interactive mode, a .jsonl path "
+                             "appends each turn as a JSON line, any other path gets one JSON file)")
     parser.add_argument("-r", "--save-raw", action="store_true", help="Save raw LLM responses in output file")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Jokes per request when generating many (default: BASELINE_CHUNK_SIZE, 5)")
+    parser.add_argument("--parallel", type=int, default=None,
+                        help="Concurrent chunk requests (default: BASELINE_MAX_PARALLEL, 8)")
     
     args = parser.parse_args()
     
@@ -399,10 +691,12 @@ def main():
         print("Set it with: export OPENAI_API_KEY='your-key-here'")
     
     if args.interactive:
-        interactive_mode(enhanced=args.enhanced, save_raw=args.save_raw, output_file=args.output)
+        interactive_mode(enhanced=args.enhanced, save_raw=args.save_raw, output_file=args.output,
+                         model=args.model)
     elif args.prompt:
-        jokes, raw_response = generate_joke(args.prompt, args.num_jokes, args.model, 
-                                           enhanced=args.enhanced, save_raw=args.save_raw)
+        jokes, raw_response = generate_jokes_chunked(args.prompt, args.num_jokes, args.chunk_size, args.model,
+                                                     enhanced=args.enhanced, save_raw=args.save_raw,
+                                                     max_parallel=args.parallel)
         
         if jokes and args.output:
             try:
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the compact record types in utils/records.py.
+
+Builds a synthetic sweep by replicating the rubrics, jokes and judgments in
+the bundled result files (fresh ids and texts per copy, repeated themes,
+types and tones, as in a real multi-run sweep), serializes it to JSON and
+measures with tracemalloc how many bytes each record costs when loaded as
+plain dicts versus as records. Also verifies the records round-trip to
+byte-identical JSON.
+
+Usage:
+  python benchmarks/record_memory.py
+  python benchmarks/record_memory.py --copies 2000
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from utils.records import RecordStore
+
+
+def build_sweep(copies: int):
+    """Return JSON texts (rubrics, jokes, judgments) for a synthetic sweep."""
+    with open(REPO_ROOT / "results.json") as f:
+        results = json.load(f)
+    with open(REPO_ROOT / "joke_judgments.json") as f:
+        template_judgment = json.load(f)["judgments"][0]
+
+    rubrics, jokes, judgments = [], [], []
+    for copy in range(copies):
+        for rubric in results["rubrics"]:
+            rubrics.append({**rubric, "id": f"{rubric['id']}-{copy}"})
+        for joke in results["jokes"]:
+            joke_copy = {**joke, "id": f"{joke['id']}-{copy}",
+                         "rubric_id": f"{joke['rubric_id']}-{copy}",
+                         "text": f"{joke['text']} (take {copy})"}
+            jokes.append(joke_copy)
+            judgments.append({**template_judgment, "joke_id": joke_copy["id"],
+                              "method": "multi-stage", "text": joke_copy["text"],
+                              "analysis": f"{template_judgment['analysis']} ({copy})"})
+
+    return (json.dumps({"rubrics": rubrics}),
+            json.dumps({"theme": results["theme"], "jokes": jokes}),
+            json.dumps({"judgments": judgments}))
+
+
+def measure(fn):
+    """Run fn() under tracemalloc and return (result, bytes still allocated)."""
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bytes per record for dicts vs compact records")
+    parser.add_argument("--copies", type=int, default=500, help="Times to replicate the bundled results (default: 500)")
+    args = parser.parse_args()
+
+    rubrics_text, jokes_text, judgments_text = build_sweep(max(1, args.copies))
+    store = RecordStore()
+
+    rows = []
+    for name, text, key, load, dump in [
+        ("rubric", rubrics_text, "rubrics", store.load_results, store.dump_results),
+        ("joke", jokes_text, "jokes", store.load_results, store.dump_results),
+        ("judgment", judgments_text, "judgments",
+         lambda data: store.load_judgments(data), store.dump_judgments),
+    ]:
+        # Plain dicts, exactly as json.load produces them
+        as_dicts, dict_bytes = measure(lambda: json.loads(text))
+        # Records; the raw dicts are discarded once converted. Judgments are
+        # measured after the jokes are in the store, as in a real sweep.
+        as_records, record_bytes = measure(lambda: load(json.loads(text)))
+        assert json.dumps(dump(as_records)) == json.dumps(as_dicts), f"{name} round-trip mismatch"
+        rows.append((name, len(as_dicts[key]), dict_bytes, record_bytes))
+        del as_dicts
+
+    print(f"{'Record':<10} {'count':>9} {'dict B/rec':>11} {'record B/rec':>13} {'saved':>7}")
+    for name, count, dict_bytes, record_bytes in rows:
+        per_dict, per_record = dict_bytes / count, record_bytes / count
+        print(f"{name:<10} {count:>9} {per_dict:>11.0f} {per_record:>13.0f} {1 - per_record / per_dict:>7.1%}")
+    total_dict = sum(row[2] for row in rows)
+    total_record = sum(row[3] for row in rows)
+    print(f"\nTotal: {total_dict / 1e6:.1f} MB as dicts, {total_record / 1e6:.1f} MB as records "
+          f"({1 - total_record / total_dict:.1%} saved). Round-trip JSON identical.")
+
+
+if __name__ == "__main__":
+    main()
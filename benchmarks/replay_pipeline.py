@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+CPU-side benchmark of the multi-stage pipeline against a recorded cassette.
+
+Replays a cassette recorded with `python main.py --record run.jsonl.gz ...`
+several times with no network access, so the measured wall time is only
+local work: prompt building, parsing, orchestration and writing results.
+Pass the same theme and fan-out the cassette was recorded with.
+
+Usage:
+  python main.py --theme penguins --ideas 3 --rubrics 2 --critiques 1 --no-baseline --record run.jsonl.gz
+  python benchmarks/replay_pipeline.py run.jsonl.gz --theme penguins --ideas 3 --rubrics 2 --critiques 1
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from utils.cassette import configure_cassette
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time local pipeline work by replaying a recorded cassette")
+    parser.add_argument("cassette", help="Cassette recorded with main.py --record")
+    parser.add_argument("--theme", default="penguins", help="Theme the cassette was recorded with")
+    parser.add_argument("--ideas", type=int, default=3)
+    parser.add_argument("--rubrics", type=int, default=2)
+    parser.add_argument("--critiques", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5, help="Replays to time (default: 5)")
+    args = parser.parse_args()
+
+    from main import generate_multistage_jokes
+
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        for _ in range(args.runs):
+            cassette = configure_cassette(args.cassette, "replay")
+            start = time.perf_counter()
+            # The pipeline prints every stage; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                generate_multistage_jokes(args.theme, args.ideas, args.rubrics, args.critiques, output,
+                                          concurrency=args.concurrency)
+            timings.append(time.perf_counter() - start)
+            summary = cassette.summary()
+            if summary["misses"]:
+                print(f"Warning: {summary['misses']} calls were not on the cassette; "
+                      f"check the theme and fan-out arguments")
+
+    print(f"Replayed {summary['replayed']} calls per run from {args.cassette}")
+    print(f"Local pipeline time over {args.runs} runs: median {statistics.median(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Query-latency benchmark for the joke search index (joke_index.py).
+
+Writes a synthetic multi-stage results file and a judgments file (varied
+themes, joke types, tones and words, random scores), ingests them into a
+temporary index and reports ingest time plus the median latency of typical
+searches: full-text, filtered by theme/type/tone, score ranges and
+unfiltered top-by-score.
+
+Usage:
+  python benchmarks/search_index.py
+  python benchmarks/search_index.py --jokes 1000000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from joke_index import JokeIndex
+
+THEMES = ["penguins", "robots", "office life", "coffee", "airports", "cats", "gardening", "taxes"]
+TYPES = ["Pun", "Observational", "Absurdist", "One-liner", "Character-based", "Wordplay"]
+TONES = ["witty", "sarcastic", "dry, deadpan", "lighthearted", "absurd", "dark"]
+COMMON = ("tuxedo waddle fish ice meeting printer deadline espresso latte gate boarding luggage "
+          "whisker nap laser tomato compost refund audit robot circuit upgrade manager spreadsheet").split()
+SYLLABLES = ["ba", "ko", "ri", "zu", "me", "ta", "lo", "pi", "ne", "gu", "sha", "vo"]
+
+
+def write_sources(directory: Path, num_jokes: int, seed: int = 0):
+    rng = random.Random(seed)
+    # A realistic vocabulary: a few common theme words plus a long Zipf-like tail
+    words = COMMON + ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    ideas, rubrics, jokes, judgments = [], [], [], []
+    for i in range(num_jokes):
+        idea_id, rubric_id = f"idea-{i // 8}", f"rubric-{i // 2}"
+        if i % 8 == 0:
+            ideas.append({"id": idea_id, "concept": " ".join(rng.choices(words, weights, k=4))})
+        if i % 2 == 0:
+            rubrics.append({"id": rubric_id, "idea_id": idea_id, "type": rng.choice(TYPES),
+                            "tone": rng.choice(TONES), "structure": "Setup, Punchline"})
+        jokes.append({"id": f"joke-{i}", "theme": rng.choice(THEMES), "idea_id": idea_id, "rubric_id": rubric_id,
+                      "text": " ".join(rng.choices(words, weights, k=12)) + f" take{i}"})
+        if rng.random() < 0.5:
+            judgments.append({"joke_id": f"joke-{i}", "method": "multi-stage", "overall": rng.randint(1, 10),
+                              "scores": {}, "analysis": ""})
+    results = directory / "results.json"
+    results.write_text(json.dumps({"theme": "mixed", "joke_ideas": ideas, "rubrics": rubrics, "jokes": jokes}))
+    judged = directory / "joke_judgments.json"
+    judged.write_text(json.dumps({"judgments": judgments}))
+    return results, judged
+
+
+def median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure joke index ingest time and query latency")
+    parser.add_argument("--jokes", type=int, default=200000, help="Synthetic jokes to index (default: 200000)")
+    parser.add_argument("--repeats", type=int, default=20, help="Runs per query (default: 20)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        results, judged = write_sources(directory, args.jokes)
+        index = JokeIndex(str(directory / "jokes.db"))
+
+        start = time.perf_counter()
+        index.ingest(str(results))
+        index.ingest(str(judged))
+        ingest_seconds = time.perf_counter() - start
+        print(f"Indexed {args.jokes} jokes and their judgments in {ingest_seconds:.1f}s "
+              f"({args.jokes / ingest_seconds:,.0f} jokes/s)")
+
+        queries = [
+            ("text: tuxedo espresso", dict(query="tuxedo espresso")),
+            ("text + score >= 8", dict(query="printer deadline", min_score=8)),
+            ("theme + type + tone", dict(theme="penguins", rubric_type="pun", tone="sarcastic")),
+            ("tone + score 3-5", dict(tone="deadpan", min_score=3, max_score=5)),
+            ("top by score", dict()),
+            ("exact token", dict(query="take12345")),
+        ]
+        print(f"\n{'query':<24} {'results':>8} {'median ms':>10}")
+        for label, kwargs in queries:
+            found = len(index.search(limit=20, **kwargs))
+            print(f"{label:<24} {found:>8} {median_ms(lambda: index.search(limit=20, **kwargs), args.repeats):>10.2f}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
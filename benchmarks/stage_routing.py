@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Quality vs. cost benchmark of per-stage routing configurations.
+
+Runs the multi-stage pipeline once per routing file (see utils/routing.py),
+judges the jokes each run produced with the same judge, and reports the
+mean judge score next to wall time, tokens and per-stage latency, so cheap
+stages can be moved to a small fast model only where quality holds up.
+Pass "default" for a run without routes. Judge routes in the files are
+ignored: every configuration is judged by the judge from configuration.
+
+Usage:
+  python benchmarks/stage_routing.py default small_obs.json small_all.json --theme penguins --ideas 3
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from utils.routing import GENERATION_STAGES, configure_routing, load_routing_file
+
+
+def run_config(name: str, routes: dict, args, judge) -> dict:
+    from main import generate_multistage_jokes
+    from utils.metrics import METRICS
+
+    # Only generation routes apply; the judge stays the same for every config
+    configure_routing({stage: route for stage, route in routes.items() if stage != "judge"})
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        start = time.perf_counter()
+        # The pipeline prints every stage; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            results = generate_multistage_jokes(args.theme, args.ideas, args.rubrics, args.critiques, output,
+                                                concurrency=args.concurrency)
+        seconds = time.perf_counter() - start
+        stages = {stage: entry for stage, entry in METRICS.summary().items() if stage in GENERATION_STAGES}
+        with contextlib.redirect_stdout(io.StringIO()):
+            jokes = judge.load_multistage_jokes(output) if results else []
+
+    configure_routing({})
+    if args.judge_max:
+        jokes = jokes[:args.judge_max]
+    scores = []
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for joke in jokes:
+            judgment = judge.judge_joke(joke)
+            if judgment["analysis"] != "Error during evaluation":
+                scores.append(judgment["overall"])
+    return {
+        "name": name,
+        "jokes": len(jokes),
+        "judged": len(scores),
+        "mean_score": statistics.mean(scores) if scores else None,
+        "seconds": seconds,
+        "tokens": sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in stages.values()),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare judge score, latency and tokens across stage routings")
+    parser.add_argument("configs", nargs="+", help="Routing JSON files, or 'default' for no routes")
+    parser.add_argument("--theme", default="penguins")
+    parser.add_argument("--ideas", type=int, default=3)
+    parser.add_argument("--rubrics", type=int, default=2)
+    parser.add_argument("--critiques", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--judge-max", type=int, default=0, help="Judge at most this many jokes per config (0 for all)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    from utils.config import initialize_config
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not initialize_config():
+            print("Failed to initialize configuration. Please check your .env file.")
+            return
+        from joke_judge import JokeJudge
+        judge = JokeJudge()
+
+    configs = []
+    for config in args.configs:
+        try:
+            configs.append((config, {} if config == "default" else load_routing_file(config)))
+        except (OSError, ValueError) as e:
+            print(f"Skipping {config}: {e}")
+
+    results = []
+    for name, routes in configs:
+        print(f"Running {name}...")
+        results.append(run_config(name, routes, args, judge))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{'config':<24} {'jokes':>5} {'judged':>6} {'score':>6} {'wall s':>7} {'tokens':>8}")
+    for result in results:
+        score = f"{result['mean_score']:.2f}" if result["mean_score"] is not None else "-"
+        print(f"{result['name']:<24} {result['jokes']:>5} {result['judged']:>6} {score:>6} "
+              f"{result['seconds']:>7.1f} {result['tokens']:>8,}")
+
+    print("\nPer-stage p50 latency (s) / tokens:")
+    print(f"{'config':<24} " + " ".join(f"{stage:>16}" for stage in GENERATION_STAGES))
+    for result in results:
+        cells = []
+        for stage in GENERATION_STAGES:
+            entry = result["stages"].get(stage)
+            if entry is None:
+                cells.append(f"{'-':>16}")
+                continue
+            p50 = f"{entry['p50']:.2f}" if entry["p50"] is not None else "-"
+            cells.append(f"{p50 + ' / ' + format(entry['prompt_tokens'] + entry['completion_tokens'], ','):>16}")
+        print(f"{result['name']:<24} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the CLI entry points.
+
+Runs each entry point under `python -X importtime`, sums the cumulative
+import time of every top-level import and checks two things:
+  - no heavy module (openai, tqdm, tabulate, colorama, stage modules) is
+    imported by a command that does not need it
+  - total import time stays within a budget
+
+Exits with status 1 on a regression so it can guard CI or batch launchers.
+
+Usage:
+  python benchmarks/startup_time.py
+  python benchmarks/startup_time.py --runs 10 --budget-ms 120
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["openai", "tqdm", "tabulate", "colorama"]
+STAGE_MODULES = ["gen_ideas", "gen_rubrics", "gen_jokes", "baseline_joke_gen", "joke_judge"]
+
+# (label, argv after the interpreter, modules that must not be imported)
+SCENARIOS = [
+    ("main.py --help", ["main.py", "--help"], HEAVY_MODULES + STAGE_MODULES),
+    ("joke_judge.py --help", ["joke_judge.py", "--help"], HEAVY_MODULES + STAGE_MODULES[:-1]),
+    ("import main", ["-c", "import main"], HEAVY_MODULES + STAGE_MODULES),
+    ("import joke_judge", ["-c", "import joke_judge"], HEAVY_MODULES + STAGE_MODULES[:-1]),
+]
+
+
+def parse_importtime(stderr: str):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        Tuple of (total top-level cumulative microseconds, set of imported module names)
+    """
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.add(name.strip())
+        # Top-level imports are the ones without nesting indentation
+        if name.startswith(" ") and not name.startswith("  "):
+            total_us += int(cumulative_us)
+    return total_us, modules
+
+
+def run_scenario(argv, runs: int):
+    """Run one scenario `runs` times; return (import ms samples, wall ms samples, modules)."""
+    import_ms, wall_ms = [], []
+    modules = set()
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True
+        )
+        wall_ms.append((time.perf_counter() - start) * 1000)
+        total_us, modules = parse_importtime(proc.stderr)
+        import_ms.append(total_us / 1000)
+    return import_ms, wall_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time and guard against import regressions")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Maximum median import time per scenario in milliseconds (default: 150)")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'Scenario':<24} {'imports (ms)':>13} {'wall (ms)':>10}")
+    for label, argv, forbidden in SCENARIOS:
+        import_ms, wall_ms, modules = run_scenario(argv, max(1, args.runs))
+        median_import = statistics.median(import_ms)
+        median_wall = statistics.median(wall_ms)
+        print(f"{label:<24} {median_import:>13.1f} {median_wall:>10.1f}")
+
+        leaked = sorted(m for m in forbidden if m in modules)
+        if leaked:
+            failures.append(f"{label}: eagerly imports {', '.join(leaked)}")
+        if median_import > args.budget_ms:
+            failures.append(f"{label}: import time {median_import:.1f}ms exceeds budget {args.budget_ms:.1f}ms")
+
+    if failures:
+        print("\nStartup regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nStartup within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import uuid
-from openai import OpenAI
 import os
 import json
 import sys
 import re
-from utils.config import get_api_base_url, get_openai_key, DEFAULT_MODEL
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import get_openai_key, DEFAULT_MODEL
+from utils.deadline import DeadlineExceeded
+from utils.llm import chat_completion
+from utils.fallback import Fallback, FALLBACKS, call_with_retry, is_fallback
+
+# See utils/stage_cache.py
+PROMPT_VERSION = 1
 
 def openai_llm_call(prompt_content: str, purpose: str, json_format: str) -> dict:
     """
@@ -16,40 +22,33 @@ def openai_llm_call(prompt_content: str, purpose: str, json_format: str) -> dict
         json_format: Expected JSON format description
         
     Returns:
-        Parsed JSON response
+        Parsed JSON response, or a Fallback if the call failed (for
+        call_with_retry to retry or prune)
     """
     print(f"\n--- OpenAI LLM Call ({purpose}) ---")
     
-    # Get API configuration from environment
-    api_base_url = get_api_base_url()
-    api_key = get_openai_key()
-    
-    if not api_key:
+    if not get_openai_key():
         print("Error: OPENAI_API_KEY not found in configuration.")
-        sys.exit(1)
+        return Fallback(purpose)
     
     try:
-        # Initialize client with API details
-        client = OpenAI(base_url=api_base_url, api_key=api_key)
-        
         # Prepare system prompt that explicitly asks for JSON
         system_prompt = (
             f"You are a JSON generation assistant. Return a JSON object with this structure: {json_format}. "
             f"Do not include explanations or markdown formatting, just the pure JSON object."
         )
         
-        # Make the API call
-        response = client.chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=[
+        # Make the API call (shared client, warm connection pool)
+        raw_content = chat_completion(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt_content}
             ],
+            model=DEFAULT_MODEL,
             temperature=0.7,
+            stage="ideas" if purpose == "formulate_joke_ideas" else "observations",
         )
         
-        # Get raw response
-        raw_content = response.choices[0].message.content
         print(f"Raw response (first 100 chars): {raw_content[:100]}...")
         
         # Clean up response and extract JSON
@@ -62,11 +61,14 @@ def openai_llm_call(prompt_content: str, purpose: str, json_format: str) -> dict
             print(f"JSON error: {e}")
             return fallback_json_extraction(raw_content, purpose)
     
+    except DeadlineExceeded as e:
+        print(f"Skipped ({purpose}): {e}")
+        return Fallback(purpose)
     except Exception as e:
-        print(f"Error calling LLM API: {e}")
+        print(f"Error calling LLM API ({purpose}): {e}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
+        return Fallback(purpose)
 
 def extract_valid_json(text):
     """
@@ -134,7 +136,7 @@ def fallback_json_extraction(text, purpose):
             return {"observations": [item.strip() for item in items]}
         else:
             print("Fallback extraction failed. Using default observations.")
-            return {"observations": ["Observation 1", "Observation 2", "Observation 3"]}
+            return Fallback(purpose, {"observations": ["Observation 1", "Observation 2", "Observation 3"]})
     
     # For joke ideas
     elif purpose == "formulate_joke_ideas":
@@ -154,11 +156,11 @@ def fallback_json_extraction(text, purpose):
             return {"ideas": concepts}
         else:
             print("Fallback extraction failed. Using default ideas.")
-            return {"ideas": [{"concept": "Default joke idea 1"}, {"concept": "Default joke idea 2"}]}
+            return Fallback(purpose, {"ideas": [{"concept": "Default joke idea 1"}, {"concept": "Default joke idea 2"}]})
     
     # Default case
     print("Unknown purpose for fallback extraction. Using empty object.")
-    return {}
+    return Fallback(purpose)
 
 def generate_first_order_observations(theme: str) -> list[str]:
     """
@@ -170,7 +172,11 @@ def generate_first_order_observations(theme: str) -> list[str]:
     )
     json_format = '{"observations": ["observation1", "observation2", "observation3", ...]}'
     
-    response = openai_llm_call(prompt_content, "first_order_observations", json_format)
+    response = call_with_retry(openai_llm_call, "first_order_observations", prompt_content, "first_order_observations", json_format)
+    if is_fallback(response):
+        # Never fan out placeholder observations
+        FALLBACKS.record_pruned("first_order_observations", len(response.get("observations", [])))
+        return []
     observations = response.get("observations", [])
     
     print(f"Generated First-Order Observations: {observations}")
@@ -190,7 +196,10 @@ def generate_second_order_observations(first_order_observations: list[str], them
     )
     json_format = '{"observations": ["specific_angle1", "specific_angle2", ...]}'
     
-    response = openai_llm_call(prompt_content, "second_order_observations", json_format)
+    response = call_with_retry(openai_llm_call, "second_order_observations", prompt_content, "second_order_observations", json_format)
+    if is_fallback(response):
+        FALLBACKS.record_pruned("second_order_observations", len(response.get("observations", [])))
+        return []
     observations = response.get("observations", [])
     
     print(f"Generated Second-Order Observations: {observations}")
@@ -211,7 +220,10 @@ def formulate_joke_ideas(all_observations: list[str], theme: str) -> list[dict]:
     )
     json_format = '{"ideas": [{"concept": "joke concept 1"}, {"concept": "joke concept 2"}, ...]}'
     
-    response = openai_llm_call(prompt_content, "formulate_joke_ideas", json_format)
+    response = call_with_retry(openai_llm_call, "formulate_joke_ideas", prompt_content, "formulate_joke_ideas", json_format)
+    if is_fallback(response):
+        FALLBACKS.record_pruned("formulate_joke_ideas", len(response.get("ideas", [])))
+        return []
     
     # Add unique IDs to each idea
     joke_ideas = []
@@ -226,6 +238,48 @@ def formulate_joke_ideas(all_observations: list[str], theme: str) -> list[dict]:
     return joke_ideas
 
 
+def generate_ideas_speculative(first_order_observations: list[str], theme: str, num_ideas: int) -> tuple[list[str], list[dict]]:
+    """
+    Speculative Stage 2: formulate ideas from first-order observations in
+    parallel with second-order observation generation.
+    
+    The sequential path costs three serial calls per theme (first-order ->
+    second-order -> ideas). Here ideas are formulated from the first-order
+    observations as soon as they exist, while second-order observations are
+    generated concurrently, so the critical path is two calls. When the
+    second-order results land they are merged in: if the speculative ideas
+    fall short of num_ideas, a follow-up formulate call on the second-order
+    observations augments the list (deduplicated by concept).
+    
+    Args:
+        first_order_observations: Observations from generate_first_order_observations
+        theme: The theme for the jokes
+        num_ideas: Number of ideas the caller needs
+        
+    Returns:
+        Tuple of (second-order observations, joke ideas)
+    """
+    if not first_order_observations:
+        return [], []
+    
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-ideas") as executor:
+        second_order_future = executor.submit(generate_second_order_observations, first_order_observations, theme)
+        ideas_future = executor.submit(formulate_joke_ideas, first_order_observations, theme)
+        joke_ideas = ideas_future.result()
+        second_order_observations = second_order_future.result()
+    
+    if len(joke_ideas) < num_ideas and second_order_observations:
+        print(f"Speculative ideas short of target ({len(joke_ideas)}/{num_ideas}); augmenting from second-order observations")
+        seen = {idea["concept"].strip().lower() for idea in joke_ideas}
+        for idea in formulate_joke_ideas(second_order_observations, theme):
+            concept_key = idea["concept"].strip().lower()
+            if concept_key not in seen:
+                seen.add(concept_key)
+                joke_ideas.append(idea)
+    
+    return second_order_observations, joke_ideas
+
+
 if __name__ == '__main__':
     from utils.config import initialize_config
     
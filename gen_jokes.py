@@ -4,8 +4,15 @@ import uuid
 import os
 import json
 import re
-from openai import OpenAI
-from utils.config import get_api_base_url, get_openai_key, DEFAULT_MODEL
+import sys
+from openai import APIError
+from utils.config import get_openai_key, DEFAULT_MODEL
+from utils.deadline import DeadlineExceeded
+from utils.llm import chat_completion
+from utils.fallback import Fallback, FALLBACKS, call_with_retry, is_fallback
+
+# See utils/stage_cache.py
+PROMPT_VERSION = 1
 
 # --- OpenAI API Configuration ---
 # Ensure your OpenAI API key is set as an environment variable: OPENAI_API_KEY
@@ -34,7 +41,16 @@ def _extract_json_from_text(text):
     # Return the original text as a last resort
     return text.strip()
 
-def _openai_llm_call(prompt_content: str, purpose: str, expected_format_description: str) -> any:
+def _is_parseable_json(text) -> bool:
+    """Cheap validity check used to pick the winner of a hedged call."""
+    try:
+        json.loads(_extract_json_from_text(text or ""))
+        return True
+    except ValueError:
+        return False
+
+def _openai_llm_call(prompt_content: str, purpose: str, expected_format_description: str,
+                     stage: str = "jokes") -> any:
     """
     Makes a call to the OpenAI API and parses the response.
     """
@@ -42,28 +58,22 @@ def _openai_llm_call(prompt_content: str, purpose: str, expected_format_descript
     print(f"System Instruction: {expected_format_description}")
     print(f"User Prompt (first 200 chars): {prompt_content[:200]}...")
 
-    # Get API configuration from environment
-    api_base_url = get_api_base_url()
-    api_key = get_openai_key()
-    
-    if not api_key:
+    if not get_openai_key():
         print("Error: OPENAI_API_KEY not found in configuration.")
         return _fallback_placeholder_response(purpose)
 
     try:
-        # Initialize client with API configuration
-        client = OpenAI(base_url=api_base_url, api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=[
+        raw_response_content = chat_completion(
+            [
                 {"role": "system", "content": f"You are a helpful assistant. Your response should be a JSON string that can be parsed into the following Python structure: {expected_format_description}. Do not include any explanatory text outside of the JSON string itself."},
                 {"role": "user", "content": prompt_content}
             ],
+            model=DEFAULT_MODEL,
             temperature=0.7,
+            stage=stage,
+            validate=_is_parseable_json,
         )
         
-        raw_response_content = response.choices[0].message.content
         print(f"Raw LLM Response (first 200 chars): {raw_response_content[:200]}...")
 
         # Extract and clean JSON from response
@@ -90,8 +100,10 @@ def _openai_llm_call(prompt_content: str, purpose: str, expected_format_descript
             
             raise
 
-    except openai.APIError as e:
+    except APIError as e:
         print(f"OpenAI API Error ({purpose}): {e}")
+    except DeadlineExceeded as e:
+        print(f"Skipped ({purpose}): {e}")
     except json.JSONDecodeError as e:
         print(f"JSON Decode Error ({purpose}): Failed to parse LLM response. Error: {e}")
     except Exception as e:
@@ -106,15 +118,32 @@ def _fallback_placeholder_response(purpose: str) -> any:
     """Provides a fallback response if the LLM call fails."""
     print(f"Warning: LLM call failed for '{purpose}'. Using fallback placeholder response.")
     if purpose.startswith("generate_joke"):
-        return {
+        return Fallback(purpose, {
             "id": str(uuid.uuid4()),
             "text": f"Fallback joke about {purpose.split('_')[-1] if '_' in purpose else 'something'}: Why did the AI cross the road? Because it was trying to get to the other data center.",
             "explanation": "This is a fallback joke due to API failure."
-        }
-    return f"Fallback placeholder response for {purpose}"
+        })
+    return Fallback(purpose, {"placeholder": f"Fallback placeholder response for {purpose}"})
 
 
-def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict:
+def _validated_llm_call(prompt_content: str, purpose: str, expected_format_description: str,
+                        stage: str = "jokes") -> any:
+    """
+    LLM call whose unusable responses (neither a dict with 'text' nor a
+    plain-text joke) are returned as Fallback results for retry or pruning.
+    """
+    response = _openai_llm_call(prompt_content, purpose, expected_format_description, stage)
+    if is_fallback(response):
+        return response
+    if isinstance(response, dict) and "text" in response:
+        return response
+    if isinstance(response, str) and len(response) > 10:
+        return response
+    print(f"Warning: LLM response for joke generation was not in the expected format. Got: {response}")
+    return _fallback_placeholder_response(purpose)
+
+
+def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str, stage: str = "jokes") -> dict:
     """
     Stage 5: Joke Generation (Implementing the Plan)
     Step 6.1: Generate a final joke by strongly conditioning on both the specific joke idea and the detailed rubric.
@@ -123,12 +152,17 @@ def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict
         rubric: Dictionary containing the joke rubric details
         joke_idea: Dictionary containing the original joke idea
         theme: The theme for the joke
+        stage: Stage the call is made (and routed) as: "jokes", or "drafts"
+               for the cascade's draft pass (see refine_joke)
         
     Returns:
-        Dictionary containing the generated joke and metadata
+        Dictionary containing the generated joke and metadata; a Fallback
+        (check with utils.fallback.is_fallback) if no usable joke was produced
     """
-    if not rubric or not joke_idea:
+    if not rubric or not joke_idea or is_fallback(rubric) or is_fallback(joke_idea):
+        # Never spend a Stage 5 call on placeholder input
         print("Error: Invalid inputs to generate_joke_from_rubric.")
+        FALLBACKS.record_skipped(stage)
         return _fallback_placeholder_response("generate_joke")
     
     # Extract rubric elements for better prompt construction
@@ -162,9 +196,12 @@ def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict
     )
     
     try:
-        llm_generated_joke = _openai_llm_call(prompt_content, f"generate_joke_{rubric.get('id', '')[:8]}", expected_format)
+        llm_generated_joke = call_with_retry(
+            _validated_llm_call, stage,
+            prompt_content, f"generate_joke_{rubric.get('id', '')[:8]}", expected_format, stage
+        )
         
-        if isinstance(llm_generated_joke, dict) and "text" in llm_generated_joke:
+        if not is_fallback(llm_generated_joke) and isinstance(llm_generated_joke, dict):
             joke = {
                 "id": str(uuid.uuid4()),
                 "theme": theme,
@@ -181,10 +218,8 @@ def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict
             print(f"\nGenerated Joke for Idea: '{joke_idea.get('concept', '')}': {joke['text']}")
             return joke
         else:
-            print(f"Warning: LLM response for joke generation was not in the expected format. Got: {llm_generated_joke}")
-            
             # Try to handle simple text response
-            if isinstance(llm_generated_joke, str) and len(llm_generated_joke) > 10:
+            if isinstance(llm_generated_joke, str):
                 return {
                     "id": str(uuid.uuid4()),
                     "theme": theme,
@@ -199,7 +234,7 @@ def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict
                     }
                 }
             
-            fallback = _fallback_placeholder_response("generate_joke")
+            fallback = llm_generated_joke
             fallback["id"] = str(uuid.uuid4())
             fallback["idea_id"] = joke_idea.get("id", "unknown")
             fallback["rubric_id"] = rubric.get("id", "unknown")
@@ -217,6 +252,70 @@ def generate_joke_from_rubric(rubric: dict, joke_idea: dict, theme: str) -> dict
         return fallback
 
 
+def refine_joke(draft: dict, rubric: dict, joke_idea: dict, theme: str) -> dict:
+    """
+    Cascade refinement: rewrite a promising draft joke with the full model.
+    
+    Drafts come from generate_joke_from_rubric(..., stage="drafts"), usually
+    routed to a small fast model; only drafts that pass the cheap screen are
+    refined, so full-model calls go to the best candidates.
+    
+    Args:
+        draft: Draft joke dictionary (as returned by generate_joke_from_rubric)
+        rubric: Dictionary containing the joke rubric details
+        joke_idea: Dictionary containing the original joke idea
+        theme: The theme for the joke
+        
+    Returns:
+        The refined joke (same ids and metadata as the draft, with the draft
+        text kept in metadata); the draft itself, marked unrefined, if the
+        refinement produced no usable joke
+    """
+    key_elements = rubric.get("key_elements", ["humor", "surprise"])
+    if not isinstance(key_elements, list):
+        key_elements = [str(key_elements)]
+    
+    prompt_content = (
+        f"You are a professional comedy writer polishing a draft joke.\n\n"
+        f"Theme: '{theme}'\n\n"
+        f"Joke Idea: '{joke_idea.get('concept', '')}'\n\n"
+        f"Joke Rubric:\n"
+        f"- Type: {rubric.get('type', 'Unknown')}\n"
+        f"- Structure: {rubric.get('structure', 'Setup, Punchline')}\n"
+        f"- Key Elements to Include: {key_elements}\n"
+        f"- Tone: {rubric.get('tone', 'Neutral')}\n\n"
+        f"Draft Joke: \"{draft['text']}\"\n\n"
+        f"Rewrite the draft into the strongest version of the same joke: keep its core premise, tighten the setup, "
+        f"cut every word that does not serve the punchline, and make the punchline land harder. Then briefly "
+        f"explain what you changed and why it is funnier.\n\n"
+        f"Format your response as a JSON object with 'text' and 'explanation' fields."
+    )
+    expected_format = (
+        "A Python dictionary with keys: "
+        "'text' (string containing the refined joke), "
+        "'explanation' (string explaining what was changed)"
+    )
+    
+    refined = call_with_retry(
+        _validated_llm_call, "refine",
+        prompt_content, f"generate_joke_refine_{rubric.get('id', '')[:8]}", expected_format, "refine"
+    )
+    joke = dict(draft)
+    joke["metadata"] = dict(draft.get("metadata", {}))
+    if is_fallback(refined):
+        FALLBACKS.record_pruned("refine")
+        joke["metadata"]["refined"] = False
+        return joke
+    if isinstance(refined, str):
+        refined = {"text": refined, "explanation": "No structured explanation available"}
+    joke["metadata"]["draft_text"] = draft["text"]
+    joke["metadata"]["refined"] = True
+    joke["text"] = refined["text"]
+    joke["explanation"] = refined.get("explanation", "No explanation provided")
+    print(f"\nRefined Joke for Idea: '{joke_idea.get('concept', '')}': {joke['text']}")
+    return joke
+
+
 if __name__ == '__main__':
     from utils.config import initialize_config
     
@@ -241,7 +340,7 @@ if __name__ == '__main__':
     print("\n--- Testing gen_jokes.py with OpenAI Integration ---")
     joke = generate_joke_from_rubric(sample_rubric, sample_joke_idea, sample_theme)
     
-    if joke and "text" in joke:
+    if joke and "text" in joke and not is_fallback(joke):
         print("\nJoke Generation Test Successful!")
         print(f"Joke: {joke['text']}")
         print(f"Explanation: {joke['explanation']}")
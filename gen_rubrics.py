@@ -4,9 +4,14 @@ import os
 import json
 import sys
 import re
-from openai import OpenAI
 from openai import APIError, BadRequestError  # Import specific exceptions
-from utils.config import get_api_base_url, get_openai_key, DEFAULT_MODEL
+from utils.config import get_openai_key, DEFAULT_MODEL
+from utils.deadline import DeadlineExceeded
+from utils.llm import chat_completion
+from utils.fallback import Fallback, FALLBACKS, call_with_retry, is_fallback
+
+# See utils/stage_cache.py
+PROMPT_VERSION = 1
 
 def _extract_and_clean_json(raw_text):
     """Extract and clean JSON from text, handling code blocks and invalid characters"""
@@ -33,6 +38,14 @@ def _extract_and_clean_json(raw_text):
     
     return cleaned_text
 
+def _is_parseable_json(text) -> bool:
+    """Cheap validity check used to pick the winner of a hedged call."""
+    try:
+        json.loads(_extract_and_clean_json(text or ""))
+        return True
+    except ValueError:
+        return False
+
 def _openai_llm_call(prompt_content: str, purpose: str, expected_format_description: str) -> any:
     """
     Makes a call to the OpenAI API and parses the response.
@@ -41,28 +54,22 @@ def _openai_llm_call(prompt_content: str, purpose: str, expected_format_descript
     print(f"System Instruction: {expected_format_description}")
     print(f"User Prompt (first 200 chars): {prompt_content[:200]}...")
 
-    # Get API configuration from environment
-    api_base_url = get_api_base_url()
-    api_key = get_openai_key()
-    
-    if not api_key:
+    if not get_openai_key():
         print("Error: OPENAI_API_KEY not found in configuration.")
         return _fallback_placeholder_response(purpose)
 
     try:
-        # Initialize client with API configuration
-        client = OpenAI(base_url=api_base_url, api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model=DEFAULT_MODEL, 
-            messages=[
+        raw_response_content = chat_completion(
+            [
                 {"role": "system", "content": f"You are a helpful assistant. Your response should be a pure JSON object with this structure: {expected_format_description}. No markdown, no explanations, just the JSON object."},
                 {"role": "user", "content": prompt_content}
             ],
+            model=DEFAULT_MODEL,
             temperature=0.7,
+            stage="critiques" if purpose.startswith("critique") else "rubrics",
+            validate=_is_parseable_json,
         )
         
-        raw_response_content = response.choices[0].message.content
         print(f"Raw LLM Response (first 100 chars): {raw_response_content[:100]}...")
         
         # Extract and clean JSON from response before parsing
@@ -92,6 +99,8 @@ def _openai_llm_call(prompt_content: str, purpose: str, expected_format_descript
         print(f"OpenAI API Error ({purpose}): {e}")
     except BadRequestError as e:  # Using the imported BadRequestError
         print(f"OpenAI Bad Request Error ({purpose}): {e}")
+    except DeadlineExceeded as e:
+        print(f"Skipped ({purpose}): {e}")
     except Exception as e:
         print(f"An unexpected error occurred during LLM call ({purpose}): {e}")
         import traceback
@@ -103,23 +112,36 @@ def _fallback_placeholder_response(purpose: str, idea_id: str = None) -> any:
     """Provides a fallback response if the LLM call fails."""
     print(f"Warning: LLM call failed for '{purpose}'. Using fallback placeholder response.")
     if purpose == "generate_rubric":
-        return {
+        return Fallback(purpose, {
             "id": str(uuid.uuid4()), "idea_id": idea_id or "fallback_idea_id", 
             "type": "Fallback Observational",
             "structure": "Fallback: Setup, Punchline.",
             "key_elements": ["Fallback element 1", "Fallback element 2"],
             "tone": "Fallback Neutral"
-        }
+        })
     elif purpose == "critique_and_refine_rubric":
-        return {
+        return Fallback(purpose, {
             "id": str(uuid.uuid4()), "idea_id": idea_id or "fallback_idea_id",
             "type": "Fallback Character-based",
             "structure": "Fallback: Dialogue between A and B.",
             "key_elements": ["Fallback character trait", "Fallback witty exchange"],
             "tone": "Fallback Quirky",
             "critique_of_original": "Fallback: Original was okay, this offers a different angle."
-        }
-    return f"Fallback placeholder response for {purpose}"
+        })
+    return Fallback(purpose, {"placeholder": f"Fallback placeholder response for {purpose}"})
+
+def _validated_llm_call(prompt_content: str, purpose: str, expected_format_description: str, required_keys: list) -> any:
+    """
+    LLM call whose malformed responses (missing any of required_keys) are
+    returned as Fallback results so callers can retry or prune them.
+    """
+    response = _openai_llm_call(prompt_content, purpose, expected_format_description)
+    if is_fallback(response):
+        return response
+    if not (isinstance(response, dict) and all(k in response for k in required_keys)):
+        print(f"Warning: LLM response for {purpose} was not in the expected format. Got: {response}")
+        return Fallback(purpose, response if isinstance(response, dict) else {})
+    return response
 
 def generate_rubric_for_idea(joke_idea: dict, theme: str, num_rubrics: int = 3) -> list:
     """
@@ -137,9 +159,10 @@ def generate_rubric_for_idea(joke_idea: dict, theme: str, num_rubrics: int = 3)
     Returns:
         List of rubric dictionaries
     """
-    if not joke_idea or 'concept' not in joke_idea or 'id' not in joke_idea:
+    if not joke_idea or 'concept' not in joke_idea or 'id' not in joke_idea or is_fallback(joke_idea):
         print("Error: Invalid joke_idea provided to generate_rubric_for_idea.")
-        return [_fallback_placeholder_response("generate_rubric", "error_idea_id")]
+        FALLBACKS.record_skipped("rubrics", num_rubrics)
+        return []
 
     rubrics = []
     
@@ -160,22 +183,25 @@ def generate_rubric_for_idea(joke_idea: dict, theme: str, num_rubrics: int = 3)
             "Example: {'type': 'Observational', 'structure': 'Setup, Punchline', 'key_elements': ['Element A', 'Element B'], 'tone': 'Sarcastic'}"
         )
         
-        llm_generated_rubric_parts = _openai_llm_call(prompt_content, f"generate_rubric_{i+1}", expected_format)
+        llm_generated_rubric_parts = call_with_retry(
+            _validated_llm_call, "rubrics",
+            prompt_content, f"generate_rubric_{i+1}", expected_format, ['type', 'structure', 'key_elements', 'tone']
+        )
+        
+        if is_fallback(llm_generated_rubric_parts):
+            # Prune instead of fanning a placeholder rubric out to Stages 4-5
+            print(f"Pruning rubric #{i+1} for Idea ID '{joke_idea['id']}' after failed generation")
+            FALLBACKS.record_pruned("rubrics")
+            continue
         
         # Add id and idea_id client-side
-        if isinstance(llm_generated_rubric_parts, dict) and all(k in llm_generated_rubric_parts for k in ['type', 'structure', 'key_elements', 'tone']):
-            rubric = {
-                "id": str(uuid.uuid4()),
-                "idea_id": joke_idea['id'],
-                **llm_generated_rubric_parts
-            }
-            print(f"Generated Rubric #{i+1} for Idea ID '{joke_idea['id']}': {rubric}")
-            rubrics.append(rubric)
-        else:
-            print(f"Warning: LLM response for generate_rubric was not in the expected format. Got: {llm_generated_rubric_parts}")
-            fallback = _fallback_placeholder_response("generate_rubric", joke_idea['id'])
-            fallback["id"] = str(uuid.uuid4())  # Ensure unique ID even for fallbacks
-            rubrics.append(fallback)
+        rubric = {
+            "id": str(uuid.uuid4()),
+            "idea_id": joke_idea['id'],
+            **llm_generated_rubric_parts
+        }
+        print(f"Generated Rubric #{i+1} for Idea ID '{joke_idea['id']}': {rubric}")
+        rubrics.append(rubric)
     
     return rubrics
 
@@ -197,13 +223,19 @@ def critique_and_refine_rubrics(original_rubrics: list, joke_idea: dict, theme:
     Returns:
         List of refined/alternative rubric dictionaries
     """
-    if not original_rubrics or not joke_idea or 'concept' not in joke_idea or 'id' not in joke_idea:
+    if not original_rubrics:
+        return []
+    if not joke_idea or 'concept' not in joke_idea or 'id' not in joke_idea:
         print("Error: Invalid inputs to critique_and_refine_rubrics.")
-        return [_fallback_placeholder_response("critique_and_refine_rubric", "error_idea_id")]
+        FALLBACKS.record_skipped("critiques", len(original_rubrics) * num_critiques_per_rubric)
+        return []
 
     refined_rubrics = []
     
     for i, original_rubric in enumerate(original_rubrics):
+        if is_fallback(original_rubric):
+            FALLBACKS.record_skipped("critiques", num_critiques_per_rubric)
+            continue
         print(f"\nCritiquing rubric {i+1}/{len(original_rubrics)} for idea '{joke_idea['concept']}'")
         
         for j in range(num_critiques_per_rubric):
@@ -225,23 +257,25 @@ def critique_and_refine_rubrics(original_rubrics: list, joke_idea: dict, theme:
                 "Example: {'type': 'Character-based', ..., 'critique_of_original': 'The first rubric was too generic...'}"
             )
             
-            llm_generated_refined_parts = _openai_llm_call(prompt_content, f"critique_rubric_{i+1}_{j+1}", expected_format)
+            llm_generated_refined_parts = call_with_retry(
+                _validated_llm_call, "critiques",
+                prompt_content, f"critique_rubric_{i+1}_{j+1}", expected_format,
+                ['type', 'structure', 'key_elements', 'tone', 'critique_of_original']
+            )
 
-            if isinstance(llm_generated_refined_parts, dict) and all(k in llm_generated_refined_parts for k in ['type', 'structure', 'key_elements', 'tone', 'critique_of_original']):
-                refined_rubric = {
-                    "id": str(uuid.uuid4()),
-                    "idea_id": joke_idea['id'],
-                    "original_rubric_id": original_rubric.get("id", "unknown"),
-                    **llm_generated_refined_parts
-                }
-                print(f"Refined Rubric #{j+1} for Original Rubric ID '{original_rubric.get('id')}': {refined_rubric}")
-                refined_rubrics.append(refined_rubric)
-            else:
-                print(f"Warning: LLM response for critique_and_refine_rubric was not in the expected format. Got: {llm_generated_refined_parts}")
-                fallback = _fallback_placeholder_response("critique_and_refine_rubric", joke_idea['id'])
-                fallback["id"] = str(uuid.uuid4())  # Ensure unique ID even for fallbacks
-                fallback["original_rubric_id"] = original_rubric.get("id", "unknown")
-                refined_rubrics.append(fallback)
+            if is_fallback(llm_generated_refined_parts):
+                print(f"Pruning critique #{j+1} of rubric '{original_rubric.get('id')}' after failed generation")
+                FALLBACKS.record_pruned("critiques")
+                continue
+
+            refined_rubric = {
+                "id": str(uuid.uuid4()),
+                "idea_id": joke_idea['id'],
+                "original_rubric_id": original_rubric.get("id", "unknown"),
+                **llm_generated_refined_parts
+            }
+            print(f"Refined Rubric #{j+1} for Original Rubric ID '{original_rubric.get('id')}': {refined_rubric}")
+            refined_rubrics.append(refined_rubric)
     
     return refined_rubrics
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Joke Batch - Run the multi-stage pipeline through batch request files
+
+Large overnight sweeps hold thousands of synchronous connections open. A
+batch run instead compiles every call the pipeline is waiting on into an
+OpenAI-batch-style JSONL request file, which can be submitted to a batch
+endpoint; ingesting the endpoint's output file advances the pipeline by a
+stage (see utils/batch.py). Each pass re-runs the pipeline with every
+ingested response replayed, so it needs no network access. The process
+command is a local stand-in for the batch endpoint.
+
+A run directory holds the run settings (batch.json), the ingested responses
+(responses.jsonl), each pass's request and output files and, once no call
+is pending, results.json (and judgments.json with --judge).
+
+Usage:
+  python joke_batch.py init runs/penguins --theme penguins --ideas 5 --judge
+  python joke_batch.py compile runs/penguins
+  python joke_batch.py process runs/penguins/requests_001.jsonl
+  python joke_batch.py ingest runs/penguins runs/penguins/output_001.jsonl
+  python joke_batch.py run runs/penguins --concurrency 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+SETTINGS_FILE = "batch.json"
+STORE_FILE = "responses.jsonl"
+
+
+def _load_settings(run_dir: str) -> dict:
+    with open(os.path.join(run_dir, SETTINGS_FILE)) as f:
+        return json.load(f)
+
+
+def _save_settings(run_dir: str, settings: dict):
+    with open(os.path.join(run_dir, SETTINGS_FILE), "w") as f:
+        json.dump(settings, f, indent=2)
+
+
+def init_run(run_dir: str, theme: str, num_ideas: int, rubrics_per_idea: int, critiques_per_rubric: int,
+             cascade_keep: float = None, judge: bool = False, routing: dict = None) -> dict:
+    """
+    Create a run directory with the settings every pass of the run uses.
+
+    Raises:
+        FileExistsError: The directory already holds a batch run
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    if os.path.exists(os.path.join(run_dir, SETTINGS_FILE)):
+        raise FileExistsError(f"{run_dir} already holds a batch run")
+    settings = {
+        "theme": theme,
+        "num_ideas": num_ideas,
+        "rubrics_per_idea": rubrics_per_idea,
+        "critiques_per_rubric": critiques_per_rubric,
+        "cascade_keep": cascade_keep,
+        "judge": judge,
+        "routing": routing or {},
+        "passes": 0,
+    }
+    _save_settings(run_dir, settings)
+    return settings
+
+
+def compile_pass(run_dir: str, verbose: bool = False) -> dict:
+    """
+    Run the pipeline as far as the ingested responses allow and write the
+    calls it is waiting on as the next batch request file.
+
+    Args:
+        run_dir: Run directory created by init_run
+        verbose: Show the pipeline's own output
+
+    Returns:
+        {"pass", "pending": {stage: requests}, "requests": request file or None,
+         "replayed": responses used, "complete": True once results are written}
+    """
+    from main import generate_multistage_jokes
+    from utils.batch import BatchRun, batch_scope
+    from utils.routing import configure_routing
+
+    settings = _load_settings(run_dir)
+    configure_routing(settings["routing"])
+    run = BatchRun(os.path.join(run_dir, STORE_FILE))
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    quiet_errors = contextlib.nullcontext() if verbose else contextlib.redirect_stderr(io.StringIO())
+    judgments = None
+    with quiet, quiet_errors, batch_scope(run), tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        results = generate_multistage_jokes(settings["theme"], settings["num_ideas"], settings["rubrics_per_idea"],
+                                            settings["critiques_per_rubric"], output,
+                                            cascade_keep=settings["cascade_keep"])
+        # Jokes are judged once generation no longer waits on any call
+        if results and not run.pending and settings["judge"]:
+            from joke_judge import JokeJudge
+            judge = JokeJudge()
+            judgments = [judge.judge_joke(joke) for joke in judge.load_multistage_jokes(output)]
+
+    summary = {"pass": settings["passes"], "pending": run.pending_by_stage(), "requests": None,
+               "replayed": run.replayed, "complete": False}
+    if run.pending:
+        settings["passes"] += 1
+        path = os.path.join(run_dir, f"requests_{settings['passes']:03d}.jsonl")
+        run.write_requests(path)
+        _save_settings(run_dir, settings)
+        summary.update({"pass": settings["passes"], "requests": path})
+    elif results:
+        with open(os.path.join(run_dir, "results.json"), "w") as f:
+            json.dump(results, f, indent=2)
+        if judgments is not None:
+            with open(os.path.join(run_dir, "judgments.json"), "w") as f:
+                json.dump({"judgments": judgments}, f, indent=2)
+        summary["complete"] = True
+    return summary
+
+
+def _output_path(requests_path: str) -> str:
+    path = Path(requests_path)
+    name = path.name.replace("requests", "output", 1) if "requests" in path.name else f"output_{path.name}"
+    return str(path.with_name(name))
+
+
+def _print_compile(summary: dict):
+    if summary["requests"]:
+        stages = ", ".join(f"{stage} {count}" for stage, count in summary["pending"].items())
+        print(f"Pass {summary['pass']}: {sum(summary['pending'].values())} requests pending ({stages}); "
+              f"{summary['replayed']} answered calls replayed")
+        print(f"Request file: {summary['requests']}")
+    elif summary["complete"]:
+        print(f"Run complete after {summary['pass']} passes ({summary['replayed']} calls replayed)")
+    else:
+        print("The pipeline produced no results and no pending requests; run compile with --verbose to see why")
+
+
+def main():
+    """Main function to handle CLI arguments"""
+    from utils.config import initialize_config
+
+    parser = argparse.ArgumentParser(description="Run the joke pipeline through offline batch request files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init = commands.add_parser("init", help="Create a batch run directory")
+    init.add_argument("run_dir", help="Run directory")
+    init.add_argument("--theme", default=None, help="Joke theme (default: DEFAULT_THEME)")
+    init.add_argument("--ideas", type=int, default=None, help="Number of joke ideas")
+    init.add_argument("--rubrics", type=int, default=None, help="Rubrics per idea")
+    init.add_argument("--critiques", type=int, default=None, help="Critiques per rubric")
+    init.add_argument("--cascade", type=float, nargs="?", const=0.5, default=None, metavar="KEEP",
+                      help="Draft-then-refine Stage 5, refining the KEEP fraction of drafts (default: 0.5)")
+    init.add_argument("--judge", action="store_true", help="Judge the jokes as the run's last stage")
+    init.add_argument("--routing", metavar="FILE", help="Per-stage routing JSON file (see utils/routing.py)")
+
+    compile_command = commands.add_parser("compile", help="Write the requests the run is waiting on")
+    compile_command.add_argument("run_dir", help="Run directory")
+    compile_command.add_argument("--verbose", action="store_true", help="Show the pipeline's output")
+
+    process = commands.add_parser("process", help="Process a request file locally, like a batch endpoint")
+    process.add_argument("requests", help="Batch request file")
+    process.add_argument("-o", "--output", help="Output file (default: requests_NNN -> output_NNN)")
+    process.add_argument("--routing", metavar="FILE", help="Routing file for routed stage endpoints")
+
+    ingest = commands.add_parser("ingest", help="Ingest a batch output file into the run")
+    ingest.add_argument("run_dir", help="Run directory")
+    ingest.add_argument("output", help="Batch output file")
+
+    run = commands.add_parser("run", help="Compile, process locally and ingest until the run is complete")
+    run.add_argument("run_dir", help="Run directory")
+    run.add_argument("--max-passes", type=int, default=20, help="Stop after this many passes (default: 20)")
+
+    for command in (process, run):
+        command.add_argument("--concurrency", type=int, default=4, help="Requests sent at once (default: 4)")
+        command.add_argument("--replay", metavar="CASSETTE",
+                             help="Answer requests from CASSETTE instead of the network")
+
+    args = parser.parse_args()
+
+    from utils.batch import ingest_output, process_requests
+    from utils.routing import configure_routing, load_routing_file
+
+    if args.command == "init":
+        from utils.config import (
+            DEFAULT_THEME, DEFAULT_NUM_IDEAS, DEFAULT_RUBRICS_PER_IDEA, DEFAULT_CRITIQUES_PER_RUBRIC
+        )
+        try:
+            routing = load_routing_file(args.routing) if args.routing else {}
+            init_run(args.run_dir, args.theme or DEFAULT_THEME,
+                     args.ideas if args.ideas is not None else DEFAULT_NUM_IDEAS,
+                     args.rubrics if args.rubrics is not None else DEFAULT_RUBRICS_PER_IDEA,
+                     args.critiques if args.critiques is not None else DEFAULT_CRITIQUES_PER_RUBRIC,
+                     cascade_keep=args.cascade, judge=args.judge, routing=routing)
+        except (OSError, ValueError) as e:
+            print(f"Cannot create the run: {e}")
+            return
+        print(f"Batch run created in {args.run_dir}; next: python joke_batch.py compile {args.run_dir}")
+        return
+
+    if args.command == "ingest":
+        summary = ingest_output(args.output, os.path.join(args.run_dir, STORE_FILE))
+        print(f"Ingested {summary['ingested']} responses; {len(summary['failed'])} failed")
+        for custom_id, reason in list(summary["failed"].items())[:10]:
+            print(f"  - {custom_id}: {reason}")
+        if summary["failed"]:
+            print("Failed requests are compiled again by the next pass.")
+        return
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        configured = initialize_config()
+    if not configured:
+        print("Failed to initialize configuration. Please check your .env file.")
+        return
+    if getattr(args, "replay", None):
+        from utils.cassette import configure_cassette
+        configure_cassette(args.replay, "replay")
+
+    if args.command == "compile":
+        _print_compile(compile_pass(args.run_dir, verbose=args.verbose))
+
+    elif args.command == "process":
+        if args.routing:
+            configure_routing(load_routing_file(args.routing))
+        output = args.output or _output_path(args.requests)
+        summary = process_requests(args.requests, output, concurrency=args.concurrency)
+        print(f"Processed {summary['completed'] + summary['failed']} requests "
+              f"({summary['failed']} failed); output file: {output}")
+
+    elif args.command == "run":
+        for _ in range(args.max_passes):
+            summary = compile_pass(args.run_dir)
+            _print_compile(summary)
+            if not summary["requests"]:
+                return
+            configure_routing(_load_settings(args.run_dir)["routing"])
+            output = _output_path(summary["requests"])
+            processed = process_requests(summary["requests"], output, concurrency=args.concurrency)
+            ingested = ingest_output(output, os.path.join(args.run_dir, STORE_FILE))
+            print(f"  processed {processed['completed']} ({processed['failed']} failed), "
+                  f"ingested {ingested['ingested']}")
+        print(f"Stopped after {args.max_passes} passes; resume with python joke_batch.py run {args.run_dir}")
+
+
+if __name__ == "__main__":
+    main()
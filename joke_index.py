@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Joke Index - Full-text search over every generated joke
+
+Ingests multi-stage results (jokes with their ideas and rubrics), baseline
+files, interactive session logs (.jsonl) and judgment files into a local
+SQLite database with an FTS5 index, so past jokes can be searched by text,
+theme, rubric type, tone, method and score range without parsing the source
+JSON again. Scores are the mean Overall judgment of each joke across all
+ingested judgment files.
+
+Files are re-ingested only when their size or modification time changed; a
+re-ingested file replaces everything it previously contributed.
+
+Usage:
+  python joke_index.py ingest results.json baseline.json joke_judgments.json
+  python joke_index.py search "penguin tuxedo" --type pun --min-score 7
+  python joke_index.py search --theme penguins --tone sarcastic --limit 5 --json
+  python joke_index.py stats
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    items INTEGER
+);
+CREATE TABLE IF NOT EXISTS jokes (
+    rowid INTEGER PRIMARY KEY,
+    joke_id TEXT UNIQUE NOT NULL,
+    source_id INTEGER NOT NULL,
+    method TEXT,
+    theme TEXT,
+    text TEXT NOT NULL,
+    idea TEXT,
+    rubric_type TEXT,
+    tone TEXT,
+    structure TEXT,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS jokes_source ON jokes(source_id);
+CREATE INDEX IF NOT EXISTS jokes_score ON jokes(score);
+CREATE INDEX IF NOT EXISTS jokes_method ON jokes(method, score);
+CREATE TABLE IF NOT EXISTS judgments (
+    joke_id TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    overall REAL,
+    scores TEXT,
+    analysis TEXT
+);
+CREATE INDEX IF NOT EXISTS judgments_joke ON judgments(joke_id);
+CREATE INDEX IF NOT EXISTS judgments_source ON judgments(source_id);
+
+-- External-content FTS5 index over the searchable joke columns. ingest()
+-- maintains it with bulk statements, which is several times faster than
+-- per-row triggers.
+CREATE VIRTUAL TABLE IF NOT EXISTS jokes_fts USING fts5(
+    text, theme, idea, rubric_type, tone, content='jokes', content_rowid='rowid',
+    tokenize='porter unicode61'
+);
+CREATE TEMP TABLE IF NOT EXISTS incoming (joke_id TEXT PRIMARY KEY);
+"""
+
+# Joke rows as (joke_id, method, theme, text, idea, rubric_type, tone, structure)
+JOKE_COLUMNS = "joke_id, method, theme, text, idea, rubric_type, tone, structure"
+FTS_COLUMNS = "text, theme, idea, rubric_type, tone"
+
+
+def _phrase(value: str) -> str:
+    """Quote a user value as an FTS5 phrase."""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _multistage_rows(data: dict) -> List[tuple]:
+    ideas = {idea.get("id"): idea for idea in data.get("joke_ideas", [])}
+    rubrics = {rubric.get("id"): rubric for rubric in data.get("rubrics", [])}
+    rows = []
+    for joke in data.get("jokes", []):
+        if "text" not in joke:
+            continue
+        idea = ideas.get(joke.get("idea_id"), {})
+        rubric = rubrics.get(joke.get("rubric_id"), {})
+        metadata = joke.get("metadata") or {}
+        rows.append((
+            joke.get("id"), "multi-stage", joke.get("theme") or data.get("theme"), joke["text"],
+            idea.get("concept"),
+            rubric.get("type") or metadata.get("joke_type"),
+            rubric.get("tone") or metadata.get("tone"),
+            rubric.get("structure") or metadata.get("structure"),
+        ))
+    return rows
+
+
+def _baseline_rows(jokes: list, theme: str = None) -> List[tuple]:
+    return [
+        (joke.get("id"), "baseline", joke.get("prompt") or theme, joke["text"],
+         None, joke.get("type"), joke.get("tone"), joke.get("approach"))
+        for joke in jokes if isinstance(joke, dict) and "text" in joke
+    ]
+
+
+def _judgment_rows(data: dict) -> List[tuple]:
+    rows = []
+    for judgment in data.get("judgments", []):
+        if not judgment.get("joke_id"):
+            continue
+        try:
+            overall = float(judgment.get("overall"))
+        except (TypeError, ValueError):
+            overall = None
+        rows.append((judgment["joke_id"], overall, json.dumps(judgment.get("scores", {})),
+                     judgment.get("analysis")))
+    return rows
+
+
+class JokeIndex:
+    """
+    SQLite FTS5 index of generated jokes and their judgments.
+
+    Args:
+        path: Database file (default: JOKE_INDEX_FILE from configuration)
+    """
+
+    def __init__(self, path: str = None):
+        if path is None:
+            from utils.config import JOKE_INDEX_FILE
+            path = JOKE_INDEX_FILE
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _delete_jokes(self, where: str, params: tuple = ()):
+        """Delete matching jokes and their full-text entries."""
+        self.conn.execute(f"INSERT INTO jokes_fts(jokes_fts, rowid, {FTS_COLUMNS}) "
+                          f"SELECT 'delete', rowid, {FTS_COLUMNS} FROM jokes WHERE {where}", params)
+        self.conn.execute(f"DELETE FROM jokes WHERE {where}", params)
+
+    def ingest(self, path: str, force: bool = False) -> int:
+        """
+        Index one results, baseline, session (.jsonl) or judgments file.
+
+        Args:
+            path: File to ingest
+            force: Re-ingest even if the file is unchanged since the last ingest
+
+        Returns:
+            Number of jokes or judgments indexed (0 if skipped)
+        """
+        resolved = str(Path(path).resolve())
+        stat = os.stat(resolved)
+        existing = self.conn.execute("SELECT id, size, mtime FROM sources WHERE path = ?", (resolved,)).fetchone()
+        if existing and not force and existing["size"] == stat.st_size and existing["mtime"] == stat.st_mtime:
+            return 0
+
+        joke_rows, judgment_rows = [], []
+        if resolved.endswith(".jsonl"):
+            kind = "session"
+            with open(resolved) as f:
+                for line in f:
+                    if line.strip():
+                        turn = json.loads(line)
+                        joke_rows.extend(_baseline_rows(turn.get("jokes", []), turn.get("prompt")))
+        else:
+            with open(resolved) as f:
+                data = json.load(f)
+            if "judgments" in data:
+                kind, judgment_rows = "judgments", _judgment_rows(data)
+            elif "rubrics" in data or "joke_ideas" in data:
+                kind, joke_rows = "multistage", _multistage_rows(data)
+            elif "jokes" in data:
+                kind = "baseline"
+                joke_rows = _baseline_rows(data["jokes"], (data.get("config") or {}).get("prompt"))
+            else:
+                raise ValueError(f"{path} is not a results, baseline or judgments file")
+
+        # Jokes without an id get one derived from their position in the file;
+        # a joke listed twice keeps its last occurrence
+        joke_rows = list({(row[0] or f"{resolved}#{i}"): (row[0] or f"{resolved}#{i}",) + row[1:]
+                          for i, row in enumerate(joke_rows)}.values())
+
+        with self.conn:
+            if existing:
+                source_id = existing["id"]
+                affected = [row[0] for row in self.conn.execute(
+                    "SELECT joke_id FROM judgments WHERE source_id = ?", (source_id,))]
+                self._delete_jokes("source_id = ?", (source_id,))
+                self.conn.execute("DELETE FROM judgments WHERE source_id = ?", (source_id,))
+                self.conn.execute("UPDATE sources SET kind = ?, size = ?, mtime = ?, items = ? WHERE id = ?",
+                                  (kind, stat.st_size, stat.st_mtime, len(joke_rows) + len(judgment_rows), source_id))
+            else:
+                affected = []
+                source_id = self.conn.execute(
+                    "INSERT INTO sources(path, kind, size, mtime, items) VALUES (?, ?, ?, ?, ?)",
+                    (resolved, kind, stat.st_size, stat.st_mtime, len(joke_rows) + len(judgment_rows))
+                ).lastrowid
+
+            if joke_rows:
+                # The same joke ingested from another file (e.g. a copy of a run) is replaced
+                self.conn.execute("DELETE FROM incoming")
+                self.conn.executemany("INSERT INTO incoming(joke_id) VALUES (?)", [(row[0],) for row in joke_rows])
+                self._delete_jokes("joke_id IN (SELECT joke_id FROM incoming)")
+                self.conn.executemany(
+                    f"INSERT INTO jokes({JOKE_COLUMNS}, source_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row + (source_id,) for row in joke_rows]
+                )
+                self.conn.execute(f"INSERT INTO jokes_fts(rowid, {FTS_COLUMNS}) "
+                                  f"SELECT rowid, {FTS_COLUMNS} FROM jokes WHERE source_id = ?", (source_id,))
+            self.conn.executemany(
+                "INSERT INTO judgments(joke_id, source_id, overall, scores, analysis) VALUES (?, ?, ?, ?, ?)",
+                [(row[0], source_id) + row[1:] for row in judgment_rows]
+            )
+            # Refresh mean scores of jokes whose judgments or rows changed
+            mean_score = "(SELECT AVG(overall) FROM judgments WHERE judgments.joke_id = jokes.joke_id)"
+            if joke_rows:
+                self.conn.execute(f"UPDATE jokes SET score = {mean_score} WHERE source_id = ? "
+                                  f"AND joke_id IN (SELECT joke_id FROM judgments)", (source_id,))
+            self.conn.executemany(f"UPDATE jokes SET score = {mean_score} WHERE joke_id = ?",
+                                  [(joke_id,) for joke_id in set(affected) | {row[0] for row in judgment_rows}])
+        return len(joke_rows) + len(judgment_rows)
+
+    def search(self, query: str = None, theme: str = None, rubric_type: str = None, tone: str = None,
+               method: str = None, min_score: float = None, max_score: float = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Search indexed jokes.
+
+        Text filters (query, theme, rubric_type, tone) go through the FTS5
+        index, so they match words rather than whole values ("sarcastic"
+        finds tone "Witty, sarcastic"). Results are ranked by text relevance
+        when there is a query, otherwise by score (unjudged jokes last).
+
+        Args:
+            query: FTS5 query over joke text, idea, theme, rubric type and tone
+            theme: Words that must appear in the theme
+            rubric_type: Words that must appear in the rubric (joke) type
+            tone: Words that must appear in the tone
+            method: "multi-stage" or "baseline"
+            min_score: Minimum mean Overall score (unjudged jokes are excluded)
+            max_score: Maximum mean Overall score
+            limit: Maximum results
+
+        Returns:
+            List of joke dictionaries with their score and source file
+        """
+        match = []
+        if query:
+            match.append(f"({query})")
+        for column, value in (("theme", theme), ("rubric_type", rubric_type), ("tone", tone)):
+            if value:
+                match.append(f"{column} : {_phrase(value)}")
+
+        where, params = [], []
+        if match:
+            where.append("jokes_fts MATCH ?")
+            params.append(" AND ".join(match))
+        if method:
+            where.append("jokes.method = ?")
+            params.append(method)
+        if min_score is not None:
+            where.append("jokes.score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("jokes.score <= ?")
+            params.append(max_score)
+
+        sql = (f"SELECT jokes.*, sources.path AS source, "
+               f"(SELECT COUNT(*) FROM judgments WHERE judgments.joke_id = jokes.joke_id) AS judgments "
+               f"FROM {'jokes_fts JOIN jokes ON jokes.rowid = jokes_fts.rowid' if match else 'jokes'} "
+               f"JOIN sources ON sources.id = jokes.source_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + ("jokes_fts.rank" if query else "jokes.score DESC")
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        results = []
+        for row in self.conn.execute(sql, params):
+            result = dict(row)
+            result.pop("rowid", None)
+            result.pop("source_id", None)
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {row["method"]: row["n"] for row in
+                  self.conn.execute("SELECT method, COUNT(*) AS n FROM jokes GROUP BY method")}
+        return {
+            "jokes": sum(counts.values()),
+            "by_method": counts,
+            "judged": self.conn.execute("SELECT COUNT(*) FROM jokes WHERE score IS NOT NULL").fetchone()[0],
+            "judgments": self.conn.execute("SELECT COUNT(*) FROM judgments").fetchone()[0],
+            "sources": [dict(row) for row in self.conn.execute("SELECT path, kind, items FROM sources ORDER BY id")],
+        }
+
+
+def _default_sources() -> List[str]:
+    from utils.config import DEFAULT_OUTPUT_FILE, BASELINE_OUTPUT_FILE
+    return [path for path in (DEFAULT_OUTPUT_FILE, BASELINE_OUTPUT_FILE, "joke_judgments.json")
+            if os.path.exists(path)]
+
+
+def main():
+    """Main function to handle CLI arguments"""
+    parser = argparse.ArgumentParser(description="Index and search every generated joke")
+    parser.add_argument("--db", default=None, help="Index database (default: JOKE_INDEX_FILE, jokes.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Index results, baseline, session and judgment files")
+    ingest.add_argument("files", nargs="*",
+                        help="Files to ingest (default: the configured results and baseline files and joke_judgments.json)")
+    ingest.add_argument("--force", action="store_true", help="Re-ingest files even if unchanged")
+
+    search = commands.add_parser("search", help="Search indexed jokes")
+    search.add_argument("query", nargs="?", default=None, help="Full-text query (FTS5 syntax)")
+    search.add_argument("--theme", help="Theme words")
+    search.add_argument("--type", dest="rubric_type", help="Rubric/joke type words")
+    search.add_argument("--tone", help="Tone words")
+    search.add_argument("--method", choices=["multi-stage", "baseline"], help="Generation method")
+    search.add_argument("--min-score", type=float, default=None, help="Minimum mean Overall score")
+    search.add_argument("--max-score", type=float, default=None, help="Maximum mean Overall score")
+    search.add_argument("--limit", type=int, default=20, help="Maximum results (default: 20)")
+    search.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    commands.add_parser("stats", help="Show index statistics")
+
+    args = parser.parse_args()
+    index = JokeIndex(args.db)
+
+    try:
+        if args.command == "ingest":
+            files = args.files or _default_sources()
+            if not files:
+                print("Nothing to ingest: pass result, baseline or judgment files")
+                return
+            for path in files:
+                try:
+                    count = index.ingest(path, force=args.force)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping {path}: {e}")
+                    continue
+                print(f"{path}: {'unchanged' if count == 0 else f'indexed {count} items'}")
+            stats = index.stats()
+            print(f"Index {index.path}: {stats['jokes']} jokes, {stats['judged']} judged")
+
+        elif args.command == "search":
+            try:
+                results = index.search(args.query, theme=args.theme, rubric_type=args.rubric_type, tone=args.tone,
+                                       method=args.method, min_score=args.min_score, max_score=args.max_score,
+                                       limit=args.limit)
+            except sqlite3.OperationalError as e:
+                print(f"Invalid search query: {e}")
+                return
+            if args.json:
+                print(json.dumps(results, indent=2))
+                return
+            if not results:
+                print("No matching jokes.")
+            for i, joke in enumerate(results, 1):
+                score = f"{joke['score']:.1f}" if joke["score"] is not None else "unjudged"
+                details = ", ".join(str(value) for value in (joke["theme"], joke["rubric_type"], joke["tone"]) if value)
+                print(f"\n{i}. [{joke['method']}, {score}] {joke['text']}")
+                if details:
+                    print(f"   {details}")
+                if joke["idea"]:
+                    print(f"   Idea: {joke['idea']}")
+
+        elif args.command == "stats":
+            print(json.dumps(index.stats(), indent=2))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
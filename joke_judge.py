@@ -10,33 +10,45 @@ Usage:
   python joke_judge.py --multistage results.json --baseline baseline_jokes.json
   python joke_judge.py --help
   python joke_judge.py --multistage results.json --baseline baseline.json --api-endpoint "https://openrouter.ai/api/v1"
+  python joke_judge.py --multistage results.json --baseline baseline.json --sequential --ci-width 0.5
+  python joke_judge.py --multistage results.json --baseline baseline.json --replay judge.jsonl.gz
+  python joke_judge.py --multistage results.json --baseline baseline.json --ensemble judge-a,judge-b
 """
 
 import argparse
 import json
+import math
 import os
 import statistics
 import re
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
-from openai import OpenAI
 from utils.config import get_api_base_url, get_openai_key, get_openrouter_key, JUDGE_MODEL
+from utils.deadline import DeadlineExceeded, deadline_expired
+from utils.llm import get_client, chat_completion, stage_output_limits
+from utils.routing import stage_route
 
 class JokeJudge:
-    def __init__(self, model: str = JUDGE_MODEL, api_endpoint: str = None, api_key: str = None):
+    def __init__(self, model: str = None, api_endpoint: str = None, api_key: str = None):
         """
         Initialize the joke judge.
         
         Args:
-            model: Model to use for judging
-            api_endpoint: Custom API endpoint URL (e.g., OpenRouter)
+            model: Model to use for judging (default: the judge stage's routed model, or JUDGE_MODEL)
+            api_endpoint: Custom API endpoint URL (e.g., OpenRouter; default: the judge
+                          stage's routed endpoint, or the configured base URL)
             api_key: API key for the endpoint
         """
-        self.model = model
+        route = stage_route("judge")
+        self.model = model or route.get("model") or JUDGE_MODEL
         
         # Use OpenRouter API if endpoint is specified
         if api_endpoint and api_endpoint.strip():
-            self.client = OpenAI(
+            self.client = get_client(
                 base_url=api_endpoint,
                 api_key=api_key or get_openrouter_key(),
                 default_headers={
@@ -45,9 +57,12 @@ class JokeJudge:
                 }
             )
             print(f"Using custom API endpoint: {api_endpoint}")
+        elif route.get("base_url"):
+            self.client = get_client(base_url=route["base_url"], api_key=api_key or get_openai_key())
+            print(f"Using routed judge endpoint: {route['base_url']}")
         else:
             # Use default endpoint from configuration
-            self.client = OpenAI(
+            self.client = get_client(
                 base_url=get_api_base_url(),
                 api_key=get_openai_key()
             )
@@ -212,31 +227,79 @@ class JokeJudge:
             print(f"Error loading baseline jokes: {e}")
             return []
 
-    def judge_joke(self, joke: Dict[str, Any]) -> Dict[str, Any]:
+    JUDGE_SYSTEM_PROMPT = (
+        "You are an expert comedy critic with decades of experience evaluating jokes. "
+        "Be honest, fair, and precise in your evaluations. Return your analysis and scores in valid JSON format."
+    )
+
+    def _joke_context(self, joke: Dict[str, Any]) -> str:
+        """
+        Build the idea/rubric context lines shown to the judge for multi-stage jokes.
+        
+        Args:
+            joke: The joke dictionary to describe
+            
+        Returns:
+            Context string (empty for baseline jokes)
+        """
+        context_info = ""
+        if joke["method"] == "multi-stage" and "idea" in joke and "rubric" in joke:
+            if joke["idea"].get("concept"):
+                context_info += f"\nIdea Concept: {joke['idea']['concept']}"
+            
+            if joke["rubric"].get("type") and joke["rubric"].get("structure"):
+                context_info += f"\nRubric Type: {joke['rubric']['type']}"
+                context_info += f"\nRubric Structure: {joke['rubric']['structure']}"
+                context_info += f"\nRubric Tone: {joke['rubric']['tone']}"
+                
+                if joke["rubric"].get("key_elements"):
+                    elements_str = ", ".join(joke["rubric"]["key_elements"])
+                    context_info += f"\nKey Elements: {elements_str}"
+        return context_info
+
+    def _has_all_scores(self, result: Dict[str, Any]) -> bool:
+        return all(param in result for param in self.evaluation_params + ["Overall", "Analysis"])
+
+    def _build_judgment(self, joke: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert parsed judge output into the judgment record format."""
+        return {
+            "joke_id": joke["id"],
+            "method": joke["method"],
+            "text": joke["text"],
+            "analysis": result.get("Analysis", "No analysis provided"),
+            "scores": {
+                param: result.get(param, 5) for param in self.evaluation_params
+            },
+            "overall": result.get("Overall", 5)
+        }
+
+    def _error_judgment(self, joke: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "joke_id": joke["id"],
+            "method": joke["method"],
+            "text": joke["text"],
+            "analysis": "Error during evaluation",
+            "scores": {param: 5 for param in self.evaluation_params},
+            "overall": 5
+        }
+
+    def judge_joke(self, joke: Dict[str, Any], model: str = None, seed: int = None) -> Dict[str, Any]:
         """
         Judge a single joke using the LLM, scoring it on various parameters.
         
         Args:
             joke: The joke dictionary to judge
+            model: Model to judge with instead of self.model
+            seed: Optional sampling seed sent with the request
             
         Returns:
             Dictionary with scores and explanation
         """
+        from utils.profiling import span
+
         try:
             # Construct context information based on method
-            context_info = ""
-            if joke["method"] == "multi-stage" and "idea" in joke and "rubric" in joke:
-                if joke["idea"].get("concept"):
-                    context_info += f"\nIdea Concept: {joke['idea']['concept']}"
-                
-                if joke["rubric"].get("type") and joke["rubric"].get("structure"):
-                    context_info += f"\nRubric Type: {joke['rubric']['type']}"
-                    context_info += f"\nRubric Structure: {joke['rubric']['structure']}"
-                    context_info += f"\nRubric Tone: {joke['rubric']['tone']}"
-                    
-                    if joke["rubric"].get("key_elements"):
-                        elements_str = ", ".join(joke["rubric"]["key_elements"])
-                        context_info += f"\nKey Elements: {elements_str}"
+            context_info = self._joke_context(joke)
             
             prompt = (
                 f"As a professional comedy critic, evaluate the following joke objectively:\n\n"
@@ -253,58 +316,121 @@ class JokeJudge:
                 f"Format your response as valid JSON with keys for 'Analysis' and each parameter name, plus 'Overall'."
             )
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert comedy critic with decades of experience evaluating jokes. Be honest, fair, and precise in your evaluations. Return your analysis and scores in valid JSON format."},
+            raw_response_content = chat_completion(
+                [
+                    {"role": "system", "content": self.JUDGE_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
+                model=model or self.model,
                 temperature=0.3,
+                stage="judge",
+                client=self.client,
+                **({"seed": seed} if seed is not None else {}),
             )
             
-            raw_response_content = response.choices[0].message.content
             print(f"Raw LLM Response: {raw_response_content[:200]}...")
             
-            # Extract and clean JSON from response
-            json_str = self._extract_json_from_text(raw_response_content)
-            
-            try:
-                result = json.loads(json_str)
+            with span("parse judgment", "local"):
+                # Extract and clean JSON from response
+                json_str = self._extract_json_from_text(raw_response_content)
                 
-                # Ensure we have all expected fields
-                if not all(param in result for param in self.evaluation_params + ["Overall", "Analysis"]):
-                    # Try to extract scores using simpler parsing
+                try:
+                    result = json.loads(json_str)
+                    
+                    # Ensure we have all expected fields
+                    if not self._has_all_scores(result):
+                        # Try to extract scores using simpler parsing
+                        result = self._parse_non_json_response(raw_response_content)
+                except json.JSONDecodeError:
+                    # Failed to parse as JSON, use manual parsing
                     result = self._parse_non_json_response(raw_response_content)
-            except json.JSONDecodeError:
-                # Failed to parse as JSON, use manual parsing
-                result = self._parse_non_json_response(raw_response_content)
-            
-            judgment = {
-                "joke_id": joke["id"],
-                "method": joke["method"],
-                "text": joke["text"],
-                "analysis": result.get("Analysis", "No analysis provided"),
-                "scores": {
-                    param: result.get(param, 5) for param in self.evaluation_params
-                },
-                "overall": result.get("Overall", 5)
-            }
             
-            return judgment
+            return self._build_judgment(joke, result)
         
+        except DeadlineExceeded as e:
+            print(f"Not judged: {e}")
+            return self._error_judgment(joke)
         except Exception as e:
             print(f"Error judging joke: {e}")
             import traceback
             traceback.print_exc()
             
-            return {
-                "joke_id": joke["id"],
-                "method": joke["method"],
-                "text": joke["text"],
-                "analysis": "Error during evaluation",
-                "scores": {param: 5 for param in self.evaluation_params},
-                "overall": 5
-            }
+            return self._error_judgment(joke)
+
+    def judge_batch(self, jokes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Judge several jokes with a single multi-joke prompt.
+        
+        Jokes whose scores are missing or incomplete in the batched response
+        are re-judged individually with judge_joke.
+        
+        Args:
+            jokes: The joke dictionaries to judge
+            
+        Returns:
+            List of judgments in the same order as jokes
+        """
+        if len(jokes) == 1:
+            return [self.judge_joke(jokes[0])]
+        from utils.profiling import span
+        
+        joke_blocks = "\n\n".join(
+            f"[{i}] JOKE: \"{joke['text']}\"{self._joke_context(joke)}"
+            for i, joke in enumerate(jokes)
+        )
+        prompt = (
+            f"As a professional comedy critic, evaluate each of the following {len(jokes)} jokes "
+            f"objectively and independently of the others.\n\n"
+            f"JOKES:\n\n{joke_blocks}\n\n"
+            f"Please rate every joke on the following parameters (score 1-10 where 10 is best):\n"
+            f"- Humor Level: How funny is the joke?\n"
+            f"- Originality: How unique/novel is the joke?\n"
+            f"- Coherence: How well-structured and logical is the joke?\n"
+            f"- Cleverness: How intellectually satisfying is the joke?\n"
+            f"- Appropriateness: How suitable is the joke for a general audience?\n\n"
+            f"For each joke, provide a brief critical analysis (max 150 words), score each parameter "
+            f"individually, and give an overall score. Format your response as valid JSON: "
+            f"{{\"judgments\": [{{\"index\": 0, \"Analysis\": \"...\", \"Humor Level\": 7, \"Originality\": 7, "
+            f"\"Coherence\": 7, \"Cleverness\": 7, \"Appropriateness\": 7, \"Overall\": 7}}, ...]}} "
+            f"with exactly one entry per joke, using the bracketed index of the joke."
+        )
+        
+        results_by_index = {}
+        try:
+            raw_response_content = chat_completion(
+                [
+                    {"role": "system", "content": self.JUDGE_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                model=self.model,
+                temperature=0.3,
+                stage="judge",
+                client=self.client,
+                **stage_output_limits("judge", items=len(jokes)),
+            )
+            print(f"Raw LLM Batch Response ({len(jokes)} jokes): {raw_response_content[:200]}...")
+            
+            with span("parse batch judgment", "local", jokes=len(jokes)):
+                data = json.loads(self._extract_json_from_text(raw_response_content))
+                entries = data.get("judgments", []) if isinstance(data, dict) else data
+                for position, entry in enumerate(entries if isinstance(entries, list) else []):
+                    if not isinstance(entry, dict):
+                        continue
+                    index = entry.get("index", position)
+                    if isinstance(index, int) and 0 <= index < len(jokes) and self._has_all_scores(entry):
+                        results_by_index[index] = entry
+        except json.JSONDecodeError as e:
+            print(f"Batch judge response was not valid JSON ({e}); judging individually.")
+        except Exception as e:
+            print(f"Error judging joke batch: {e}")
+        
+        judgments = []
+        for i, joke in enumerate(jokes):
+            if i in results_by_index:
+                judgments.append(self._build_judgment(joke, results_by_index[i]))
+            else:
+                judgments.append(self.judge_joke(joke))
+        return judgments
 
     def _parse_non_json_response(self, raw_text: str) -> Dict[str, Any]:
         """
@@ -345,18 +471,30 @@ class JokeJudge:
         
         return result
 
-    def judge_all_jokes(self, jokes: List[Dict[str, Any]], output_file: str = None) -> List[Dict[str, Any]]:
+    def judge_all_jokes(self, jokes: List[Dict[str, Any]], output_file: str = None,
+                        coalescer: "JudgeCoalescer" = None,
+                        ensemble: "JudgeEnsemble" = None) -> List[Dict[str, Any]]:
         """
         Judge all jokes in the list.
         
         Args:
             jokes: List of joke dictionaries to judge
             output_file: Optional path to save judgments
+            coalescer: Optional JudgeCoalescer; all jokes are submitted up front
+                       so they can be judged in multi-joke batches
+            ensemble: Optional JudgeEnsemble judging each joke with an
+                      early-stopping ensemble (takes precedence over coalescer)
             
         Returns:
             List of judgment dictionaries
         """
+        from utils.profiling import span
+
         judgments = []
+        pending = [coalescer.submit(joke) for joke in jokes] if coalescer and not ensemble else None
+        judge_one = ensemble.judge_joke if ensemble else self.judge_joke
+        if ensemble:
+            ensemble.expect(len(jokes))
         
         for i, joke in enumerate(jokes):
             print(f"\nJudging joke {i+1}/{len(jokes)} ({joke['method']}):")
@@ -368,16 +506,21 @@ class JokeJudge:
                 if "rubric" in joke and joke["rubric"].get("type"):
                     print(f"  Rubric: {joke['rubric']['type']} (Tone: {joke['rubric'].get('tone', 'Unknown')})")
             
-            judgment = self.judge_joke(joke)
+            judgment = pending[i].result() if pending else judge_one(joke)
             judgments.append(judgment)
             
             # Print judgment summary
             print(f"  Analysis: {judgment['analysis'][:100]}...")
             print(f"  Overall Score: {judgment['overall']}/10")
+            if "ensemble" in judgment:
+                print(f"  Judges: {len(judgment['ensemble']['judges'])} ({judgment['ensemble']['stopped']})")
+        
+        if pending:
+            print(f"\nJudge batches: {coalescer.batches_sent} for {coalescer.jokes_judged} jokes")
         
         if output_file:
             try:
-                with open(output_file, 'w') as f:
+                with span("save judgments", "local"), open(output_file, 'w') as f:
                     json.dump({"judgments": judgments}, f, indent=2)
                 print(f"\nJudgments saved to {output_file}")
             except Exception as e:
@@ -385,6 +528,91 @@ class JokeJudge:
         
         return judgments
 
+    def judge_sequential(self, multistage_jokes: List[Dict[str, Any]], baseline_jokes: List[Dict[str, Any]],
+                         coalescer: "JudgeCoalescer" = None, max_half_width: float = 0.5,
+                         confidence: float = 0.95, min_per_method: int = 5, max_per_method: int = 0,
+                         round_size: int = 4, seed: int = None, progress=None,
+                         ensemble: "JudgeEnsemble" = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Judge stratified samples of both methods round by round, stopping once
+        the confidence interval on the difference in mean Overall score is
+        narrow enough. Stops early, keeping completed judgments, once an
+        active run deadline (utils/deadline.py) passes.
+        
+        Args:
+            multistage_jokes: Multi-stage jokes in the standard format
+            baseline_jokes: Baseline jokes in the standard format
+            coalescer: Optional JudgeCoalescer to batch each round's jokes
+            max_half_width: Stop once the interval half-width is at most this (score points)
+            confidence: Confidence level of the interval
+            min_per_method: Jokes judged per method before stopping is considered
+            max_per_method: Hard cap on jokes judged per method (0 for no cap)
+            round_size: Jokes per method judged between stopping checks
+            seed: Random seed for the stratified order
+            progress: Optional progress bar updated per judged joke
+            ensemble: Optional JudgeEnsemble judging each joke with an
+                      early-stopping ensemble (takes precedence over coalescer)
+            
+        Returns:
+            Tuple of (judgments, comparison summary)
+        """
+        from utils.sampling import stratified_order, SequentialComparison
+        
+        ordered = {
+            "multi-stage": stratified_order(multistage_jokes, seed),
+            "baseline": stratified_order(baseline_jokes, seed),
+        }
+        limit = min(len(ordered["multi-stage"]), len(ordered["baseline"]))
+        if max_per_method > 0:
+            limit = min(limit, max_per_method)
+        comparison = SequentialComparison(confidence=confidence, max_half_width=max_half_width,
+                                          min_per_method=min_per_method)
+        if ensemble:
+            ensemble.expect(2 * limit)
+        
+        judgments = []
+        taken = 0
+        stopped = "exhausted"
+        while taken < limit:
+            if deadline_expired():
+                stopped = "deadline"
+                break
+            step = max(1, round_size) if taken else max(round_size, comparison.min_per_method)
+            step = min(step, limit - taken)
+            round_jokes = [joke for pair in zip(ordered["multi-stage"][taken:taken + step],
+                                                ordered["baseline"][taken:taken + step]) for joke in pair]
+            if ensemble:
+                round_judgments = [ensemble.judge_joke(joke) for joke in round_jokes]
+            elif coalescer:
+                round_judgments = [future.result() for future in [coalescer.submit(joke) for joke in round_jokes]]
+            else:
+                round_judgments = [self.judge_joke(joke) for joke in round_jokes]
+            for judgment in round_judgments:
+                if deadline_expired() and judgment["analysis"] == "Error during evaluation":
+                    # Cut off by the run deadline: keep only completed judgments
+                    continue
+                judgments.append(judgment)
+                if judgment["analysis"] != "Error during evaluation":
+                    comparison.add(judgment["method"], judgment["overall"])
+            if progress is not None:
+                progress.update(len(round_jokes))
+            taken += step
+            
+            ci = comparison.interval()
+            if ci is not None:
+                print(f"\n  After {taken} per method: difference {ci[0]:+.2f} "
+                      f"({comparison.confidence:.0%} CI {ci[1]:+.2f} to {ci[2]:+.2f})")
+            if comparison.should_stop():
+                stopped = "confident"
+                break
+        
+        if stopped == "exhausted" and max_per_method > 0 and limit == max_per_method:
+            stopped = "max_per_method"
+        summary = comparison.summary()
+        summary["stopped"] = stopped
+        summary["available"] = {method: len(jokes) for method, jokes in ordered.items()}
+        return judgments, summary
+
     def calculate_statistics(self, judgments: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, float]]:
         """
         Calculate statistics for judgments, grouped by method.
@@ -486,25 +714,296 @@ class JokeJudge:
         
         print("="*60)
 
+class JudgeEnsemble:
+    """
+    Adaptive judge ensemble with early stopping.
+    
+    A single judge call is noisy, and a fixed N-judge ensemble costs N calls
+    per joke. Instead each joke is judged by the ensemble's members (a model
+    and sampling seed each) one at a time, stopping as soon as:
+    
+    - "agreed": the Overall scores so far lie within `tolerance` points, or
+    - "rank_settled": every score so far lies at least `rank_margin` points
+      above or below the current top-k threshold (the k-th best final score
+      judged so far), so more judges would not move the joke across it, or
+    - "max_judges": every member has judged the joke.
+    
+    Until k jokes are finished the threshold is provisional: once `warmup`
+    jokes are finished and the number of jokes to judge is known (expect()),
+    it is the score at the top-k fraction of the finished jokes. Without it
+    every joke before the k-th would need at least two calls.
+    
+    The joke's judgment is the mean of its members' scores. Clearly good or
+    clearly bad jokes cost one call; only contested ones get the full ensemble.
+    
+    Args:
+        judge: JokeJudge whose endpoint the members call
+        models: Member models (default: the judge's model)
+        seeds: Seeds per model (default: 3 for one model, 1 for several)
+        tolerance: Largest Overall spread counted as agreement
+        top_k: Size of the top-k whose threshold settles a joke's rank
+        rank_margin: Distance from the threshold that settles a joke's rank
+        max_judges: Cap on members per joke (default: all)
+        warmup: Finished jokes before a provisional threshold is used
+    """
+    
+    def __init__(self, judge: JokeJudge, models: List[str] = None, seeds: int = None,
+                 tolerance: float = 1.0, top_k: int = 10, rank_margin: float = 2.0, max_judges: int = None,
+                 warmup: int = 3):
+        self.judge = judge
+        models = models or [judge.model]
+        if seeds is None:
+            seeds = 3 if len(models) == 1 else 1
+        # Seed-major order, so the first calls on a joke go to different models
+        self.members = [(model, seed if seeds > 1 else None) for seed in range(max(1, seeds)) for model in models]
+        if max_judges:
+            self.members = self.members[:max_judges]
+        self.tolerance = tolerance
+        self.top_k = max(1, top_k)
+        self.rank_margin = rank_margin
+        self.warmup = max(1, warmup)
+        self.expected_jokes = None
+        self.calls = 0
+        self.jokes_judged = 0
+        self.stopped = {}
+        self._final_scores = []
+        self._lock = threading.Lock()
+    
+    def expect(self, jokes: int):
+        """Set how many jokes will be judged, so a provisional top-k threshold can be used early."""
+        self.expected_jokes = jokes
+    
+    def _threshold(self):
+        """Overall score of the k-th best joke judged so far, or a provisional estimate (None if neither)."""
+        with self._lock:
+            scores = sorted(self._final_scores, reverse=True)
+        if len(scores) >= self.top_k:
+            return scores[self.top_k - 1]
+        if not self.expected_jokes or self.expected_jokes <= self.top_k or len(scores) < self.warmup:
+            return None
+        # The same fraction of the jokes so far as k is of all the jokes
+        rank = max(1, math.ceil(len(scores) * self.top_k / self.expected_jokes))
+        return scores[rank - 1]
+    
+    def _stop_reason(self, scores: List[float]):
+        if len(scores) >= 2 and max(scores) - min(scores) <= self.tolerance:
+            return "agreed"
+        threshold = self._threshold()
+        if threshold is not None and (min(scores) >= threshold + self.rank_margin
+                                      or max(scores) <= threshold - self.rank_margin):
+            return "rank_settled"
+        return None
+    
+    def judge_joke(self, joke: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Judge a joke with as few ensemble members as the stopping rules allow.
+        
+        Args:
+            joke: The joke dictionary to judge
+            
+        Returns:
+            Judgment with mean scores and an "ensemble" record of the members used
+        """
+        members = []
+        judgments = []
+        stopped = "max_judges"
+        for model, seed in self.members:
+            if deadline_expired():
+                stopped = "deadline"
+                break
+            judgment = self.judge.judge_joke(joke, model=model, seed=seed)
+            with self._lock:
+                self.calls += 1
+            if judgment["analysis"] == "Error during evaluation":
+                continue
+            members.append({"model": model, "seed": seed, "overall": judgment["overall"]})
+            judgments.append(judgment)
+            reason = self._stop_reason([j["overall"] for j in judgments])
+            if reason:
+                stopped = reason
+                break
+        
+        with self._lock:
+            self.jokes_judged += 1
+            self.stopped[stopped] = self.stopped.get(stopped, 0) + 1
+        if not judgments:
+            return self.judge._error_judgment(joke)
+        
+        overall = round(statistics.mean(j["overall"] for j in judgments), 2)
+        with self._lock:
+            self._final_scores.append(overall)
+        # The analysis of the member closest to the ensemble's verdict
+        representative = min(judgments, key=lambda j: abs(j["overall"] - overall))
+        return {
+            "joke_id": joke["id"],
+            "method": joke["method"],
+            "text": joke["text"],
+            "analysis": representative["analysis"],
+            "scores": {
+                param: round(statistics.mean(j["scores"][param] for j in judgments), 2)
+                for param in self.judge.evaluation_params
+            },
+            "overall": overall,
+            "ensemble": {"judges": members, "stopped": stopped},
+        }
+    
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "members": len(self.members),
+                "jokes": self.jokes_judged,
+                "calls": self.calls,
+                "calls_per_joke": round(self.calls / self.jokes_judged, 2) if self.jokes_judged else None,
+                "stopped": dict(self.stopped),
+            }
+
+class JudgeCoalescer:
+    """
+    Micro-batching front end for JokeJudge.
+    
+    Callers submit single jokes and get a Future back. A background thread
+    collects submissions until max_batch_size jokes are waiting or max_wait
+    seconds have passed since the first one arrived, then judges them with
+    one multi-joke prompt (JokeJudge.judge_batch) and resolves each caller's
+    future with its own judgment. Fewer requests reach the rate-limited
+    judge while per-joke latency stays bounded by max_wait plus one call.
+    """
+
+    def __init__(self, judge: JokeJudge, max_batch_size: int = 8, max_wait: float = 0.05,
+                 max_in_flight: int = 2):
+        self.judge = judge
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.batches_sent = 0
+        self.jokes_judged = 0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="judge-batch")
+        self._collector = threading.Thread(target=self._collect, name="judge-coalescer", daemon=True)
+        self._collector.start()
+
+    def submit(self, joke: Dict[str, Any]) -> Future:
+        """Queue a joke for judging; the returned future resolves to its judgment."""
+        future = Future()
+        self._queue.put((joke, future))
+        return future
+
+    def close(self):
+        """Flush pending jokes and stop the background threads."""
+        self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _collect(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            window_end = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._dispatch, batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        jokes = [joke for joke, _ in batch]
+        try:
+            judgments = self.judge.judge_batch(jokes)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        with self._stats_lock:
+            self.batches_sent += 1
+            self.jokes_judged += len(jokes)
+        for (_, future), judgment in zip(batch, judgments):
+            future.set_result(judgment)
+
 def main():
     """Main function to handle CLI arguments and run the joke judge"""
     from utils.config import initialize_config
-    
-    if not initialize_config():
-        print("Failed to initialize configuration. Please check your .env file.")
-        return
+    from utils.sampling import stratified_sample
     
     parser = argparse.ArgumentParser(description="Judge and compare jokes from different generation methods")
     parser.add_argument("--multistage", help="Path to multi-stage framework results JSON")
     parser.add_argument("--baseline", help="Path to baseline generator results JSON")
     parser.add_argument("--output", default="joke_judgments.json", help="Output file for judgments")
-    parser.add_argument("--model", default=JUDGE_MODEL, help="Model to use for judging")
-    parser.add_argument("--samples", type=int, default=0, help="Number of jokes to sample from each method (0 for all)")
+    parser.add_argument("--model", default=None,
+                        help="Model to use for judging (default: MODEL_JUDGE route, or JUDGE_MODEL)")
+    parser.add_argument("--samples", type=int, default=0,
+                        help="Number of jokes to sample from each method, stratified by idea, type and tone (0 for all)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for sampling")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Judge both methods in rounds and stop once the score-difference CI is narrow enough")
+    parser.add_argument("--ci-width", type=float, default=0.5,
+                        help="Target 95%% CI half-width on the Overall score difference for --sequential (default: 0.5)")
     parser.add_argument("--api-endpoint", help="Custom API endpoint URL (e.g., OpenRouter)")
     parser.add_argument("--api-key", help="API key for the endpoint (or set OPENROUTER_API_KEY env var)")
     parser.add_argument("--include-fallbacks", action="store_true", help="Include fallback jokes in evaluation")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Judge up to this many jokes per request via the coalescer (default: 1, no batching)")
+    parser.add_argument("--batch-window", type=float, default=50.0,
+                        help="Milliseconds to wait for a batch to fill (default: 50)")
+    parser.add_argument("--ensemble", nargs="?", const="", default=None, metavar="MODELS",
+                        help="Judge each joke with an early-stopping ensemble of comma-separated MODELS "
+                             "(default: --model) and seeds")
+    parser.add_argument("--ensemble-seeds", type=int, default=None,
+                        help="Seeds per ensemble model (default: 3 for one model, 1 for several)")
+    parser.add_argument("--ensemble-tolerance", type=float, default=1.0,
+                        help="Stop once the ensemble's Overall scores lie within this many points (default: 1.0)")
+    parser.add_argument("--ensemble-top-k", type=int, default=10,
+                        help="Stop once a joke is at least --ensemble-margin points from the current "
+                             "top-k threshold (default: 10)")
+    parser.add_argument("--ensemble-margin", type=float, default=2.0,
+                        help="Distance from the top-k threshold that settles a joke's rank (default: 2.0)")
+    parser.add_argument("--prescreen", nargs="?", const="", default=None, metavar="MODEL",
+                        help="Gate and order jokes with the local pre-screen scorer (joke_prescreen.py fit); "
+                             "MODEL defaults to PRESCREEN_MODEL_FILE")
+    parser.add_argument("--prescreen-keep", type=float, default=0.5,
+                        help="Fraction of each method's non-dud jokes the pre-screen sends to the judge (default: 0.5)")
+    parser.add_argument("--profile", nargs="?", const="judge_profile", default=None, metavar="PREFIX",
+                        help="Profile judging: write PREFIX.trace.json (trace events) and PREFIX.prof (cProfile)")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE",
+                          help="Record every LLM request and response to CASSETTE (.jsonl or .jsonl.gz)")
+    cassette.add_argument("--replay", metavar="CASSETTE",
+                          help="Serve LLM calls from CASSETTE instead of the network")
+    parser.add_argument("--replay-order", action="store_true",
+                        help="Replay recordings strictly in recorded order instead of matching request hashes")
     
     args = parser.parse_args()
+    from utils.profiling import PROFILER, span
+    
+    if args.record or args.replay:
+        from utils.cassette import configure_cassette
+        configure_cassette(args.record or args.replay, "record" if args.record else "replay",
+                           match="order" if args.replay_order else "hash")
+        # Recorded runs must sample the same jokes to be replayable
+        if args.seed is None:
+            args.seed = 0
+    
+    if not initialize_config():
+        print("Failed to initialize configuration. Please check your .env file.")
+        return
     
     # Check for API keys
     if args.api_endpoint and "openrouter" in args.api_endpoint:
@@ -535,23 +1034,84 @@ def main():
     if args.multistage:
         multistage_jokes = judge.load_multistage_jokes(args.multistage, filter_fallbacks=filter_fallbacks)
         if args.samples > 0 and len(multistage_jokes) > args.samples:
-            import random
-            multistage_jokes = random.sample(multistage_jokes, args.samples)
+            multistage_jokes = stratified_sample(multistage_jokes, args.samples, seed=args.seed)
         all_jokes.extend(multistage_jokes)
     
     if args.baseline:
         baseline_jokes = judge.load_baseline_jokes(args.baseline, filter_fallbacks=filter_fallbacks)
         if args.samples > 0 and len(baseline_jokes) > args.samples:
-            import random
-            baseline_jokes = random.sample(baseline_jokes, args.samples)
+            baseline_jokes = stratified_sample(baseline_jokes, args.samples, seed=args.seed)
         all_jokes.extend(baseline_jokes)
     
     if not all_jokes:
         print("Error: No jokes loaded for judging")
         return
     
-    # Judge all jokes
-    judgments = judge.judge_all_jokes(all_jokes, args.output)
+    # Skip duds and the jokes predicted lowest, and judge the most promising first.
+    # Each method is screened separately so both keep the same share of jokes;
+    # a comparison then covers the jokes that passed the screen.
+    if args.prescreen is not None:
+        from joke_prescreen import PrescreenScorer
+        try:
+            scorer = PrescreenScorer.load(args.prescreen or None)
+        except FileNotFoundError as e:
+            print(f"Error: No pre-screen model ({e.filename}); run 'python joke_prescreen.py fit' first")
+            return
+        all_jokes = []
+        if args.multistage:
+            multistage_jokes, dropped = scorer.screen(multistage_jokes, keep=args.prescreen_keep)
+            print(f"Pre-screen kept {len(multistage_jokes)} multi-stage jokes "
+                  f"(dropped {dropped['dud']} duds, {dropped['low_score']} predicted low)")
+            all_jokes.extend(multistage_jokes)
+        if args.baseline:
+            baseline_jokes, dropped = scorer.screen(baseline_jokes, keep=args.prescreen_keep)
+            print(f"Pre-screen kept {len(baseline_jokes)} baseline jokes "
+                  f"(dropped {dropped['dud']} duds, {dropped['low_score']} predicted low)")
+            all_jokes.extend(baseline_jokes)
+        if not all_jokes:
+            print("Error: No jokes passed the pre-screen")
+            return
+        all_jokes.sort(key=lambda joke: scorer.predict(joke["text"]), reverse=True)
+    
+    # Judge all jokes, or stratified rounds of both methods until the comparison is confident
+    coalescer = None
+    if args.profile:
+        PROFILER.start()
+    ensemble = None
+    if args.ensemble is not None:
+        models = [model.strip() for model in args.ensemble.split(",") if model.strip()]
+        ensemble = JudgeEnsemble(judge, models=models, seeds=args.ensemble_seeds,
+                                 tolerance=args.ensemble_tolerance, top_k=args.ensemble_top_k,
+                                 rank_margin=args.ensemble_margin)
+        print(f"Judge ensemble: up to {len(ensemble.members)} judges per joke")
+        if args.batch_size > 1:
+            print("Note: --batch-size is ignored with --ensemble (members judge one joke at a time)")
+    elif args.batch_size > 1:
+        coalescer = JudgeCoalescer(judge, max_batch_size=args.batch_size, max_wait=args.batch_window / 1000)
+    try:
+        if args.sequential and args.multistage and args.baseline:
+            judgments, comparison = judge.judge_sequential(
+                multistage_jokes, baseline_jokes, coalescer=coalescer, max_half_width=args.ci_width,
+                max_per_method=args.samples, seed=args.seed, ensemble=ensemble
+            )
+            print(f"\nSequential judging stopped ({comparison['stopped']}) after "
+                  f"{comparison['judged']['multi-stage']} jokes per method")
+            with span("save judgments", "local"), open(args.output, 'w') as f:
+                json.dump({"judgments": judgments, "comparison": comparison}, f, indent=2)
+            print(f"Judgments saved to {args.output}")
+        else:
+            judgments = judge.judge_all_jokes(all_jokes, args.output, coalescer=coalescer, ensemble=ensemble)
+    finally:
+        if coalescer:
+            coalescer.close()
+        if args.profile:
+            PROFILER.export(args.profile)
+    
+    if ensemble:
+        summary = ensemble.summary()
+        print(f"\nJudge ensemble: {summary['calls']} calls for {summary['jokes']} jokes "
+              f"({summary['calls_per_joke']} per joke, up to {summary['members']}); stopped: "
+              + ", ".join(f"{reason} {count}" for reason, count in sorted(summary["stopped"].items())))
     
     # Calculate and print statistics
     parameter_stats, overall_stats = judge.calculate_statistics(judgments)
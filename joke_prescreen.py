@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Joke Prescreen - Cheap local estimate of the judge's Overall score
+
+Every judge call costs a full LLM request, yet most generated jokes end up
+far from the top. The pre-screen is a linear model over hashed word n-gram
+features, fitted on accumulated judgment files (joke_judgments.json and
+friends), that estimates a joke's Overall score in microseconds with no
+network access. joke_judge.py --prescreen uses it to skip obvious duds
+(near-copies of the theme, one-liners too short to be jokes) and the jokes
+predicted lowest, and to judge the most promising jokes first.
+
+The evaluate command measures what the gate costs in quality: with
+cross-validated predictions it reports how many judge calls would have been
+saved while still judging a given share (recall) of the true top-k jokes.
+
+Usage:
+  python joke_prescreen.py fit joke_judgments.json old/*.json
+  python joke_prescreen.py evaluate joke_judgments.json old/*.json --top-k 5 10 --recall 0.8 0.9 1.0
+  python joke_prescreen.py score results.json --limit 10
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Judge scores are on a 1-10 scale
+MIN_SCORE = 1.0
+MAX_SCORE = 10.0
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def hashed_features(text: str, dims: int) -> Dict[int, float]:
+    """
+    Signed hashed features of a joke: word unigrams and bigrams plus coarse
+    length and vocabulary-variety buckets, scaled to unit length.
+
+    Args:
+        text: Joke text
+        dims: Number of hash buckets (a power of two)
+
+    Returns:
+        Mapping of bucket index to feature value
+    """
+    words = _tokens(text)
+    names = [f"w:{word}" for word in words]
+    names.extend(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+    names.append(f"len:{min(len(words) // 8, 8)}")
+    if words:
+        names.append(f"ttr:{round(len(set(words)) / len(words), 1)}")
+    names.extend(f"p:{mark}" for mark in "?!\"" if mark in text)
+
+    features = {}
+    for name in names:
+        h = zlib.crc32(name.encode("utf-8"))
+        index = h & (dims - 1)
+        # The top bit signs the feature, so collisions cancel instead of piling up
+        features[index] = features.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+
+def is_dud(text: str, theme: str = None, min_words: int = 4, max_theme_overlap: float = 0.6) -> bool:
+    """
+    True for jokes not worth a judge call: too short, or mostly the theme's own words.
+
+    Args:
+        text: Joke text
+        theme: Theme the joke was generated for
+        min_words: Fewest words a joke can have
+        max_theme_overlap: Largest share of the joke's words that may come from the theme
+    """
+    words = _tokens(text)
+    if len(words) < min_words:
+        return True
+    theme_words = set(_tokens(theme or ""))
+    if not theme_words:
+        return False
+    return sum(word in theme_words for word in words) / len(words) > max_theme_overlap
+
+
+class PrescreenScorer:
+    """
+    Linear model of the judge's Overall score over hashed n-gram features,
+    fitted with SGD on squared error with L2 regularization.
+
+    Args:
+        dims: Number of hash buckets (a power of two)
+        l2: L2 regularization strength
+        epochs: Passes over the training data
+        learning_rate: Initial SGD step size (decays with the epoch)
+        seed: Seed for the order of training examples
+    """
+
+    def __init__(self, dims: int = 2 ** 18, l2: float = 1e-3, epochs: int = 20,
+                 learning_rate: float = 0.5, seed: int = 0):
+        if dims & (dims - 1):
+            raise ValueError(f"dims must be a power of two, got {dims}")
+        self.dims = dims
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.seed = seed
+        self.bias = (MIN_SCORE + MAX_SCORE) / 2
+        self.weights = {}
+        self.trained_on = 0
+
+    def fit(self, texts: List[str], scores: List[float]) -> "PrescreenScorer":
+        """Fit the model to judged jokes (replacing any previous fit)."""
+        examples = [(hashed_features(text, self.dims), score) for text, score in zip(texts, scores)]
+        self.bias = sum(scores) / len(scores) if scores else (MIN_SCORE + MAX_SCORE) / 2
+        self.weights = {}
+        self.trained_on = len(examples)
+        weights = self.weights
+        rng = random.Random(self.seed)
+        for epoch in range(self.epochs):
+            rng.shuffle(examples)
+            rate = self.learning_rate / math.sqrt(epoch + 1)
+            for features, score in examples:
+                error = self.bias + sum(weights.get(i, 0.0) * x for i, x in features.items()) - score
+                for i, x in features.items():
+                    w = weights.get(i, 0.0)
+                    weights[i] = w - rate * (error * x + self.l2 * w)
+        return self
+
+    def predict(self, text: str) -> float:
+        """Estimated Overall score of a joke, clipped to the judge's scale."""
+        weights = self.weights
+        estimate = self.bias + sum(weights.get(i, 0.0) * x for i, x in hashed_features(text, self.dims).items())
+        return min(MAX_SCORE, max(MIN_SCORE, estimate))
+
+    def screen(self, jokes: List[Dict[str, Any]], keep: float = 0.5,
+               min_score: float = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Choose which jokes to send to the judge, most promising first.
+
+        Duds (see is_dud) are dropped outright; of the rest, the top `keep`
+        fraction by predicted score is kept (at least one joke), minus any
+        predicted below min_score.
+
+        Args:
+            jokes: Joke dictionaries with "text" and optionally "theme"
+            keep: Fraction of non-dud jokes to keep
+            min_score: Optional lowest predicted score to keep
+
+        Returns:
+            Tuple of (kept jokes ordered by predicted score, counts of dropped jokes by reason)
+        """
+        candidates = []
+        duds = 0
+        for joke in jokes:
+            if is_dud(joke["text"], joke.get("theme")):
+                duds += 1
+            else:
+                candidates.append((self.predict(joke["text"]), joke))
+        candidates.sort(key=lambda pair: pair[0], reverse=True)
+        kept = candidates[:max(1, math.ceil(keep * len(candidates)))] if candidates else []
+        if min_score is not None:
+            kept = [pair for pair in kept if pair[0] >= min_score]
+        dropped = {"dud": duds, "low_score": len(candidates) - len(kept)}
+        return [joke for _, joke in kept], dropped
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({
+                "format": 1,
+                "dims": self.dims,
+                "l2": self.l2,
+                "epochs": self.epochs,
+                "learning_rate": self.learning_rate,
+                "seed": self.seed,
+                "bias": self.bias,
+                "trained_on": self.trained_on,
+                # Buckets a fit never touched stay at zero and are not stored
+                "weights": {str(i): round(w, 6) for i, w in self.weights.items() if abs(w) >= 1e-6},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str = None) -> "PrescreenScorer":
+        """Load a fitted model (default: PRESCREEN_MODEL_FILE from configuration)."""
+        if path is None:
+            from utils.config import PRESCREEN_MODEL_FILE
+            path = PRESCREEN_MODEL_FILE
+        with open(path) as f:
+            data = json.load(f)
+        scorer = cls(dims=data["dims"], l2=data["l2"], epochs=data["epochs"],
+                     learning_rate=data["learning_rate"], seed=data["seed"])
+        scorer.bias = data["bias"]
+        scorer.trained_on = data["trained_on"]
+        scorer.weights = {int(i): w for i, w in data["weights"].items()}
+        return scorer
+
+
+def load_judged_jokes(paths: List[str]) -> Tuple[List[str], List[float]]:
+    """
+    Collect (text, Overall score) training pairs from judgment files.
+
+    Failed judgments are skipped; a joke judged in several files is scored
+    by its mean.
+
+    Returns:
+        Tuple of (joke texts, mean Overall scores)
+    """
+    totals = {}
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        for judgment in data.get("judgments", []) if isinstance(data, dict) else []:
+            if judgment.get("analysis") == "Error during evaluation" or not judgment.get("text"):
+                continue
+            joke_id = judgment.get("joke_id")
+            key = joke_id if joke_id and joke_id != "unknown" else judgment["text"]
+            entry = totals.setdefault(key, [judgment["text"], 0.0, 0])
+            entry[1] += float(judgment["overall"])
+            entry[2] += 1
+    texts = [text for text, _, _ in totals.values()]
+    scores = [total / count for _, total, count in totals.values()]
+    return texts, scores
+
+
+def calls_for_recall(predicted: List[float], actual: List[float], k: int, recall: float) -> Tuple[int, int]:
+    """
+    Judge calls needed, judging in predicted order, to reach a recall of the true top-k.
+
+    Jokes tied with the k-th best actual score all count as top-k.
+
+    Returns:
+        Tuple of (calls needed, size of the true top-k)
+    """
+    threshold = sorted(actual, reverse=True)[min(k, len(actual)) - 1]
+    relevant = {i for i, score in enumerate(actual) if score >= threshold}
+    needed = max(1, math.ceil(recall * len(relevant)))
+    order = sorted(range(len(predicted)), key=lambda i: predicted[i], reverse=True)
+    found = 0
+    for calls, i in enumerate(order, 1):
+        found += i in relevant
+        if found >= needed:
+            return calls, len(relevant)
+    return len(order), len(relevant)
+
+
+def evaluate(texts: List[str], scores: List[float], top_k: List[int], recalls: List[float],
+             folds: int = 5, **scorer_options) -> Dict[str, Any]:
+    """
+    Cross-validate the pre-screen and report judge calls saved at each recall of the true top-k.
+
+    Args:
+        texts: Judged joke texts
+        scores: Their Overall scores
+        top_k: Values of k for the true top-k
+        recalls: Shares of the true top-k that must still be judged
+        folds: Cross-validation folds
+        scorer_options: Options for PrescreenScorer
+
+    Returns:
+        Dictionary with prediction error, prediction speed and one row per (k, recall)
+    """
+    n = len(texts)
+    folds = max(2, min(folds, n))
+    order = list(range(n))
+    random.Random(scorer_options.get("seed", 0)).shuffle(order)
+    predicted = [0.0] * n
+    for fold in range(folds):
+        held_out = order[fold::folds]
+        held = set(held_out)
+        train = [i for i in order if i not in held]
+        scorer = PrescreenScorer(**scorer_options).fit([texts[i] for i in train], [scores[i] for i in train])
+        for i in held_out:
+            predicted[i] = scorer.predict(texts[i])
+
+    start = time.perf_counter()
+    for text in texts:
+        scorer.predict(text)
+    micros = (time.perf_counter() - start) * 1e6 / n
+
+    mean = sum(scores) / n
+    rows = []
+    for k in top_k:
+        for recall in recalls:
+            calls, relevant = calls_for_recall(predicted, scores, k, recall)
+            needed = max(1, math.ceil(recall * relevant))
+            rows.append({
+                "k": k,
+                "recall": recall,
+                "top_k_size": relevant,
+                "calls": calls,
+                "saved": n - calls,
+                "saved_fraction": round((n - calls) / n, 3),
+                # Expected position of the needed-th top-k joke in a random order
+                "random_calls": round(needed * (n + 1) / (relevant + 1), 1),
+            })
+    return {
+        "jokes": n,
+        "folds": folds,
+        "mae": round(sum(abs(p - s) for p, s in zip(predicted, scores)) / n, 3),
+        "baseline_mae": round(sum(abs(mean - s) for s in scores) / n, 3),
+        "predict_microseconds": round(micros, 1),
+        "rows": rows,
+    }
+
+
+def _default_judgment_files() -> List[str]:
+    import os
+    return [path for path in ("joke_judgments.json",) if os.path.exists(path)]
+
+
+def main():
+    """Main function to handle CLI arguments"""
+    parser = argparse.ArgumentParser(description="Fit, evaluate and apply the local joke pre-screen scorer")
+    parser.add_argument("--model", default=None,
+                        help="Pre-screen model file (default: PRESCREEN_MODEL_FILE, prescreen.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("fit", "Fit the pre-screen on judgment files"),
+                            ("evaluate", "Cross-validate judge calls saved at a recall of the true top-k")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("files", nargs="*", help="Judgment files (default: joke_judgments.json)")
+        command.add_argument("--dims", type=int, default=2 ** 18, help="Hash buckets (default: 2^18)")
+        command.add_argument("--l2", type=float, default=1e-3, help="L2 regularization (default: 0.001)")
+        command.add_argument("--epochs", type=int, default=20, help="SGD passes (default: 20)")
+    evaluate_command = commands.choices["evaluate"]
+    evaluate_command.add_argument("--top-k", type=int, nargs="+", default=[5, 10], help="Sizes of the true top-k")
+    evaluate_command.add_argument("--recall", type=float, nargs="+", default=[0.8, 0.9, 1.0],
+                                  help="Required recalls of the true top-k")
+    evaluate_command.add_argument("--folds", type=int, default=5, help="Cross-validation folds (default: 5)")
+    evaluate_command.add_argument("--json", action="store_true", help="Print the evaluation as JSON")
+
+    score = commands.add_parser("score", help="Rank the jokes of a multi-stage or baseline results file")
+    score.add_argument("results", help="Results JSON with a 'jokes' list")
+    score.add_argument("--limit", type=int, default=10, help="Jokes to show (default: 10)")
+
+    args = parser.parse_args()
+
+    if args.command in ("fit", "evaluate"):
+        files = args.files or _default_judgment_files()
+        if not files:
+            print("Nothing to fit on: pass judgment files")
+            return
+        texts, scores = load_judged_jokes(files)
+        if len(texts) < 2:
+            print(f"Need at least 2 judged jokes, found {len(texts)}")
+            return
+        options = {"dims": args.dims, "l2": args.l2, "epochs": args.epochs}
+
+        if args.command == "fit":
+            from utils.config import PRESCREEN_MODEL_FILE
+            path = args.model or PRESCREEN_MODEL_FILE
+            start = time.perf_counter()
+            scorer = PrescreenScorer(**options).fit(texts, scores)
+            scorer.save(path)
+            print(f"Fitted on {len(texts)} judged jokes from {len(files)} files "
+                  f"in {time.perf_counter() - start:.2f}s; saved to {path}")
+            return
+
+        report = evaluate(texts, scores, args.top_k, args.recall, folds=args.folds, **options)
+        if args.json:
+            print(json.dumps(report, indent=2))
+            return
+        print(f"{report['jokes']} judged jokes, {report['folds']}-fold cross-validation")
+        print(f"Mean absolute error: {report['mae']:.2f} (predicting the mean: {report['baseline_mae']:.2f})")
+        print(f"Prediction time: {report['predict_microseconds']:.1f} µs per joke")
+        print(f"\n  {'top-k':>5} {'recall':>6} {'calls':>6} {'saved':>6} {'saved %':>7} {'random':>7}")
+        for row in report["rows"]:
+            print(f"  {row['k']:>5} {row['recall']:>6.0%} {row['calls']:>6} {row['saved']:>6} "
+                  f"{row['saved_fraction']:>7.0%} {row['random_calls']:>7.1f}")
+        print("\n'calls' judges jokes in predicted order until the recall is reached; "
+              "'random' is the expected calls in a random order.")
+
+    elif args.command == "score":
+        try:
+            scorer = PrescreenScorer.load(args.model)
+        except FileNotFoundError as e:
+            print(f"No pre-screen model ({e.filename}); run 'python joke_prescreen.py fit' first")
+            return
+        with open(args.results) as f:
+            data = json.load(f)
+        jokes = [joke for joke in data.get("jokes", []) if joke.get("text")]
+        theme = data.get("theme")
+        ranked = sorted(((scorer.predict(joke["text"]), joke) for joke in jokes),
+                        key=lambda pair: pair[0], reverse=True)
+        for i, (estimate, joke) in enumerate(ranked[:args.limit], 1):
+            dud = " (dud)" if is_dud(joke["text"], joke.get("theme") or joke.get("prompt") or theme) else ""
+            print(f"{i}. [{estimate:.1f}{dud}] {joke['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Joke Service - Long-running HTTP service for the joke generation pipeline
+
+Keeps configuration, the OpenAI client (and its connection pool) and a response
+cache warm across requests, so internal tools can ask for observations, ideas,
+rubrics, jokes and judgments without paying process startup on every call.
+
+Requests are executed by a fixed pool of workers fed from a bounded priority
+queue. Every POST body may carry an optional integer "priority" (lower runs
+sooner, default 10) and "cache": false to bypass the response cache. When
+the queue is full the service answers 503 instead of piling up work.
+Results holding fallbacks, error judgments or items lost to pruning are
+returned but never cached, so a transient failure is not served again.
+
+Endpoints (JSON in, JSON out):
+  GET  /health        Queue depth, worker count, cache, backend and adaptive concurrency statistics
+  GET  /search        ?q=&theme=&type=&tone=&method=&min_score=&max_score=&limit=
+                      (jokes indexed with joke_index.py)
+  POST /observations  {"theme", "order": "first"|"second", "first_order": [...]}
+  POST /ideas         {"theme", "observations": [...]}
+  POST /rubrics       {"theme", "idea", "num_rubrics", "critiques_per_rubric"}
+  POST /jokes         {"theme", "idea", "rubric"}
+  POST /baseline      {"theme", "num_jokes", "enhanced"}
+  POST /judge         {"joke"}  (joke in the standardized judge format)
+
+Judge requests skip the work queue and go through a JudgeCoalescer, so
+concurrent /judge calls are scored together in multi-joke prompts; their
+"priority" does not apply.
+
+Usage:
+  python joke_service.py --port 8000 --workers 4 --queue-size 64
+  curl -s localhost:8000/ideas -d '{"theme": "penguins", "observations": ["They waddle"]}'
+"""
+
+import argparse
+import itertools
+import json
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PRIORITY = 10
+
+
+class BadRequest(ValueError):
+    """A request field has an invalid value (answered with 400)."""
+
+
+def _cacheable(result: dict) -> bool:
+    """False for results with fallbacks, error judgments or empty (pruned) lists."""
+    from utils.fallback import is_fallback
+
+    def complete(value):
+        if is_fallback(value):
+            return False
+        if isinstance(value, dict):
+            if value.get("analysis") == "Error during evaluation":
+                return False
+            return all(complete(item) for item in value.values())
+        if isinstance(value, list):
+            return all(complete(item) for item in value)
+        return True
+
+    return all(value != [] for value in result.values()) and complete(result)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache for endpoint responses."""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class WorkQueue:
+    """
+    Bounded priority queue drained by a fixed pool of worker threads.
+
+    Lower priority values run first; equal priorities run in submission order.
+    """
+
+    def __init__(self, num_workers: int = 4, max_size: int = 64):
+        self._queue = queue.PriorityQueue(maxsize=max_size)
+        self._counter = itertools.count()
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._run, name=f"joke-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, fn, *args, priority: int = DEFAULT_PRIORITY) -> Future:
+        """
+        Queue fn(*args) for execution.
+
+        Raises:
+            queue.Full: If the queue is at capacity
+        """
+        future = Future()
+        self._queue.put_nowait((priority, next(self._counter), future, fn, args))
+        return future
+
+    def _run(self):
+        while True:
+            _, _, future, fn, args = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {"depth": self._queue.qsize(), "max_size": self._queue.maxsize, "workers": len(self._workers)}
+
+
+class JokeService:
+    """Endpoint implementations sharing one warm judge, client pool and cache."""
+
+    def __init__(self, num_workers: int = 4, queue_size: int = 64, cache_size: int = 256,
+                 request_timeout: float = 300.0, judge_batch_size: int = 8, judge_batch_window: float = 0.05):
+        self.work_queue = WorkQueue(num_workers=num_workers, max_size=queue_size)
+        self.cache = ResponseCache(max_size=cache_size)
+        self.request_timeout = request_timeout
+        self.judge_batch_size = judge_batch_size
+        self.judge_batch_window = judge_batch_window
+        self._coalescer = None
+        self._judge_lock = threading.Lock()
+        self._index = None
+        self._index_lock = threading.Lock()
+        self.endpoints = {
+            "/observations": self.observations,
+            "/ideas": self.ideas,
+            "/rubrics": self.rubrics,
+            "/jokes": self.jokes,
+            "/baseline": self.baseline,
+            "/judge": self.judge,
+        }
+        # Endpoints that run on the HTTP handler thread instead of the work queue
+        self.unqueued = {"/judge"}
+
+    @property
+    def coalescer(self):
+        with self._judge_lock:
+            if self._coalescer is None:
+                from joke_judge import JokeJudge, JudgeCoalescer
+                self._coalescer = JudgeCoalescer(JokeJudge(), max_batch_size=self.judge_batch_size,
+                                                 max_wait=self.judge_batch_window)
+            return self._coalescer
+
+    def search(self, params: dict) -> dict:
+        """Query the joke index; params are single-valued query-string fields."""
+        from joke_index import JokeIndex
+        number = lambda key, cast: cast(params[key]) if params.get(key) else None
+        filters = dict(theme=params.get("theme"), rubric_type=params.get("type"), tone=params.get("tone"),
+                       method=params.get("method"), min_score=number("min_score", float),
+                       max_score=number("max_score", float), limit=number("limit", int) or 20)
+        # One shared connection; searches take milliseconds, so serializing them is cheap
+        with self._index_lock:
+            if self._index is None:
+                self._index = JokeIndex()
+            return {"jokes": self._index.search(params.get("q"), **filters)}
+
+    def observations(self, body: dict) -> dict:
+        from gen_ideas import generate_first_order_observations, generate_second_order_observations
+        theme = body["theme"]
+        if body.get("order", "first") == "second":
+            return {"observations": generate_second_order_observations(body.get("first_order", []), theme)}
+        return {"observations": generate_first_order_observations(theme)}
+
+    def ideas(self, body: dict) -> dict:
+        from gen_ideas import formulate_joke_ideas
+        return {"ideas": formulate_joke_ideas(body["observations"], body["theme"])}
+
+    def rubrics(self, body: dict) -> dict:
+        from gen_rubrics import generate_rubric_for_idea, critique_and_refine_rubrics
+        idea, theme = body["idea"], body["theme"]
+        rubrics = generate_rubric_for_idea(idea, theme, num_rubrics=int(body.get("num_rubrics", 1)))
+        critiques = int(body.get("critiques_per_rubric", 0))
+        if critiques > 0:
+            rubrics = rubrics + critique_and_refine_rubrics(rubrics, idea, theme, num_critiques_per_rubric=critiques)
+        return {"rubrics": rubrics}
+
+    def jokes(self, body: dict) -> dict:
+        from gen_jokes import generate_joke_from_rubric
+        return {"joke": generate_joke_from_rubric(body["rubric"], body["idea"], body["theme"])}
+
+    def baseline(self, body: dict) -> dict:
+        from baseline_joke_gen import generate_joke
+        jokes, _ = generate_joke(body["theme"], num_jokes=int(body.get("num_jokes", 1)),
+                                 enhanced=bool(body.get("enhanced", True)))
+        return {"jokes": jokes}
+
+    def judge(self, body: dict) -> dict:
+        future = self.coalescer.submit(body["joke"])
+        return {"judgment": future.result(timeout=self.request_timeout)}
+
+    def handle(self, path: str, body: dict) -> dict:
+        """
+        Run an endpoint through the cache and the work queue.
+
+        Raises:
+            KeyError: Unknown endpoint or missing required field
+            BadRequest: priority is not an integer
+            queue.Full: The work queue is at capacity
+            TimeoutError: The request did not finish within request_timeout
+        """
+        from utils.fallback import FALLBACKS
+
+        endpoint = self.endpoints[path]
+        try:
+            priority = int(body.pop("priority", DEFAULT_PRIORITY))
+        except (TypeError, ValueError):
+            raise BadRequest("priority must be an integer")
+        use_cache = bool(body.pop("cache", True))
+        cache_key = (path, json.dumps(body, sort_keys=True))
+
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        def run(body):
+            # Items pruned or calls skipped by the stage mean the result came back short
+            dropped = FALLBACKS.dropped_in_thread()
+            result = endpoint(body)
+            return result, FALLBACKS.dropped_in_thread() == dropped
+
+        if path in self.unqueued:
+            result, complete = run(body)
+        else:
+            future = self.work_queue.submit(run, body, priority=priority)
+            try:
+                result, complete = future.result(timeout=self.request_timeout)
+            except TimeoutError:
+                future.cancel()
+                raise
+        if use_cache and complete and _cacheable(result):
+            self.cache.put(cache_key, result)
+        return result
+
+    def health(self) -> dict:
+        from utils.llm import get_backend_pool
+        health = {"status": "ok", "queue": self.work_queue.stats(), "cache": self.cache.stats(),
+                  "backends": get_backend_pool().stats()}
+        from utils.concurrency import controller_stats
+        concurrency = controller_stats()
+        if concurrency:
+            health["concurrency"] = concurrency
+        if self._coalescer is not None:
+            health["judge"] = {"batches": self._coalescer.batches_sent, "jokes": self._coalescer.jokes_judged}
+        return health
+
+
+def make_handler(service: JokeService):
+    """Build a request handler class bound to a service instance."""
+
+    class JokeRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload: dict):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/health":
+                self._send_json(200, service.health())
+            elif url.path == "/search":
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    self._send_json(200, service.search(params))
+                except ValueError as e:
+                    self._send_json(400, {"error": f"Invalid parameter: {e}"})
+                except sqlite3.Error as e:
+                    self._send_json(400, {"error": f"Invalid search: {e}"})
+            else:
+                self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            if self.path not in service.endpoints:
+                self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("request body must be a JSON object")
+            except ValueError as e:
+                self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+                return
+
+            try:
+                self._send_json(200, service.handle(self.path, body))
+            except KeyError as e:
+                self._send_json(400, {"error": f"Missing field: {e}"})
+            except BadRequest as e:
+                self._send_json(400, {"error": f"Invalid field: {e}"})
+            except queue.Full:
+                self._send_json(503, {"error": "Work queue is full, retry later"})
+            except TimeoutError:
+                self._send_json(504, {"error": "Request timed out"})
+            except Exception as e:
+                self._send_json(502, {"error": f"Stage failed: {e}"})
+
+        def log_message(self, format, *args):
+            print(f"[joke_service] {self.address_string()} {format % args}")
+
+    return JokeRequestHandler
+
+
+def main():
+    """Main function to handle CLI arguments and run the service"""
+    parser = argparse.ArgumentParser(description="Run the joke generation pipeline as a persistent HTTP service")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads (default: 4)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Maximum queued requests before 503 (default: 64)")
+    parser.add_argument("--cache-size", type=int, default=256, help="Response cache entries, 0 to disable (default: 256)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds (default: 300)")
+    parser.add_argument("--judge-batch-size", type=int, default=8, help="Max jokes per coalesced judge call (default: 8)")
+    parser.add_argument("--judge-batch-window", type=float, default=50.0,
+                        help="Milliseconds to wait for a judge batch to fill (default: 50)")
+    args = parser.parse_args()
+
+    from utils.config import initialize_config
+    if not initialize_config():
+        print("Failed to initialize configuration. Please check your .env file.")
+        return
+
+    # Warm the backend pool and its clients (and connection pools) before the first request
+    from utils.llm import get_backend_pool, get_client
+    for backend in get_backend_pool().backends:
+        get_client(backend.url)
+
+    service = JokeService(
+        num_workers=max(1, args.workers),
+        queue_size=max(1, args.queue_size),
+        cache_size=args.cache_size,
+        request_timeout=args.timeout,
+        judge_batch_size=args.judge_batch_size,
+        judge_batch_window=args.judge_batch_window / 1000
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Joke service listening on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue size {args.queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down joke service.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,37 +13,35 @@ This script orchestrates the joke generation process using the LLM planning fram
 Usage:
   python main.py [--theme "Theme Name"] [--ideas 3] [--rubrics 2] [--critiques 1]
   python main.py --run-all
+  python main.py --plan --ideas 5 --rubrics 3 --concurrency 4
+  python main.py --budget 20m --concurrency 4
+  python main.py --ideas 8 --adaptive-concurrency
+  python main.py --schedule depth --concurrency 4
+  python main.py --deadline 60s --concurrency 4
 
 Example:
   python main.py --theme "Smartphones" --ideas 3 --rubrics 2 --critiques 1
 """
 
 import os
-import sys
 import json
 import argparse
+import contextlib
 from pathlib import Path
 import time
-from tqdm import tqdm
-from tabulate import tabulate
-from colorama import Fore, Style, init
-init(autoreset=True)  # Initialize colorama
+from utils.lazy import lazy_import, LazyAttribute
 
-try:
-    from utils.config import (
-        initialize_config, DEFAULT_THEME, DEFAULT_NUM_IDEAS,
-        DEFAULT_RUBRICS_PER_IDEA, DEFAULT_CRITIQUES_PER_RUBRIC, DEFAULT_OUTPUT_FILE,
-        BASELINE_OUTPUT_FILE
-    )
-    from gen_ideas import generate_first_order_observations, generate_second_order_observations, formulate_joke_ideas
-    from gen_rubrics import generate_rubric_for_idea, critique_and_refine_rubrics
-    from gen_jokes import generate_joke_from_rubric
-    from baseline_joke_gen import generate_joke
-    from joke_judge import JokeJudge
-except ImportError as e:
-    print(f"Error: Failed to import required modules: {e}")
-    print("Make sure you're running from the project root and requirements are installed.")
-    sys.exit(1)
+# Heavy modules (openai, tqdm, tabulate, colorama and the stage modules) are
+# imported only when the stage that needs them actually runs.
+_colorama = lazy_import("colorama", on_load=lambda m: m.init(autoreset=True))
+Fore = LazyAttribute(_colorama, "Fore")
+Style = LazyAttribute(_colorama, "Style")
+
+from utils.config import (
+    initialize_config, DEFAULT_THEME, DEFAULT_NUM_IDEAS,
+    DEFAULT_RUBRICS_PER_IDEA, DEFAULT_CRITIQUES_PER_RUBRIC, DEFAULT_OUTPUT_FILE,
+    BASELINE_OUTPUT_FILE
+)
 
 def parse_args():
     """Parse command line arguments"""
@@ -63,13 +61,81 @@ def parse_args():
     parser.add_argument("--run-all", action="store_true", help="Run the entire pipeline including baseline and evaluation")
     parser.add_argument("--no-baseline", action="store_true", help="Skip generating baseline jokes")
     parser.add_argument("--no-judge", action="store_true", help="Skip judging the jokes")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Formulate ideas from first-order observations in parallel with second-order generation")
+    parser.add_argument("--judge-batch-size", type=int, default=1,
+                        help="Judge up to this many jokes per request (default: 1, no batching)")
+    parser.add_argument("--judge-ci", type=float, default=0.5,
+                        help="Stop judging once the 95%% CI on the Overall score difference is this narrow (default: 0.5)")
+    parser.add_argument("--judge-max", type=int, default=0,
+                        help="Maximum jokes judged per method (default: 0, no cap)")
+    parser.add_argument("--judge-seed", type=int, default=None,
+                        help="Random seed for the judge's stratified sample (default: random; 0 with --record/--replay)")
+    parser.add_argument("--hedge", type=float, default=None, metavar="PERCENTILE",
+                        help="Duplicate calls that outlive this latency percentile of their stage (e.g. 95; 0 disables)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of joke ideas to develop in parallel in Stages 3-5 (default: 1)")
+    parser.add_argument("--schedule", choices=["idea", "depth", "breadth"], default=None,
+                        help="Order of Stage 3-5 calls: 'idea' develops each idea in turn (default; depth with --deadline), 'depth' finishes "
+                             "rubric-joke chains first for the earliest first joke, 'breadth' runs each stage across all ideas together")
+    parser.add_argument("--adaptive-concurrency", action="store_true",
+                        help="Let AIMD controllers set the generator and judge in-flight limits from observed latency and errors")
+    parser.add_argument("--cascade", nargs="?", type=float, const=0.5, default=None, metavar="KEEP",
+                        help="Draft jokes on the 'drafts' stage route (a small model), then refine only the KEEP "
+                             "fraction (default: 0.5) rated most promising by the pre-screen with the full model")
+    parser.add_argument("--routing", metavar="FILE", default=None,
+                        help="JSON file of per-stage model, base_url, temperature and top_p routes "
+                             "(overrides MODEL_<STAGE> etc.)")
+    parser.add_argument("--deadline", type=str, default=None, metavar="DURATION",
+                        help="Anytime mode: stop at this wall time (e.g. 60s, 2m), cancel in-flight calls and keep what completed")
+    parser.add_argument("--budget", type=str, default=None,
+                        help="Token or time budget (e.g. 50k, 200000tokens, 300s, 20m); picks the fan-out with the most jokes")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuse earlier stage outputs whose inputs and prompts are unchanged; recompute only what changed")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print the estimated calls, tokens and wall time for the configuration and exit")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="Profile the run: write PREFIX.trace.json (trace events) and PREFIX.prof (cProfile)")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE",
+                          help="Record every LLM request and response to CASSETTE (.jsonl or .jsonl.gz)")
+    cassette.add_argument("--replay", metavar="CASSETTE",
+                          help="Serve LLM calls from CASSETTE instead of the network")
+    parser.add_argument("--replay-order", action="store_true",
+                        help="Replay recordings strictly in recorded order instead of matching request hashes")
     
     return parser.parse_args()
 
-def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_rubric, output_file):
-    """Run the multi-stage joke generation pipeline"""
+def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_rubric, output_file,
+                              speculative=False, concurrency=1, incremental=False, schedule="idea",
+                              cascade_keep=None):
+    """
+    Run the multi-stage joke generation pipeline.
+    
+    With cascade_keep set, Stage 5 writes drafts (the "drafts" stage, meant
+    to be routed to a small fast model); after Stages 3-5 the drafts are
+    screened locally and only the cascade_keep fraction rated most promising
+    is refined with the full model, the rest are discarded.
+    """
+    import threading
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+    from tqdm import tqdm
+    from gen_ideas import (
+        generate_first_order_observations, generate_second_order_observations,
+        formulate_joke_ideas, generate_ideas_speculative
+    )
+    from gen_rubrics import generate_rubric_for_idea, critique_and_refine_rubrics
+    from gen_jokes import generate_joke_from_rubric
+    from utils.deadline import deadline_expired, get_deadline
+    from utils.fallback import FALLBACKS, is_fallback
+    from utils.metrics import METRICS
+    from utils.profiling import span
+    from utils.stage_cache import StageCache
+
     print(f"\n{Fore.CYAN}========== MULTI-STAGE JOKE GENERATION PIPELINE =========={Style.RESET_ALL}")
     print(f"Theme: '{theme}'")
+    run_start = time.monotonic()
     
     results = {
         "theme": theme,
@@ -79,6 +145,26 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
             "critiques_per_rubric": critiques_per_rubric
         }
     }
+    if speculative:
+        results["config"]["speculative"] = True
+    if concurrency > 1:
+        results["config"]["concurrency"] = concurrency
+    if schedule != "idea":
+        results["config"]["schedule"] = schedule
+    if cascade_keep is not None:
+        results["config"]["cascade_keep"] = cascade_keep
+    from utils.concurrency import get_controller, controller_stats
+    if get_controller("generator") is not None:
+        results["config"]["adaptive_concurrency"] = True
+    from utils.routing import routing_signature
+    routes = routing_signature()
+    if routes:
+        results["config"]["routing"] = routes
+    
+    FALLBACKS.reset()
+    METRICS.reset()
+    # With --incremental, stages whose inputs and prompts are unchanged reuse earlier outputs
+    cache = StageCache(enabled=incremental)
     
     # STAGE 1: Theme Selection
     print(f"\n{Fore.GREEN}=== STAGE 1: THEME UNDERSTANDING ==={Style.RESET_ALL}")
@@ -88,20 +174,30 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
     
     # Generate first-order observations
     print("Generating first-order observations...")
-    first_order_obs = generate_first_order_observations(theme)
+    first_order_obs = cache.call("first_order_observations", generate_first_order_observations, theme)
     if not first_order_obs:
         print(f"{Fore.RED}Failed to generate first-order observations. Exiting.{Style.RESET_ALL}")
         return None
     
-    # Generate second-order observations
-    print("Generating second-order observations...")
-    second_order_obs = generate_second_order_observations(first_order_obs, theme)
-    
-    # Formulate joke ideas
-    all_observations = first_order_obs + second_order_obs
-    print(f"Combined Observations: {len(all_observations)} total")
-    print("Formulating joke ideas...")
-    joke_ideas = formulate_joke_ideas(all_observations, theme)
+    if speculative:
+        # Formulate ideas from first-order observations while second-order ones are generated
+        print("Generating second-order observations and speculative joke ideas in parallel...")
+        second_order_obs, joke_ideas = cache.call(
+            "speculative_ideas", generate_ideas_speculative, first_order_obs, theme, num_ideas
+        )
+        all_observations = first_order_obs + second_order_obs
+    else:
+        # Generate second-order observations
+        print("Generating second-order observations...")
+        second_order_obs = cache.call(
+            "second_order_observations", generate_second_order_observations, first_order_obs, theme
+        )
+        
+        # Formulate joke ideas
+        all_observations = first_order_obs + second_order_obs
+        print(f"Combined Observations: {len(all_observations)} total")
+        print("Formulating joke ideas...")
+        joke_ideas = cache.call("ideas", formulate_joke_ideas, all_observations, theme)
     
     if not joke_ideas:
         print(f"{Fore.RED}Failed to generate joke ideas. Exiting.{Style.RESET_ALL}")
@@ -134,17 +230,63 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
     total_steps = len(joke_ideas) * (1 + rubrics_per_idea * (1 + critiques_per_rubric))
     progress_bar = tqdm(total=total_steps, desc="Processing joke ideas", unit="step")
     
-    for joke_idx, joke_idea in enumerate(joke_ideas):
-        progress_bar.set_description(f"Processing idea {joke_idx+1}/{len(joke_ideas)}")
+    # Seconds from the start of the run at which each joke was completed
+    joke_times = []
+    joke_times_lock = threading.Lock()
+    # Stage calls not started because the run deadline had passed
+    deadline_skips = Counter()
+    
+    def out_of_time(stage, steps=1):
+        if not deadline_expired():
+            return False
+        with joke_times_lock:
+            deadline_skips[stage] += 1
+        progress_bar.update(steps)
+        return True
+    
+    # In cascade mode Stage 5 writes drafts, which only count as jokes once refined
+    joke_stage = "drafts" if cascade_keep is not None else "jokes"
+    
+    def record_joke_time(joke):
+        with joke_times_lock:
+            joke_times.append(time.monotonic() - run_start)
+            if len(joke_times) == 1:
+                tqdm.write(f"First joke after {joke_times[0]:.1f}s: {joke['text']}")
+            progress_bar.set_postfix(first_joke=f"{joke_times[0]:.1f}s",
+                                     jokes_per_min=f"{60 * len(joke_times) / joke_times[-1]:.1f}")
+    
+    def generate_joke(rubric, joke_idea):
+        # STAGE 5: Generate a joke (or a cascade draft) from a rubric
+        if out_of_time(joke_stage):
+            return None
+        joke = cache.call(joke_stage, generate_joke_from_rubric, rubric, joke_idea, theme,
+                          *((joke_stage,) if cascade_keep is not None else ()))
+        progress_bar.update(1)  # Update for each rubric-joke combo
+        if joke and "text" in joke and not is_fallback(joke):
+            if cascade_keep is None:
+                record_joke_time(joke)
+            return joke
+        if is_fallback(joke):
+            FALLBACKS.record_pruned(joke_stage)
+        return None
+    
+    def process_idea(joke_idx, joke_idea):
+        if concurrency == 1:
+            progress_bar.set_description(f"Processing idea {joke_idx+1}/{len(joke_ideas)}")
         
         # STAGE 3: Generate rubrics
-        initial_rubrics = generate_rubric_for_idea(joke_idea, theme, num_rubrics=rubrics_per_idea)
+        if out_of_time("rubrics", 1 + rubrics_per_idea * (1 + critiques_per_rubric)):
+            return [], []
+        initial_rubrics = cache.call("rubrics", generate_rubric_for_idea, joke_idea, theme,
+                                     num_rubrics=rubrics_per_idea)
         progress_bar.update(1)  # Update for idea processing
         
         # STAGE 4: Critique and diversify
         critiqued_rubrics = []
-        if critiques_per_rubric > 0:
-            critiqued_rubrics = critique_and_refine_rubrics(
+        if critiques_per_rubric > 0 and not out_of_time("critiques", len(initial_rubrics) * critiques_per_rubric):
+            critiqued_rubrics = cache.call(
+                "critiques",
+                critique_and_refine_rubrics,
                 initial_rubrics, 
                 joke_idea, 
                 theme, 
@@ -153,23 +295,85 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
         
         # Combine rubrics
         joke_rubrics = initial_rubrics + critiqued_rubrics
-        all_rubrics.extend(joke_rubrics)
         
         # STAGE 5: Generate jokes from rubrics
-        idea_jokes = []
-        for rubric in joke_rubrics:
-            joke = generate_joke_from_rubric(rubric, joke_idea, theme)
-            if joke and "text" in joke:
-                idea_jokes.append(joke)
-            progress_bar.update(1)  # Update for each rubric-joke combo
+        idea_jokes = [generate_joke(rubric, joke_idea) for rubric in joke_rubrics]
+        return joke_rubrics, [joke for joke in idea_jokes if joke]
+    
+    if schedule == "idea":
+        # Ideas are independent, so Stages 3-5 can develop several at once;
+        # results are collected in idea order either way
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for joke_rubrics, idea_jokes in executor.map(process_idea, range(len(joke_ideas)), joke_ideas):
+                all_rubrics.extend(joke_rubrics)
+                all_jokes.extend(idea_jokes)
+    else:
+        # Every rubric, critique and joke call is its own task; the policy
+        # decides which ready call runs next (see utils/scheduler.py)
+        from utils.scheduler import StageScheduler
+        scheduler = StageScheduler(concurrency, schedule)
+        initial_rubrics = [[] for _ in joke_ideas]
+        critiqued_rubrics = [[] for _ in joke_ideas]
+        idea_jokes = [{} for _ in joke_ideas]
+        
+        def joke_task(joke_idx, position, rubric):
+            idea_jokes[joke_idx][position] = generate_joke(rubric, joke_ideas[joke_idx])
+        
+        def critiques_task(joke_idx):
+            if out_of_time("critiques", len(initial_rubrics[joke_idx]) * critiques_per_rubric):
+                return
+            critiqued_rubrics[joke_idx] = cache.call(
+                "critiques", critique_and_refine_rubrics, initial_rubrics[joke_idx], joke_ideas[joke_idx],
+                theme, num_critiques_per_rubric=critiques_per_rubric
+            )
+            offset = len(initial_rubrics[joke_idx])
+            for position, rubric in enumerate(critiqued_rubrics[joke_idx]):
+                scheduler.submit("jokes", joke_idx, joke_task, joke_idx, offset + position, rubric)
+        
+        def rubrics_task(joke_idx):
+            if out_of_time("rubrics", 1 + rubrics_per_idea * (1 + critiques_per_rubric)):
+                return
+            initial_rubrics[joke_idx] = cache.call("rubrics", generate_rubric_for_idea, joke_ideas[joke_idx],
+                                                   theme, num_rubrics=rubrics_per_idea)
+            progress_bar.update(1)
+            for position, rubric in enumerate(initial_rubrics[joke_idx]):
+                scheduler.submit("jokes", joke_idx, joke_task, joke_idx, position, rubric)
+            if critiques_per_rubric > 0:
+                scheduler.submit("critiques", joke_idx, critiques_task, joke_idx)
         
-        all_jokes.extend(idea_jokes)
+        for joke_idx in range(len(joke_ideas)):
+            scheduler.submit("rubrics", joke_idx, rubrics_task, joke_idx)
+        scheduler.run()
+        # Same order as the per-idea schedule: ideas in order, initial rubrics before critiqued ones
+        for joke_idx in range(len(joke_ideas)):
+            all_rubrics.extend(initial_rubrics[joke_idx] + critiqued_rubrics[joke_idx])
+            all_jokes.extend(joke for _, joke in sorted(idea_jokes[joke_idx].items()) if joke)
     
     progress_bar.close()
     
+    if cascade_keep is not None:
+        all_jokes = refine_drafts(all_jokes, all_rubrics, joke_ideas, theme, cascade_keep, cache, concurrency,
+                                  record_joke_time, out_of_time, results)
+    
     # Store results
     results["rubrics"] = all_rubrics
     results["jokes"] = all_jokes
+    results["fallbacks"] = FALLBACKS.summary()
+    results["metrics"] = METRICS.summary()
+    elapsed = time.monotonic() - run_start
+    results["timing"] = {
+        "seconds": round(elapsed, 2),
+        "time_to_first_joke": round(joke_times[0], 2) if joke_times else None,
+        "jokes_per_minute": round(60 * len(joke_times) / elapsed, 2) if elapsed > 0 else None,
+    }
+    if get_deadline() is not None:
+        results["deadline"] = {"seconds": round(get_deadline().seconds, 2), "expired": deadline_expired(),
+                               "skipped_calls": dict(deadline_skips)}
+    if get_controller("generator") is not None:
+        results["concurrency"] = controller_stats()
+    if incremental:
+        cache.save()
+        results["stage_cache"] = cache.summary()
     
     # Summary
     print(f"\n{Fore.CYAN}=== Summary ==={Style.RESET_ALL}")
@@ -178,11 +382,31 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
     print(f"Joke Ideas: {len(joke_ideas)}")
     print(f"Total Rubrics: {len(all_rubrics)}")
     print(f"Total Jokes: {len(all_jokes)}")
+    timing = results["timing"]
+    if timing["time_to_first_joke"] is not None:
+        print(f"Time to first joke: {timing['time_to_first_joke']:.1f}s, "
+              f"{timing['jokes_per_minute']:.1f} jokes/minute over {timing['seconds']:.1f}s ({schedule} schedule)")
+    if deadline_skips:
+        print("Deadline reached; stage calls not started: "
+              + ", ".join(f"{stage} {count}" for stage, count in deadline_skips.items()))
+    fallback_summary = results["fallbacks"]
+    print(f"Wasted LLM calls (fallbacks): {fallback_summary['wasted_calls']} "
+          f"(retries: {sum(fallback_summary['retries'].values())}, "
+          f"pruned: {sum(fallback_summary['pruned'].values())}, "
+          f"downstream calls skipped: {sum(fallback_summary['skipped_calls'].values())})")
+    for stage, stage_metrics in results["metrics"].items():
+        hedged = f", hedged {stage_metrics['hedges']} (won {stage_metrics['hedge_wins']})" if "hedges" in stage_metrics else ""
+        print(f"  {stage}: {stage_metrics['calls']} calls, p50 {stage_metrics['p50']}s, p99 {stage_metrics['p99']}s{hedged}")
+    if incremental:
+        print("Stage cache: " + ", ".join(
+            f"{stage} {counts['reused']} reused/{counts['computed']} computed"
+            for stage, counts in results["stage_cache"].items()
+        ))
     
     # Save results
     try:
         output_path = Path(output_file)
-        with open(output_path, "w") as f:
+        with span("save results", "local"), open(output_path, "w") as f:
             json.dump(results, f, indent=2)
         print(f"\nResults saved to {output_path.absolute()}")
     except Exception as e:
@@ -190,12 +414,99 @@ def generate_multistage_jokes(theme, num_ideas, rubrics_per_idea, critiques_per_
     
     return results
 
+def refine_drafts(drafts, rubrics, joke_ideas, theme, keep, cache, concurrency, record_joke_time, out_of_time,
+                  results):
+    """
+    Cascade step: screen draft jokes locally and refine the promising ones with the full model.
+    
+    Drafts are screened with the pre-screen scorer (joke_prescreen.py) when a
+    fitted model exists: duds are discarded and the keep fraction of the rest
+    with the best predicted scores is refined, best first. Without a model
+    the keep fraction is taken in idea order instead: duds are discarded and
+    each idea's earliest drafts (initial rubrics before critiqued ones) are
+    refined first, round-robin across ideas. Drafts the run deadline leaves
+    no time to refine are kept as they are.
+    
+    Returns:
+        The refined jokes, in draft order; the cascade summary is stored in results["cascade"]
+    """
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+    from gen_jokes import refine_joke
+    from joke_prescreen import PrescreenScorer, is_dud
+    from utils.metrics import METRICS
+    from utils.planner import refined_jokes_for
+    
+    print(f"\n{Fore.GREEN}=== CASCADE: SCREENING AND REFINING {len(drafts)} DRAFTS ==={Style.RESET_ALL}")
+    try:
+        scorer = PrescreenScorer.load()
+    except (OSError, ValueError, KeyError):
+        scorer = None
+        print(f"{Fore.YELLOW}No pre-screen model (run 'python joke_prescreen.py fit'); "
+              f"refining the first {keep:.0%} of drafts in idea order.{Style.RESET_ALL}")
+    if scorer is not None:
+        promising, _ = scorer.screen(drafts, keep=keep)
+    else:
+        candidates = [draft for draft in drafts if not is_dud(draft["text"], draft.get("theme"))]
+        # Each idea's n-th draft ranks before any idea's (n+1)-th
+        seen = Counter()
+        ranked = []
+        for position, draft in enumerate(candidates):
+            ranked.append((seen[draft.get("idea_id")], position, draft))
+            seen[draft.get("idea_id")] += 1
+        ranked.sort(key=lambda item: item[:2])
+        promising = [draft for _, _, draft in ranked[:refined_jokes_for(len(candidates), keep)]]
+    promising_ids = {id(draft) for draft in promising}
+    discarded = [draft for draft in drafts if id(draft) not in promising_ids]
+    print(f"Refining {len(promising)} of {len(drafts)} drafts; discarding {len(discarded)}")
+    
+    rubrics_by_id = {rubric["id"]: rubric for rubric in rubrics if isinstance(rubric, dict) and "id" in rubric}
+    ideas_by_id = {idea["id"]: idea for idea in joke_ideas if "id" in idea}
+    
+    def refine(draft):
+        if out_of_time("refine", 0):
+            joke = dict(draft, metadata={**draft.get("metadata", {}), "refined": False})
+        else:
+            joke = cache.call("refine", refine_joke, draft, rubrics_by_id.get(draft.get("rubric_id"), {}),
+                              ideas_by_id.get(draft.get("idea_id"), {}), theme)
+        record_joke_time(joke)
+        return joke
+    
+    # Most promising drafts first, so a deadline cuts the least promising refinements
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        refined = dict(zip(map(id, promising), executor.map(refine, promising)))
+    jokes = [refined[id(draft)] for draft in drafts if id(draft) in refined]
+    
+    totals = METRICS.totals()
+    call_seconds = {stage: round(totals.get(stage, {}).get("latency_sum", 0.0), 2) for stage in ("drafts", "refine")}
+    results["cascade"] = {
+        "keep": keep,
+        "screen": "prescreen" if scorer is not None else "idea_order",
+        "drafts": len(drafts),
+        "refined": sum(1 for joke in jokes if joke.get("metadata", {}).get("refined")),
+        "unrefined": sum(1 for joke in jokes if not joke.get("metadata", {}).get("refined")),
+        "call_seconds": call_seconds,
+        "discarded": [
+            {"text": draft["text"], "rubric_id": draft.get("rubric_id"),
+             "predicted": round(scorer.predict(draft["text"]), 2) if scorer is not None else None}
+            for draft in discarded
+        ],
+    }
+    joke_seconds = sum(call_seconds.values())
+    print(f"Cascade: {results['cascade']['refined']} refined, {len(discarded)} discarded; "
+          f"draft calls {call_seconds['drafts']:.1f}s, refine calls {call_seconds['refine']:.1f}s"
+          + (f", {len(jokes) / joke_seconds:.2f} jokes per call-second" if joke_seconds > 0 else ""))
+    return jokes
+
 def generate_baseline_jokes(theme, num_jokes, output_file):
     """Generate baseline jokes"""
+    from baseline_joke_gen import generate_jokes_chunked
+    from utils.profiling import span
+
     print(f"\n{Fore.CYAN}========== BASELINE JOKE GENERATION =========={Style.RESET_ALL}")
     print(f"Generating {num_jokes} baseline jokes for theme: '{theme}'")
     
-    jokes, raw_response = generate_joke(
+    jokes, raw_response = generate_jokes_chunked(
         theme, 
         num_jokes=num_jokes, 
         enhanced=True, 
@@ -220,7 +531,7 @@ def generate_baseline_jokes(theme, num_jokes, output_file):
         if raw_response:
             output_data["raw_response"] = raw_response
             
-        with open(output_file, 'w') as f:
+        with span("save baseline", "local"), open(output_file, 'w') as f:
             json.dump(output_data, f, indent=2)
         print(f"\nBaseline jokes saved to {Path(output_file).absolute()}")
         
@@ -229,8 +540,12 @@ def generate_baseline_jokes(theme, num_jokes, output_file):
         print(f"{Fore.RED}Error saving baseline jokes: {e}{Style.RESET_ALL}")
         return None
 
-def evaluate_jokes(multistage_file, baseline_file):
+def evaluate_jokes(multistage_file, baseline_file, batch_size=1, ci_half_width=0.5, max_per_method=0, seed=None):
     """Evaluate jokes using the Judge"""
+    from tqdm import tqdm
+    from joke_judge import JokeJudge, JudgeCoalescer
+    from utils.profiling import span
+
     print(f"\n{Fore.CYAN}========== JOKE EVALUATION =========={Style.RESET_ALL}")
     
     judge = JokeJudge()
@@ -247,35 +562,46 @@ def evaluate_jokes(multistage_file, baseline_file):
             print(f"{Fore.RED}No baseline jokes found to evaluate.{Style.RESET_ALL}")
             return None
             
-        # Limit to sample size for comparison (match the smaller set)
-        sample_size = min(len(multistage_jokes), len(baseline_jokes))
-        if sample_size > 5:
-            sample_size = 5  # Cap at 5 jokes per method for reasonable evaluation time
-            
-        print(f"Evaluating {sample_size} jokes from each method...")
-        
-        multistage_sample = multistage_jokes[:sample_size]
-        baseline_sample = baseline_jokes[:sample_size]
-        all_jokes = multistage_sample + baseline_sample
+        # Judge stratified samples of both methods in rounds until the
+        # confidence interval on the score difference is narrow enough
+        limit = min(len(multistage_jokes), len(baseline_jokes))
+        if max_per_method > 0:
+            limit = min(limit, max_per_method)
+        print(f"Evaluating up to {limit} jokes from each method "
+              f"(stopping at a 95% CI half-width of {ci_half_width})...")
         
-        # Judge jokes with progress bar
-        judgments = []
-        progress_bar = tqdm(total=len(all_jokes), desc="Evaluating jokes", unit="joke")
-        
-        for joke in all_jokes:
-            judgment = judge.judge_joke(joke)
-            judgments.append(judgment)
-            progress_bar.update(1)
-            
+        progress_bar = tqdm(total=2 * limit, desc="Evaluating jokes", unit="joke")
+        # With adaptive concurrency the judge controller, not the coalescer, bounds in-flight batches
+        from utils.concurrency import get_controller
+        judge_controller = get_controller("judge")
+        max_in_flight = judge_controller.max_limit if judge_controller is not None else 2
+        coalescer = (JudgeCoalescer(judge, max_batch_size=batch_size, max_in_flight=max_in_flight)
+                     if batch_size > 1 else None)
+        try:
+            judgments, comparison = judge.judge_sequential(
+                multistage_jokes, baseline_jokes, coalescer=coalescer, max_half_width=ci_half_width,
+                max_per_method=max_per_method, round_size=max(4, batch_size // 2), seed=seed,
+                progress=progress_bar
+            )
+        finally:
+            if coalescer:
+                coalescer.close()
         progress_bar.close()
         
+        judged = comparison["judged"]
+        print(f"Judged {judged['multi-stage']} multi-stage and {judged['baseline']} baseline jokes "
+              f"(stopped: {comparison['stopped']})")
+        if "difference" in comparison:
+            print(f"Multi-stage minus baseline Overall: {comparison['difference']:+.2f} "
+                  f"(95% CI {comparison['ci_low']:+.2f} to {comparison['ci_high']:+.2f})")
+        
         # Calculate statistics
         parameter_stats, overall_stats = judge.calculate_statistics(judgments)
         
         # Save judgments
         output_file = "joke_judgments.json"
-        with open(output_file, 'w') as f:
-            json.dump({"judgments": judgments}, f, indent=2)
+        with span("save judgments", "local"), open(output_file, 'w') as f:
+            json.dump({"judgments": judgments, "comparison": comparison}, f, indent=2)
         print(f"Judgments saved to {Path(output_file).absolute()}")
         
         # Print comparison
@@ -283,6 +609,7 @@ def evaluate_jokes(multistage_file, baseline_file):
         
         return {
             "judgments": judgments,
+            "comparison": comparison,
             "parameter_stats": parameter_stats,
             "overall_stats": overall_stats
         }
@@ -295,6 +622,8 @@ def evaluate_jokes(multistage_file, baseline_file):
 
 def display_top_jokes(judgment_results, multistage_file, baseline_file):
     """Display the top jokes based on evaluation results"""
+    from tabulate import tabulate
+
     if not judgment_results or "judgments" not in judgment_results:
         print(f"{Fore.RED}No judgment results available.{Style.RESET_ALL}")
         return
@@ -364,58 +693,218 @@ def display_top_jokes(judgment_results, multistage_file, baseline_file):
 
 def main():
     """Main execution function"""
+    # Parse arguments first so --help never pays for configuration checks
+    args = parse_args()
+    from utils.profiling import PROFILER, span
+    
+    # Recorded runs must sample the same jokes for judging to be replayable
+    judge_seed = args.judge_seed
+    if args.record or args.replay:
+        from utils.cassette import configure_cassette
+        if judge_seed is None:
+            judge_seed = 0
+        configure_cassette(args.record or args.replay, "record" if args.record else "replay",
+                           match="order" if args.replay_order else "hash")
+    
     # Check configuration
     if not initialize_config():
         print(f"{Fore.RED}Failed to initialize configuration. Please check your .env file.{Style.RESET_ALL}")
         return
     
-    # Parse arguments
-    args = parse_args()
+    if args.hedge is not None:
+        from utils.llm import configure_hedging
+        configure_hedging(percentile=args.hedge)
+    if args.adaptive_concurrency:
+        from utils.concurrency import configure_adaptive_concurrency
+        configure_adaptive_concurrency(True)
+    if args.routing:
+        from utils.routing import configure_routing, load_routing_file
+        try:
+            configure_routing(load_routing_file(args.routing))
+        except (OSError, ValueError) as e:
+            print(f"{Fore.RED}Invalid routing file: {e}{Style.RESET_ALL}")
+            return
+    
+    from utils import planner
+    
+    # Anytime mode: the deadline covers the whole run from here
+    deadline = None
+    if args.deadline:
+        from utils.deadline import Deadline
+        text = args.deadline.strip()
+        try:
+            # A bare number means seconds here, not tokens
+            kind, seconds = planner.parse_budget(text + "s" if text.replace(".", "", 1).isdigit() else text)
+        except ValueError as e:
+            print(f"{Fore.RED}{e}{Style.RESET_ALL}")
+            return
+        if kind != "seconds":
+            print(f"{Fore.RED}--deadline takes a duration (e.g. 60s, 2m), not {args.deadline!r}{Style.RESET_ALL}")
+            return
+        deadline = Deadline(seconds)
+    schedule = args.schedule or ("depth" if deadline else "idea")
     
     # Configuration
     theme = args.theme
-    num_ideas = max(1, min(10, args.ideas))  # Limit between 1-10
-    rubrics_per_idea = max(1, min(5, args.rubrics_per_idea))  # Limit between 1-5
-    critiques_per_rubric = max(0, min(3, args.critiques_per_rubric))  # Limit between 0-3
+    num_ideas = max(1, min(planner.MAX_IDEAS, args.ideas))
+    rubrics_per_idea = max(1, min(planner.MAX_RUBRICS_PER_IDEA, args.rubrics_per_idea))
+    critiques_per_rubric = max(0, min(planner.MAX_CRITIQUES_PER_RUBRIC, args.critiques_per_rubric))
+    concurrency = max(1, args.concurrency)
+    from utils.concurrency import get_controller
+    generator_controller = get_controller("generator")
+    if generator_controller is not None:
+        # Enough workers that the controller's limit, not the worker count, bounds in-flight calls
+        concurrency = max(concurrency, generator_controller.max_limit)
     output_file = args.output
     baseline_file = args.baseline
     
+    with_baseline = not args.no_baseline
+    with_judge = with_baseline and not args.no_judge
+    # Upper bound: sequential judging usually stops earlier
+    judge_jokes_for = lambda jokes, baseline: 2 * min(jokes, baseline, args.judge_max or jokes)
+    estimates = planner.stage_estimates(planner.load_history())
+    
+    if args.budget:
+        try:
+            kind, amount = planner.parse_budget(args.budget)
+        except ValueError as e:
+            print(f"{Fore.RED}{e}{Style.RESET_ALL}")
+            return
+        plan = planner.plan_for_budget(kind, amount, concurrency, with_baseline, with_judge,
+                                       judge_jokes_for, estimates, cascade_keep=args.cascade)
+        if plan is None:
+            print(f"{Fore.RED}Budget {args.budget} is too small for even the smallest run.{Style.RESET_ALL}")
+            return
+        num_ideas, rubrics_per_idea, critiques_per_rubric = (
+            plan["config"]["ideas"], plan["config"]["rubrics"], plan["config"]["critiques"]
+        )
+        print(f"Budget {args.budget}: chose ideas={num_ideas}, rubrics={rubrics_per_idea}, "
+              f"critiques={critiques_per_rubric}")
+    
+    baseline_jokes = planner.baseline_jokes_for(num_ideas, rubrics_per_idea, critiques_per_rubric) if with_baseline else 0
+    total_jokes = num_ideas * rubrics_per_idea * (1 + critiques_per_rubric)
+    if args.cascade is not None:
+        total_jokes = planner.refined_jokes_for(total_jokes, args.cascade)
+    plan = planner.estimate_run(
+        num_ideas, rubrics_per_idea, critiques_per_rubric, concurrency, baseline_jokes,
+        judge_jokes_for(total_jokes, baseline_jokes) if with_judge else 0, estimates,
+        cascade_keep=args.cascade
+    )
+    if args.plan:
+        print(planner.format_plan(plan))
+        sources = sorted({estimate["source"] for stage, estimate in estimates.items() if stage in plan["calls"]})
+        print(f"  Estimates from: {', '.join(sources)}")
+        return
+    
     print(f"\n{Fore.MAGENTA}========== JOKE GENERATION PIPELINE =========={Style.RESET_ALL}")
     print(f"Configuration:")
     print(f"- Theme: '{theme}'")
     print(f"- Target joke ideas: {num_ideas}")
     print(f"- Rubrics per idea: {rubrics_per_idea}")
     print(f"- Critiques per rubric: {critiques_per_rubric}")
-    print(f"- Total expected jokes: {num_ideas * rubrics_per_idea * (1 + critiques_per_rubric)}")
+    if generator_controller is not None:
+        print(f"- Concurrency: adaptive (limit {generator_controller.limit}, up to {generator_controller.max_limit} in flight)")
+    else:
+        print(f"- Concurrency: {concurrency}")
+    if schedule != "idea":
+        print(f"- Schedule: {schedule}-first")
+    if args.cascade is not None:
+        print(f"- Cascade: draft every joke, refine the top {args.cascade:.0%}")
+    from utils.routing import describe_routes
+    if describe_routes():
+        print(f"- Stage routes:\n{describe_routes()}")
+    if deadline is not None:
+        print(f"- Deadline: {planner.format_duration(deadline.seconds)}")
+    print(f"- Total expected jokes: {total_jokes}")
+    print(f"- Estimated: {plan['total_calls']} LLM calls, ~{plan['total_tokens']:,} tokens, "
+          f"~{planner.format_duration(plan['seconds'])}")
+    
+    # Under a deadline each phase stops early enough for the phases after it
+    # to do their first useful work: one wave of baseline chunks and the
+    # judge's first round. Time a phase does not use passes to the next.
+    first_judge_round = 2 * 5  # judge_sequential's minimum per method, for both methods
+    reserves = {
+        "baseline": min(plan["phase_seconds"].get("baseline", 0), estimates["baseline"]["seconds"]),
+        "judge": min(plan["phase_seconds"].get("judge", 0),
+                     -(-first_judge_round // max(1, args.judge_batch_size)) * estimates["judge"]["seconds"]),
+    }
     
-    # Generate multi-stage jokes
-    multistage_results = generate_multistage_jokes(
-        theme, 
-        num_ideas, 
-        rubrics_per_idea, 
-        critiques_per_rubric, 
-        output_file
-    )
+    def phase_deadline(name):
+        if deadline is None:
+            return contextlib.nullcontext()
+        from utils.deadline import deadline_scope
+        reserves.pop(name, None)
+        return deadline_scope(deadline.leaving(sum(reserves.values())))
     
-    # Generate baseline jokes if not skipped
-    baseline_results = None
-    if not args.no_baseline:
-        # For baseline, generate a similar number of jokes as the multi-stage approach
-        baseline_num_jokes = min(10, num_ideas * rubrics_per_idea)
-        baseline_results = generate_baseline_jokes(theme, baseline_num_jokes, baseline_file)
-    else:
-        print(f"\n{Fore.YELLOW}Skipping baseline joke generation.{Style.RESET_ALL}")
+    if args.profile:
+        PROFILER.start()
+    try:
+        # Generate multi-stage jokes
+        with span("multi-stage generation", "phase"), phase_deadline("generation"):
+            multistage_results = generate_multistage_jokes(
+                theme, 
+                num_ideas, 
+                rubrics_per_idea, 
+                critiques_per_rubric, 
+                output_file,
+                speculative=args.speculative,
+                concurrency=concurrency,
+                incremental=args.incremental,
+                schedule=schedule,
+                cascade_keep=args.cascade
+            )
     
-    # Evaluate jokes if not skipped
-    judgment_results = None
-    if not args.no_judge and (args.run_all or multistage_results and baseline_results):
-        judgment_results = evaluate_jokes(output_file, baseline_file)
+        # Generate baseline jokes if not skipped
+        baseline_results = None
+        if not args.no_baseline:
+            # For baseline, generate a similar number of jokes as the multi-stage approach
+            with span("baseline generation", "phase"), phase_deadline("baseline"):
+                baseline_results = generate_baseline_jokes(theme, baseline_jokes, baseline_file)
+        else:
+            print(f"\n{Fore.YELLOW}Skipping baseline joke generation.{Style.RESET_ALL}")
+    
+        # Evaluate jokes if not skipped
+        judgment_results = None
+        if not args.no_judge and (args.run_all or multistage_results and baseline_results):
+            with span("evaluation", "phase"), phase_deadline("judge"):
+                judgment_results = evaluate_jokes(output_file, baseline_file, batch_size=args.judge_batch_size,
+                                                  ci_half_width=args.judge_ci, max_per_method=args.judge_max,
+                                                  seed=judge_seed)
         
-        # Display top jokes
-        if judgment_results:
-            display_top_jokes(judgment_results, output_file, baseline_file)
-    else:
-        print(f"\n{Fore.YELLOW}Skipping joke evaluation.{Style.RESET_ALL}")
+            # Display top jokes
+            if judgment_results:
+                display_top_jokes(judgment_results, output_file, baseline_file)
+        else:
+            print(f"\n{Fore.YELLOW}Skipping joke evaluation.{Style.RESET_ALL}")
+    
+        # Feed this run's per-stage latency and token usage back into the planner
+        # (a replay would count the recorded run twice)
+        if not args.replay:
+            from utils.metrics import METRICS
+            planner.save_history(METRICS.totals())
+    finally:
+        if args.profile:
+            PROFILER.export(args.profile)
+    
+    from utils.concurrency import controller_stats, format_knee_table
+    for role, stats in controller_stats().items():
+        if stats["levels"]:
+            print(f"\nAdaptive concurrency ({role}): final limit {stats['limit']}, peak in flight "
+                  f"{stats['peak_in_flight']}, decisions {stats['decisions']}")
+            print(format_knee_table(stats))
+    
+    from utils.cassette import get_cassette
+    cassette = get_cassette()
+    if cassette is not None:
+        cassette.close()
+        summary = cassette.summary()
+        print(f"\nCassette {summary['path']}: {summary['recorded']} calls recorded, "
+              f"{summary['replayed']} replayed, {summary['misses']} missing")
+    
+    if deadline is not None:
+        used = deadline.seconds - deadline.remaining()
+        print(f"\nDeadline {planner.format_duration(deadline.seconds)}: finished after {used:.1f}s"
+              f"{' (deadline reached)' if deadline.expired() else ''}")
     
     print(f"\n{Fore.MAGENTA}========== PIPELINE COMPLETE =========={Style.RESET_ALL}")
 
@@ -1 +1,7 @@
-from .config import *
+from . import config
+
+def __getattr__(name):
+    # Re-export configuration lazily so `import utils` does not read .env
+    if name in config.__all__:
+        return getattr(config, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
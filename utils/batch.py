@@ -0,0 +1,249 @@
+"""
+Offline batch request files for bulk runs (joke_batch.py).
+
+Instead of holding a connection open for every call, a batch run compiles
+the calls a stage is waiting on into an OpenAI-batch-style request file
+(one JSON line per request: custom_id, method, url and the
+chat.completions body), has a batch endpoint process it, and ingests the
+output file (one line per request: custom_id and either response.body, a
+chat.completion, or error) into a response store.
+
+While a BatchRun is active (batch_scope), utils.llm serves every call from
+the store by request hash, like a cassette replay. A call with no stored
+response is not sent: it is added to the run's pending requests and raises
+BatchDeferred, which stages handle like a call skipped at the run deadline
+(and call_with_retry does not retry). Re-running the pipeline after each
+ingest therefore advances it one stage at a time: answered stages replay
+instantly and the first stage still missing responses defers all of its
+calls. Calls of other stages are deferred too but not written out, since
+they may be built from the partial results a deferred call left behind
+(ideas formulated without the second-order observations, say); they are
+compiled once the stage before them is answered.
+
+custom_ids are <stage>-<request hash>-<n>, where n counts identical
+requests within a run, so a retried request gets its own id.
+
+process_requests is a local stand-in for the batch endpoint: it sends each
+request through utils.llm (backend pool, routed endpoints, cassettes) and
+writes the output file a batch endpoint would.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from utils.cassette import request_key
+from utils.deadline import DeadlineExceeded
+
+BATCH_URL = "/v1/chat/completions"
+
+# Request fields that only make sense for a live connection
+_LIVE_FIELDS = {"stream", "stream_options"}
+
+
+class BatchDeferred(DeadlineExceeded):
+    """An LLM call was deferred to a batch request file instead of being sent."""
+
+
+_local = threading.local()
+
+
+def consume_deferral() -> bool:
+    """True if the calling thread's last LLM call was deferred to a batch file; clears the flag."""
+    deferred = getattr(_local, "deferred", False)
+    _local.deferred = False
+    return deferred
+
+
+def _read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_jsonl(path: str, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, default=str, separators=(",", ":")) + "\n")
+
+
+def _stage_of(custom_id: str):
+    stage = custom_id.split("-", 1)[0]
+    return None if stage == "call" else stage
+
+
+class BatchRun:
+    """
+    One pass of a batch run: serves stored responses and collects the
+    requests that still need one.
+
+    Args:
+        store_path: Response store (JSONL written by ingest_output); may not exist yet
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._responses = {}
+        if os.path.exists(store_path):
+            for entry in _read_jsonl(store_path):
+                self._responses[entry["custom_id"]] = entry
+        self._occurrences = Counter()
+        self.pending = {}
+        # The first stage with a deferred call; only its requests are pending
+        self.stage = None
+        self.held_back = 0
+        self.replayed = 0
+
+    def resolve(self, stage: str, create_kwargs: dict) -> dict:
+        """
+        Return the stored response entry for a request.
+
+        Raises:
+            BatchDeferred: No response is stored yet; the request is now pending
+                           (or held back, if an earlier stage is pending)
+        """
+        key = request_key(create_kwargs)
+        with self._lock:
+            custom_id = f"{stage or 'call'}-{key}-{self._occurrences[key]}"
+            self._occurrences[key] += 1
+            entry = self._responses.get(custom_id)
+            if entry is None and self.stage is None:
+                self.stage = stage or "call"
+            if entry is None and self.stage != (stage or "call"):
+                self.held_back += 1
+            elif entry is None:
+                self.pending[custom_id] = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": BATCH_URL,
+                    "body": {field: value for field, value in create_kwargs.items() if field not in _LIVE_FIELDS},
+                }
+            else:
+                self.replayed += 1
+        _local.deferred = entry is None
+        if entry is None:
+            raise BatchDeferred(f"{stage or 'call'} request deferred to the batch file ({custom_id})")
+        return entry
+
+    def pending_by_stage(self) -> dict:
+        with self._lock:
+            return dict(Counter(_stage_of(custom_id) or "call" for custom_id in self.pending))
+
+    def write_requests(self, path: str) -> int:
+        """Write the pending requests as a batch request file; returns how many were written."""
+        with self._lock:
+            requests = list(self.pending.values())
+        _write_jsonl(path, requests)
+        return len(requests)
+
+
+_active = None
+
+
+def get_batch():
+    """The batch run LLM calls are currently served by, or None."""
+    return _active
+
+
+@contextlib.contextmanager
+def batch_scope(run: BatchRun):
+    """Serve all LLM calls made inside the block (from any thread) from run."""
+    global _active
+    previous = _active
+    _active = run
+    try:
+        yield run
+    finally:
+        _active = previous
+
+
+def ingest_output(output_path: str, store_path: str) -> dict:
+    """
+    Append the successful responses of a batch output file to a response store.
+
+    Failed requests are not stored, so the next pass defers them again.
+
+    Returns:
+        {"ingested": n, "failed": {custom_id: reason}}
+    """
+    ingested, failed = [], {}
+    for line in _read_jsonl(output_path):
+        custom_id = line.get("custom_id")
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        choices = body.get("choices") or []
+        if not custom_id:
+            continue
+        if line.get("error") or response.get("status_code") != 200 or not choices:
+            error = line.get("error") or body.get("error") or {}
+            failed[custom_id] = error.get("message") or f"status {response.get('status_code')}"
+            continue
+        usage = body.get("usage") or {}
+        ingested.append({
+            "custom_id": custom_id,
+            "content": (choices[0].get("message") or {}).get("content"),
+            "finish_reason": choices[0].get("finish_reason"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        })
+    with open(store_path, "a", encoding="utf-8") as f:
+        for entry in ingested:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    return {"ingested": len(ingested), "failed": failed}
+
+
+def _request_client(stage: str):
+    """Client for a stage's requests: its routed endpoint, the judge's endpoint, or None for the backend pool."""
+    from utils.llm import get_client
+    from utils.routing import stage_route
+    base_url = stage_route(stage).get("base_url") if stage else None
+    if base_url:
+        return get_client(base_url)
+    return get_client() if stage == "judge" else None
+
+
+def process_requests(requests_path: str, output_path: str, concurrency: int = 4) -> dict:
+    """
+    Process a batch request file locally and write its batch output file.
+
+    Args:
+        requests_path: Batch request file (written by BatchRun.write_requests)
+        output_path: Where to write the output file
+        concurrency: Requests sent at once
+
+    Returns:
+        {"completed": n, "failed": n}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.llm import send_request
+
+    def process(request):
+        stage = _stage_of(request["custom_id"])
+        line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"]}
+        try:
+            content, finish_reason = send_request(request["body"], stage=stage, client=_request_client(stage))
+        except Exception as e:
+            line.update(response=None, error={"code": type(e).__name__, "message": str(e)})
+            return line
+        line.update(error=None, response={
+            "status_code": 200,
+            "request_id": uuid.uuid4().hex,
+            "body": {
+                "object": "chat.completion",
+                "model": request["body"].get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": finish_reason}],
+            },
+        })
+        return line
+
+    requests = list(_read_jsonl(requests_path))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        lines = list(executor.map(process, requests))
+    _write_jsonl(output_path, lines)
+    failed = sum(1 for line in lines if line["error"])
+    return {"completed": len(lines) - failed, "failed": failed}
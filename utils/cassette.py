@@ -0,0 +1,176 @@
+"""
+Record/replay cassettes for LLM traffic.
+
+In record mode every completion that goes through utils.llm (all stages,
+the baseline generator and the judge) is appended to a cassette: one JSON
+line per call holding a hash of the request, the request itself, the
+response content, finish reason, latency and token usage. Paths ending in
+.gz are gzip-compressed. Request hashes ignore the uuids that prompts embed,
+so a replayed run matches the recorded one even though it mints new ids.
+
+In replay mode calls are served from the cassette with no network access:
+by request hash (the default; identical requests are served in recorded
+order, so concurrent runs replay correctly) or strictly in recorded order.
+Replayed calls report their recorded latency and token usage to
+utils.metrics, so summaries match the recorded run while wall time only
+reflects local CPU work. A request that is not on the cassette raises
+CassetteMissError.
+
+Enable with --record/--replay on main.py and joke_judge.py, or for any
+entry point with CASSETTE_MODE=record|replay and CASSETTE_FILE.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import re
+import threading
+from collections import defaultdict, deque
+
+# Request fields that do not affect the response
+_IGNORED_FIELDS = {"stream", "stream_options"}
+
+# Prompts embed freshly generated ids (e.g. a rubric dict with its uuid4),
+# which differ on every run and must not change the request hash
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+class CassetteMissError(RuntimeError):
+    """A replayed request has no matching recording."""
+
+
+def request_key(create_kwargs: dict) -> str:
+    """Stable hash of the fields of a chat.completions.create request, ignoring embedded uuids."""
+    request = {key: value for key, value in create_kwargs.items() if key not in _IGNORED_FIELDS}
+    payload = _UUID.sub("<id>", json.dumps(request, sort_keys=True, default=str, separators=(",", ":")))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """
+    A cassette file opened for recording or replay.
+
+    Args:
+        path: Cassette file (.jsonl, or .jsonl.gz for compression)
+        mode: "record" (truncates the file) or "replay"
+        match: Replay matching, "hash" or "order"
+    """
+
+    def __init__(self, path: str, mode: str = "replay", match: str = "hash"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        if match not in ("hash", "order"):
+            raise ValueError(f"Unknown cassette match {match!r}")
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == "record":
+            self._file = _open(path, "w")
+        else:
+            self._file = None
+            self._by_key = defaultdict(deque)
+            self._in_order = deque()
+            with _open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._by_key[entry["key"]].append(entry)
+                        self._in_order.append(entry)
+
+    def __len__(self):
+        return len(self._in_order) if self.mode == "replay" else self.recorded
+
+    def record(self, stage: str, create_kwargs: dict, content: str, finish_reason: str,
+               latency: float, prompt_tokens: int = None, completion_tokens: int = None):
+        entry = {
+            "key": request_key(create_kwargs),
+            "stage": stage,
+            "request": {key: value for key, value in create_kwargs.items() if key not in _IGNORED_FIELDS},
+            "content": content,
+            "finish_reason": finish_reason,
+            "latency": round(latency, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        line = json.dumps(entry, default=str, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.recorded += 1
+
+    def replay(self, stage: str, create_kwargs: dict) -> dict:
+        """
+        Return the recorded entry for a request.
+
+        Raises:
+            CassetteMissError: No unplayed recording matches the request
+        """
+        key = request_key(create_kwargs)
+        with self._lock:
+            if self.match == "order":
+                entry = self._in_order.popleft() if self._in_order else None
+                if entry is not None and entry["key"] != key:
+                    print(f"Warning: cassette entry {self.replayed + 1} was recorded for a different "
+                          f"{entry.get('stage') or 'call'} request than this {stage or 'call'} request")
+            else:
+                recordings = self._by_key.get(key)
+                entry = recordings.popleft() if recordings else None
+            if entry is None:
+                self.misses += 1
+                raise CassetteMissError(f"No recording on {self.path} for {stage or 'call'} request {key}")
+            self.replayed += 1
+        return entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self) -> dict:
+        return {"path": self.path, "mode": self.mode, "recorded": self.recorded,
+                "replayed": self.replayed, "misses": self.misses}
+
+
+_cassette = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def configure_cassette(path: str = None, mode: str = None, match: str = "hash"):
+    """
+    Start recording to or replaying from a cassette (or turn cassettes off).
+
+    Returns:
+        The active Cassette, or None when mode is empty
+    """
+    global _cassette, _configured
+    with _config_lock:
+        if _cassette is not None:
+            _cassette.close()
+        _cassette = Cassette(path, mode, match) if mode else None
+        _configured = True
+        if _cassette is not None:
+            atexit.register(_cassette.close)
+        return _cassette
+
+
+def get_cassette():
+    """The active cassette, configured from CASSETTE_MODE/CASSETTE_FILE on first use."""
+    if not _configured:
+        from utils.config import CASSETTE_FILE, CASSETTE_MODE, CASSETTE_MATCH
+        with _config_lock:
+            already = _configured
+        if not already:
+            configure_cassette(CASSETTE_FILE, CASSETTE_MODE, CASSETTE_MATCH)
+    return _cassette
@@ -0,0 +1,282 @@
+"""
+Adaptive concurrency limits for LLM calls.
+
+A fixed --concurrency is either too timid for a fast model server or
+overloads a slow one: past its throughput knee, extra in-flight requests
+only queue on the server and every call gets slower. An AIMDController
+instead caps in-flight requests with a limit it adjusts at runtime:
+
+- once per round (as many completed calls as the current limit) it compares
+  the round's latencies with each stage's unloaded latency;
+- if any call in the round failed with a backend error, or latency grew by
+  more than the tolerance, the limit is multiplied by the decrease factor;
+- otherwise, if callers actually hit the limit during the round, it grows
+  by one.
+
+The generator pool and the judge endpoint get separate controllers. Each
+controller keeps its decisions and, per limit it has run at, the busy time
+spent there, calls, errors and mean latency, so the throughput knee of each
+backend can be read from the run output (or /health on joke_service.py).
+
+Enable with --adaptive-concurrency on main.py or ADAPTIVE_CONCURRENCY=1.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+
+ROLES = ("generator", "judge")
+
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease limit on in-flight requests.
+
+    Args:
+        name: Backend role the controller limits (e.g. "generator", "judge")
+        initial_limit: Starting in-flight limit
+        min_limit: Lowest limit a decrease can reach
+        max_limit: Highest limit an increase can reach
+        decrease_factor: Multiplier applied to the limit on overload
+        latency_tolerance: Round latency / unloaded latency ratio treated as overload
+        history: Number of recent decisions kept
+    """
+
+    # Smoothing factor for the per-stage latency moving average
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, name: str, initial_limit: int = 2, min_limit: int = 1, max_limit: int = 16,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0, history: int = 200):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.wait_seconds = 0.0
+        self.decisions = defaultdict(int)
+        self.events = deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._started = time.monotonic()
+        # stage -> [latency EWMA, unloaded latency estimate]
+        self._stage_latency = {}
+        # limit -> busy time spent at it and calls completed while it was in force
+        self._levels = defaultdict(lambda: {"seconds": 0.0, "calls": 0, "errors": 0, "latency_total": 0.0})
+        self._accounted_until = self._started
+        # Bumped on every decrease (see release)
+        self._epoch = 0
+        self._reset_round()
+
+    def _reset_round(self):
+        self._round_calls = 0
+        self._round_errors = 0
+        self._round_ratios = []
+        self._round_saturated = False
+
+    def acquire(self) -> int:
+        """
+        Wait for a free slot under the current limit and take it.
+
+        Returns:
+            A ticket to pass to release()
+        """
+        with self._cond:
+            if self.in_flight >= self.limit:
+                self._round_saturated = True
+                start = time.monotonic()
+                while self.in_flight >= self.limit:
+                    self._cond.wait()
+                self.wait_seconds += time.monotonic() - start
+            self._account_busy_time()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight >= self.limit:
+                self._round_saturated = True
+            return self._epoch
+
+    def release(self, ticket: int, stage: str, latency: float, ok: bool):
+        """
+        Record the outcome of a call started with acquire().
+
+        Args:
+            ticket: Value returned by acquire()
+            stage: Pipeline stage of the call (latencies are compared per stage)
+            latency: Call latency in seconds, or None if it says nothing about load
+            ok: False for backend errors (connection, timeout, 5xx)
+        """
+        with self._cond:
+            self._account_busy_time()
+            self.in_flight -= 1
+            level = self._levels[self.limit]
+            level["calls"] += 1
+            ratio = None
+            if not ok:
+                level["errors"] += 1
+            elif latency is not None:
+                level["latency_total"] += latency
+                ratio = self._latency_ratio(stage or "unknown", latency)
+            # Calls started before the last decrease were already acted on;
+            # judging them again would cascade one overload into several cuts
+            if ticket == self._epoch:
+                self._round_calls += 1
+                self._round_errors += not ok
+                if ratio is not None:
+                    self._round_ratios.append(ratio)
+                if self._round_calls >= self.limit:
+                    self._decide()
+            self._cond.notify_all()
+
+    def _account_busy_time(self):
+        """Charge the time since the last event to the current limit if calls were in flight."""
+        now = time.monotonic()
+        if self.in_flight > 0:
+            self._levels[self.limit]["seconds"] += now - self._accounted_until
+        self._accounted_until = now
+
+    def _latency_ratio(self, stage: str, latency: float) -> float:
+        """Latency relative to the stage's unloaded latency; updates the stage's estimates."""
+        estimates = self._stage_latency.get(stage)
+        if estimates is None:
+            self._stage_latency[stage] = [latency, latency]
+            return 1.0
+        estimates[0] += self.EWMA_ALPHA * (latency - estimates[0])
+        estimates[1] = min(estimates[1], estimates[0])
+        return latency / estimates[1] if estimates[1] > 0 else 1.0
+
+    def _decide(self):
+        gradient = sum(self._round_ratios) / len(self._round_ratios) if self._round_ratios else None
+        if self._round_errors:
+            self._set_limit(int(self.limit * self.decrease_factor), "decrease_errors", gradient)
+        elif gradient is not None and gradient > self.latency_tolerance:
+            if self.limit == self.min_limit:
+                # Still slow with nothing left to shed: the server itself got
+                # slower, so its current latency becomes the new unloaded one
+                for estimates in self._stage_latency.values():
+                    estimates[1] = estimates[0]
+                self.decisions["rebase"] += 1
+            else:
+                self._set_limit(int(self.limit * self.decrease_factor), "decrease_latency", gradient)
+        elif self._round_saturated and self.limit < self.max_limit:
+            self._set_limit(self.limit + 1, "increase", gradient)
+        else:
+            self.decisions["hold"] += 1
+        self._reset_round()
+
+    def _set_limit(self, limit: int, reason: str, gradient: float):
+        limit = min(self.max_limit, max(self.min_limit, limit))
+        self.decisions[reason] += 1
+        if limit == self.limit:
+            return
+        self._account_busy_time()
+        now = self._accounted_until
+        self.events.append({
+            "t": round(now - self._started, 3),
+            "from": self.limit,
+            "to": limit,
+            "reason": reason,
+            "gradient": round(gradient, 2) if gradient is not None else None,
+        })
+        if limit < self.limit:
+            self._epoch += 1
+        self.limit = limit
+
+    def stats(self) -> dict:
+        """Current limit, decision counts, recent changes and throughput per limit."""
+        with self._cond:
+            now = time.monotonic()
+            levels = {}
+            for limit, level in sorted(self._levels.items()):
+                seconds = level["seconds"]
+                if limit == self.limit and self.in_flight > 0:
+                    seconds += now - self._accounted_until
+                ok_calls = level["calls"] - level["errors"]
+                levels[limit] = {
+                    "seconds": round(seconds, 2),
+                    "calls": level["calls"],
+                    "errors": level["errors"],
+                    "mean_latency": round(level["latency_total"] / ok_calls, 3) if ok_calls else None,
+                    "calls_per_minute": round(60 * level["calls"] / seconds, 1) if seconds > 0 else None,
+                }
+            # The knee: the smallest limit within 10% of the best throughput
+            # (among limits held for at least three rounds); higher limits
+            # only add queueing on the server
+            rates = {limit: level["calls_per_minute"] for limit, level in levels.items()
+                     if level["calls_per_minute"] and level["calls"] >= 3 * limit}
+            knee = min(limit for limit, rate in rates.items() if rate >= 0.9 * max(rates.values())) if rates else None
+            return {
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "wait_seconds": round(self.wait_seconds, 2),
+                "decisions": dict(self.decisions),
+                "knee": knee,
+                "levels": levels,
+                "events": list(self.events),
+            }
+
+
+_controllers = None
+_controllers_lock = threading.Lock()
+
+
+def configure_adaptive_concurrency(enabled: bool = True, initial_limit: int = None,
+                                   generator_max: int = None, judge_max: int = None):
+    """
+    Turn the generator and judge controllers on or off for this process,
+    overriding the AIMD_* settings from configuration.
+
+    Args:
+        enabled: Whether LLM calls are gated by adaptive limits
+        initial_limit: Starting in-flight limit of both controllers
+        generator_max: Highest in-flight limit for the generator pool
+        judge_max: Highest in-flight limit for the judge endpoint
+    """
+    global _controllers
+    from utils.config import (
+        AIMD_INITIAL_LIMIT, AIMD_MIN_LIMIT, AIMD_GENERATOR_MAX_LIMIT, AIMD_JUDGE_MAX_LIMIT,
+        AIMD_DECREASE_FACTOR, AIMD_LATENCY_TOLERANCE
+    )
+    with _controllers_lock:
+        if not enabled:
+            _controllers = {}
+            return
+        maxima = {"generator": generator_max or AIMD_GENERATOR_MAX_LIMIT, "judge": judge_max or AIMD_JUDGE_MAX_LIMIT}
+        _controllers = {
+            role: AIMDController(role, initial_limit=initial_limit or AIMD_INITIAL_LIMIT, min_limit=AIMD_MIN_LIMIT,
+                                 max_limit=maxima[role], decrease_factor=AIMD_DECREASE_FACTOR,
+                                 latency_tolerance=AIMD_LATENCY_TOLERANCE)
+            for role in ROLES
+        }
+
+
+def get_controller(role: str):
+    """The controller for a backend role, or None when adaptive concurrency is off."""
+    if _controllers is None:
+        from utils.config import ADAPTIVE_CONCURRENCY
+        with _controllers_lock:
+            configured = _controllers is not None
+        if not configured:
+            configure_adaptive_concurrency(ADAPTIVE_CONCURRENCY)
+    return _controllers.get(role)
+
+
+def controller_stats() -> dict:
+    """Stats of every active controller by role (empty when adaptive concurrency is off)."""
+    get_controller("generator")
+    return {role: controller.stats() for role, controller in _controllers.items()}
+
+
+def format_knee_table(stats: dict) -> str:
+    """Render one controller's per-limit throughput as a table for the run summary."""
+    lines = [f"  {'limit':>5} {'seconds':>8} {'calls':>6} {'errors':>6} {'mean s':>7} {'calls/min':>9}"]
+    for limit, level in stats["levels"].items():
+        marker = "  <- knee" if limit == stats["knee"] else ""
+        mean = f"{level['mean_latency']:.2f}" if level["mean_latency"] is not None else "-"
+        rate = f"{level['calls_per_minute']:.1f}" if level["calls_per_minute"] is not None else "-"
+        lines.append(f"  {limit:>5} {level['seconds']:>8.1f} {level['calls']:>6} {level['errors']:>6} "
+                     f"{mean:>7} {rate:>9}{marker}")
+    return "\n".join(lines)
@@ -1,54 +1,230 @@
 """
 Configuration manager for the joke generation pipeline.
 Loads environment variables and provides configuration across modules.
+
+The .env file is read lazily: importing this module is free, and the
+settings below are resolved the first time any of them is accessed.
 """
 
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+_SETTINGS_LOADED = False
+
+__all__ = [
+    "OPENAI_API_KEY", "OPENROUTER_API_KEY", "LLM_API_BASE_URL", "LLM_API_BASE_URLS",
+    "BACKEND_ROUTING", "BACKEND_EJECT_AFTER", "BACKEND_EJECT_SECONDS", "BACKEND_HEALTH_INTERVAL",
+    "DEFAULT_MODEL", "JUDGE_MODEL",
+    "DEFAULT_THEME", "DEFAULT_NUM_IDEAS", "DEFAULT_RUBRICS_PER_IDEA",
+    "DEFAULT_CRITIQUES_PER_RUBRIC", "DEFAULT_OUTPUT_FILE",
+    "BASELINE_OUTPUT_FILE", "FALLBACK_RETRY_BUDGET",
+    "HEDGE_PERCENTILE", "HEDGE_MIN_SAMPLES", "HEDGE_STAGES", "METRICS_HISTORY_FILE",
+    "STAGE_MAX_TOKENS", "STAGE_STOP_SEQUENCES", "TRUNCATION_RETRY_FACTOR",
+    "STAGE_CACHE_FILE", "STAGE_CACHE_MAX_ENTRIES", "BASELINE_CHUNK_SIZE", "BASELINE_MAX_PARALLEL",
+    "JOKE_INDEX_FILE",
+    "CASSETTE_MODE", "CASSETTE_FILE", "CASSETTE_MATCH",
+    "ADAPTIVE_CONCURRENCY", "AIMD_INITIAL_LIMIT", "AIMD_MIN_LIMIT", "AIMD_GENERATOR_MAX_LIMIT",
+    "AIMD_JUDGE_MAX_LIMIT", "AIMD_DECREASE_FACTOR", "AIMD_LATENCY_TOLERANCE",
+    "PRESCREEN_MODEL_FILE", "STAGE_ROUTES",
+    "initialize_config", "get_api_base_url", "get_api_base_urls", "get_openai_key", "get_openrouter_key",
+]
+
+def _load_settings():
+    """Load the .env file and populate the module-level settings (once)."""
+    global _SETTINGS_LOADED
+    global OPENAI_API_KEY, OPENROUTER_API_KEY, LLM_API_BASE_URL, LLM_API_BASE_URLS
+    global BACKEND_ROUTING, BACKEND_EJECT_AFTER, BACKEND_EJECT_SECONDS, BACKEND_HEALTH_INTERVAL
+    global DEFAULT_MODEL, JUDGE_MODEL
+    global DEFAULT_THEME, DEFAULT_NUM_IDEAS, DEFAULT_RUBRICS_PER_IDEA
+    global DEFAULT_CRITIQUES_PER_RUBRIC, DEFAULT_OUTPUT_FILE, BASELINE_OUTPUT_FILE
+    global BASELINE_CHUNK_SIZE, BASELINE_MAX_PARALLEL
+    global HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_STAGES, METRICS_HISTORY_FILE
+    global STAGE_MAX_TOKENS, STAGE_STOP_SEQUENCES, TRUNCATION_RETRY_FACTOR, STAGE_CACHE_FILE
+    global STAGE_CACHE_MAX_ENTRIES, JOKE_INDEX_FILE, CASSETTE_MODE, CASSETTE_FILE, CASSETTE_MATCH
+    global ADAPTIVE_CONCURRENCY, AIMD_INITIAL_LIMIT, AIMD_MIN_LIMIT, AIMD_GENERATOR_MAX_LIMIT
+    global AIMD_JUDGE_MAX_LIMIT, AIMD_DECREASE_FACTOR, AIMD_LATENCY_TOLERANCE
+    global PRESCREEN_MODEL_FILE, STAGE_ROUTES
+    global FALLBACK_RETRY_BUDGET
+
+    if _SETTINGS_LOADED:
+        return
+
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+
+    # API Configuration
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+    LLM_API_BASE_URL = os.getenv("LLM_API_BASE_URL", "http://localhost:1234/v1/")
+
+    # Generator backend pool: comma-separated base URLs of identical model
+    # servers. Defaults to the single LLM_API_BASE_URL.
+    LLM_API_BASE_URLS = [
+        url.strip() for url in os.getenv("LLM_API_BASE_URLS", "").split(",") if url.strip()
+    ] or [LLM_API_BASE_URL]
+    BACKEND_ROUTING = os.getenv("BACKEND_ROUTING", "least_outstanding")  # or "latency"
+    BACKEND_EJECT_AFTER = int(os.getenv("BACKEND_EJECT_AFTER", "3"))  # consecutive failures
+    BACKEND_EJECT_SECONDS = float(os.getenv("BACKEND_EJECT_SECONDS", "30"))
+    BACKEND_HEALTH_INTERVAL = float(os.getenv("BACKEND_HEALTH_INTERVAL", "10"))
+
+    # LLM Model Selection
+    DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemma-3-4b-it-qat")
+    JUDGE_MODEL = os.getenv("JUDGE_MODEL", "deepseek/deepseek-chat:free")
+
+    # Pipeline Configuration
+    DEFAULT_THEME = os.getenv("DEFAULT_THEME", "penguins")
+    DEFAULT_NUM_IDEAS = int(os.getenv("DEFAULT_NUM_IDEAS", "3"))
+    DEFAULT_RUBRICS_PER_IDEA = int(os.getenv("DEFAULT_RUBRICS_PER_IDEA", "2"))
+    DEFAULT_CRITIQUES_PER_RUBRIC = int(os.getenv("DEFAULT_CRITIQUES_PER_RUBRIC", "1"))
+    DEFAULT_OUTPUT_FILE = os.getenv("DEFAULT_OUTPUT_FILE", "results.json")
+
+    # Baseline Configuration
+    BASELINE_OUTPUT_FILE = os.getenv("BASELINE_OUTPUT_FILE", "baseline.json")
+    # Large baseline sets are generated as parallel requests of this many jokes
+    BASELINE_CHUNK_SIZE = int(os.getenv("BASELINE_CHUNK_SIZE", "5"))
+    BASELINE_MAX_PARALLEL = int(os.getenv("BASELINE_MAX_PARALLEL", "8"))
 
-# API Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-LLM_API_BASE_URL = os.getenv("LLM_API_BASE_URL", "http://localhost:1234/v1/")
+    # Retries allowed per run for calls that return a fallback placeholder
+    FALLBACK_RETRY_BUDGET = int(os.getenv("FALLBACK_RETRY_BUDGET", "5"))
 
-# LLM Model Selection
-DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemma-3-4b-it-qat")
-JUDGE_MODEL = os.getenv("JUDGE_MODEL", "deepseek/deepseek-chat:free")
+    # Request hedging: once a call outlives this latency percentile of its
+    # stage's recent calls, send a duplicate and keep the first valid answer.
+    # 0 disables hedging.
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "8"))
+    HEDGE_STAGES = [
+        stage.strip() for stage in os.getenv("HEDGE_STAGES", "rubrics,critiques,jokes").split(",") if stage.strip()
+    ]
 
-# Pipeline Configuration
-DEFAULT_THEME = os.getenv("DEFAULT_THEME", "penguins")
-DEFAULT_NUM_IDEAS = int(os.getenv("DEFAULT_NUM_IDEAS", "3"))
-DEFAULT_RUBRICS_PER_IDEA = int(os.getenv("DEFAULT_RUBRICS_PER_IDEA", "2"))
-DEFAULT_CRITIQUES_PER_RUBRIC = int(os.getenv("DEFAULT_CRITIQUES_PER_RUBRIC", "1"))
-DEFAULT_OUTPUT_FILE = os.getenv("DEFAULT_OUTPUT_FILE", "results.json")
+    # Output caps per stage, sized to each stage's JSON schema. Baseline and
+    # judge caps are per joke (a baseline call returns several jokes, a
+    # batched judge call scores several); a judgment is an analysis of up to
+    # 150 words (about 200 tokens) plus six scores. MAX_TOKENS_<STAGE>=0
+    # removes a cap.
+    STAGE_MAX_TOKENS = {
+        stage: int(os.getenv(f"MAX_TOKENS_{stage.upper()}", default))
+        for stage, default in (
+            ("observations", 350), ("ideas", 700), ("rubrics", 300), ("critiques", 400),
+            ("jokes", 200), ("drafts", 200), ("refine", 250), ("baseline", 150), ("judge", 400),
+        )
+    }
+    # Stop sequences ("|"-separated in STOP_<STAGE>, at most four) cut off the
+    # commentary small models tend to append after their answer. JSON strings
+    # hold no raw blank lines, so a blank line followed by prose only occurs
+    # after the object, and "```\\n\\n" is a closing fence followed by
+    # commentary (utils.llm restores the fence it cuts). The judge answers
+    # with an analysis followed by six scores, so its list leaves out the
+    # dividers an unstructured answer may put between the two.
+    STAGE_STOP_SEQUENCES = {
+        stage: [seq.replace("\\n", "\n") for seq in os.getenv(f"STOP_{stage.upper()}", default).split("|") if seq]
+        for stage, default in (
+            ("observations", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\n---"),
+            ("ideas", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\n---"),
+            ("rubrics", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\n---"),
+            ("critiques", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\n---"),
+            ("jokes", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\nThis joke"),
+            ("drafts", "```\\n\\n|\\n\\nNote:|\\n\\nExplanation:|\\n\\nThis joke"),
+            ("refine", "```\\n\\n|\\n\\nNote:|\\n\\nChanges made:|\\n\\nThis joke"),
+            ("baseline", "```\\n\\n|\\n\\nNote:|\\n\\nThese jokes|\\n\\n---"),
+            ("judge", "```\\n\\n|\\n\\nNote:"),
+        )
+    }
+    # Per-stage model, endpoint and sampling routes (utils/routing.py); unset
+    # fields fall back to DEFAULT_MODEL/JUDGE_MODEL, the backend pool and
+    # each stage's own sampling settings
+    STAGE_ROUTES = {}
+    for stage in STAGE_MAX_TOKENS:
+        route = {
+            key: os.getenv(f"{key.upper()}_{stage.upper()}")
+            for key in ("model", "base_url", "temperature", "top_p")
+        }
+        route = {key: value for key, value in route.items() if value}
+        for key in ("temperature", "top_p"):
+            if key in route:
+                route[key] = float(route[key])
+        if route:
+            STAGE_ROUTES[stage] = route
+    # A response cut off at its cap is retried once with the cap scaled by this
+    TRUNCATION_RETRY_FACTOR = float(os.getenv("TRUNCATION_RETRY_FACTOR", "2"))
 
-# Baseline Configuration
-BASELINE_OUTPUT_FILE = os.getenv("BASELINE_OUTPUT_FILE", "baseline.json")
+    # Per-stage latency/token history used by the run planner
+    METRICS_HISTORY_FILE = os.getenv("METRICS_HISTORY_FILE", "stage_metrics.json")
+
+    # Stage outputs reused by incremental re-runs (main.py --incremental)
+    STAGE_CACHE_FILE = os.getenv("STAGE_CACHE_FILE", "stage_cache.json")
+    # Entries kept in the stage cache, least recently used evicted first (0 keeps all)
+    STAGE_CACHE_MAX_ENTRIES = int(os.getenv("STAGE_CACHE_MAX_ENTRIES", "5000"))
+
+    # SQLite full-text index of all generated jokes (joke_index.py)
+    JOKE_INDEX_FILE = os.getenv("JOKE_INDEX_FILE", "jokes.db")
+
+    # Record/replay of LLM traffic: CASSETTE_MODE is "record", "replay" or
+    # empty (off); replayed requests are matched by "hash" or in "order"
+    CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").strip().lower()
+    CASSETTE_FILE = os.getenv("CASSETTE_FILE", "cassette.jsonl.gz")
+    CASSETTE_MATCH = os.getenv("CASSETTE_MATCH", "hash")
+
+    # Adaptive (AIMD) in-flight limits for the generator pool and the judge
+    # endpoint; a round of calls slower than AIMD_LATENCY_TOLERANCE times the
+    # unloaded latency, or with backend errors, scales the limit down
+    ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "0").strip().lower() in ("1", "true", "yes", "on")
+    AIMD_INITIAL_LIMIT = int(os.getenv("AIMD_INITIAL_LIMIT", "2"))
+    AIMD_MIN_LIMIT = int(os.getenv("AIMD_MIN_LIMIT", "1"))
+    AIMD_GENERATOR_MAX_LIMIT = int(os.getenv("AIMD_GENERATOR_MAX_LIMIT", "16"))
+    AIMD_JUDGE_MAX_LIMIT = int(os.getenv("AIMD_JUDGE_MAX_LIMIT", "8"))
+    AIMD_DECREASE_FACTOR = float(os.getenv("AIMD_DECREASE_FACTOR", "0.5"))
+    AIMD_LATENCY_TOLERANCE = float(os.getenv("AIMD_LATENCY_TOLERANCE", "2.0"))
+
+    # Local pre-screen scorer fitted on past judgments (joke_prescreen.py)
+    PRESCREEN_MODEL_FILE = os.getenv("PRESCREEN_MODEL_FILE", "prescreen.json")
+
+    _SETTINGS_LOADED = True
+
+def __getattr__(name):
+    # PEP 562: resolve settings on first access instead of at import time
+    if name in __all__:
+        _load_settings()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def initialize_config():
     """
     Initialize and validate configuration.
     Returns True if valid, False otherwise.
     """
-    if not OPENAI_API_KEY:
+    _load_settings()
+    if not OPENAI_API_KEY and not _replaying():
         print("Warning: OPENAI_API_KEY environment variable not set.")
         print("Set it in your .env file or as an environment variable.")
         return False
-    
+
     print(f"Configuration loaded:")
     print(f"- API Base URL: {LLM_API_BASE_URL}")
+    if len(LLM_API_BASE_URLS) > 1:
+        print(f"- Generator backends ({BACKEND_ROUTING}): {', '.join(LLM_API_BASE_URLS)}")
     print(f"- Default model: {DEFAULT_MODEL}")
     print(f"- Judge model: {JUDGE_MODEL}")
     return True
 
 def get_api_base_url():
+    _load_settings()
     return LLM_API_BASE_URL
 
+def get_api_base_urls():
+    _load_settings()
+    return LLM_API_BASE_URLS
+
+def _replaying():
+    """True when LLM calls are served from a cassette (no key or network needed)."""
+    from utils.cassette import get_cassette
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == "replay"
+
 def get_openai_key():
-    return OPENAI_API_KEY
+    _load_settings()
+    return OPENAI_API_KEY or ("cassette-replay" if _replaying() else None)
 
 def get_openrouter_key():
+    _load_settings()
     return OPENROUTER_API_KEY
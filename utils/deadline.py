@@ -0,0 +1,69 @@
+"""
+Run deadlines for anytime runs (main.py --deadline).
+
+While a deadline is active, every LLM call in utils.llm is bounded by it:
+a call that would start after the deadline raises DeadlineExceeded without
+touching the network, and a call in flight when the deadline passes times
+out (closing its connection, which cancels generation on the server)
+instead of being retried. Stages check the deadline before starting new
+work, so a run ends promptly and keeps everything that completed.
+
+A run is split into phases (generation, baseline, judging); each phase's
+deadline leaves time for the phases after it, via Deadline.leaving().
+"""
+
+import contextlib
+import time
+
+
+class DeadlineExceeded(RuntimeError):
+    """An LLM call was not started, or was cut off, because the deadline passed."""
+
+
+class Deadline:
+    """
+    A point in time by which work must finish.
+
+    Args:
+        seconds: Time from now until the deadline
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + max(0.0, seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def leaving(self, seconds: float) -> "Deadline":
+        """A deadline for a phase that leaves seconds for later phases (but never more than half the time left)."""
+        remaining = self.remaining()
+        return Deadline(remaining - min(max(0.0, seconds), remaining / 2))
+
+
+_active = None
+
+
+def get_deadline():
+    """The deadline LLM calls are currently bounded by, or None."""
+    return _active
+
+
+def deadline_expired() -> bool:
+    """True if a deadline is active and has passed."""
+    return _active is not None and _active.expired()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Deadline):
+    """Bound all LLM calls made inside the block (from any thread) by deadline."""
+    global _active
+    previous = _active
+    _active = deadline
+    try:
+        yield deadline
+    finally:
+        _active = previous
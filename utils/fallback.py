@@ -0,0 +1,139 @@
+"""
+Typed fallback results and run-wide failure accounting.
+
+When an LLM call fails or returns unusable output, the stage modules used to
+return placeholder rubrics/jokes ("Fallback Observational", "Fallback joke
+about ...") that looked like real data. Downstream stages then spent LLM
+calls on them and the judge filtered them out later by substring.
+
+Placeholders are now Fallback instances: still dicts, so existing code that
+reads keys keeps working, but detectable with is_fallback(). Stages retry a
+failed call while the shared retry budget lasts and otherwise prune the
+placeholder, so no downstream call is ever spent on it. FALLBACKS keeps the
+counts for the run summary.
+"""
+
+import threading
+from collections import Counter
+
+
+class Fallback(dict):
+    """Placeholder result produced by a failed LLM call."""
+
+    def __init__(self, purpose: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.purpose = purpose
+
+    def __repr__(self):
+        return f"Fallback({self.purpose!r}, {dict.__repr__(self)})"
+
+
+def is_fallback(value) -> bool:
+    return isinstance(value, Fallback)
+
+
+class FallbackTracker:
+    """
+    Thread-safe counters for failed calls, retries, pruned items and
+    downstream calls skipped because their input was a placeholder.
+    """
+
+    def __init__(self, retry_budget: int = None):
+        self._lock = threading.Lock()
+        # Items pruned or calls skipped per thread, so a caller can tell its result came back short
+        self._local = threading.local()
+        self._initial_budget = retry_budget
+        self.reset(retry_budget)
+
+    def reset(self, retry_budget: int = None):
+        """Clear all counters; retry_budget=None reads FALLBACK_RETRY_BUDGET from configuration."""
+        with self._lock:
+            self._budget = retry_budget if retry_budget is not None else self._initial_budget
+            self.failed_calls = Counter()
+            self.retries = Counter()
+            self.pruned = Counter()
+            self.skipped_calls = Counter()
+
+    @property
+    def retry_budget(self) -> int:
+        if self._budget is None:
+            from utils.config import FALLBACK_RETRY_BUDGET
+            self._budget = FALLBACK_RETRY_BUDGET
+        return self._budget
+
+    def record_failure(self, stage: str):
+        with self._lock:
+            self.failed_calls[stage] += 1
+
+    def record_pruned(self, stage: str, count: int = 1):
+        with self._lock:
+            self.pruned[stage] += count
+        self._local.dropped = self.dropped_in_thread() + count
+
+    def record_skipped(self, stage: str, count: int = 1):
+        with self._lock:
+            self.skipped_calls[stage] += count
+        self._local.dropped = self.dropped_in_thread() + count
+
+    def dropped_in_thread(self) -> int:
+        """Items pruned plus calls skipped so far by the calling thread (never reset)."""
+        return getattr(self._local, "dropped", 0)
+
+    def acquire_retry(self, stage: str) -> bool:
+        """Consume one retry from the shared budget; False when it is exhausted."""
+        budget = self.retry_budget
+        with self._lock:
+            if budget <= 0:
+                return False
+            self._budget = budget - 1
+            self.retries[stage] += 1
+            return True
+
+    @property
+    def wasted_calls(self) -> int:
+        """LLM calls whose output was discarded as a placeholder."""
+        return sum(self.failed_calls.values())
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "wasted_calls": sum(self.failed_calls.values()),
+                "failed_calls": dict(self.failed_calls),
+                "retries": dict(self.retries),
+                "pruned": dict(self.pruned),
+                "skipped_calls": dict(self.skipped_calls),
+                "retry_budget_left": self._budget,
+            }
+
+
+FALLBACKS = FallbackTracker()
+
+
+def call_with_retry(fn, stage: str, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs), retrying while it returns a Fallback and the
+    shared retry budget allows (and no run deadline has passed, and the call
+    was not deferred to a batch request file). A Fallback returned once the
+    deadline has passed counts as a skipped call, not a wasted one.
+
+    Returns:
+        The first non-fallback result, or the last Fallback if retries ran out
+    """
+    from utils.batch import consume_deferral
+    from utils.deadline import deadline_expired
+    consume_deferral()
+    result = fn(*args, **kwargs)
+    while is_fallback(result):
+        if consume_deferral():
+            # The call went to a batch request file; a retry would only be deferred again
+            break
+        if deadline_expired():
+            # Skipped (or cut off) at the run deadline: no output was discarded
+            FALLBACKS.record_skipped(stage)
+            break
+        FALLBACKS.record_failure(stage)
+        if not FALLBACKS.acquire_retry(stage):
+            break
+        print(f"Retrying {stage} after fallback (retry budget left: {FALLBACKS.retry_budget})")
+        result = fn(*args, **kwargs)
+    return result
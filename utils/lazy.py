@@ -0,0 +1,49 @@
+"""
+Deferred imports for the CLI entry points.
+Heavy third-party modules are only imported the first time one of their
+attributes is actually used, so `--help` and skipped stages stay fast.
+"""
+
+import importlib
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name: str, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._on_load:
+                self._on_load(module)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+class LazyAttribute:
+    """Proxy for an attribute of a lazily imported module (e.g. colorama.Fore)."""
+
+    def __init__(self, module: LazyModule, attr: str):
+        self._module = module
+        self._attr = attr
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._module, self._attr), name)
+
+
+def lazy_import(name: str, on_load=None) -> LazyModule:
+    """
+    Return a proxy for module `name` that is imported on first use.
+
+    Args:
+        name: Fully qualified module name
+        on_load: Optional callback run once with the module after import
+    """
+    return LazyModule(name, on_load=on_load)
@@ -0,0 +1,644 @@
+"""
+Shared LLM client layer for the joke generation pipeline.
+
+Every stage used to build a fresh OpenAI client (and HTTP connection pool)
+per call. Clients are now cached per endpoint so repeated calls, and
+long-running processes such as joke_service.py, reuse warm connections.
+
+Generation calls are routed across a pool of identical model servers
+(LLM_API_BASE_URLS). The pool picks the backend with the fewest outstanding
+requests (or the best latency-weighted load), ejects a backend after
+repeated failures and re-admits it once a health check succeeds.
+
+Optionally, slow calls are hedged: once a call outlives a percentile of its
+stage's recent latencies (utils/metrics.py), a duplicate is sent, preferably
+to another backend, and the first valid answer wins.
+
+With adaptive concurrency on, every call first takes a slot from the
+generator or judge AIMD controller (utils/concurrency.py), whose in-flight
+limit follows the latency and error rate the backend shows under load.
+
+Under a run deadline (utils/deadline.py) calls are not started once it has
+passed, and calls in flight time out at it.
+
+A stage can be routed to its own model, endpoint and sampling settings
+(utils/routing.py); a routed endpoint replaces the backend pool for that
+stage's calls.
+
+During a batch run (utils/batch.py) calls are served from the run's stored
+batch responses, and calls without one are deferred to a batch request
+file instead of being sent.
+"""
+
+import queue
+import threading
+import time
+from utils.concurrency import get_controller
+from utils.deadline import DeadlineExceeded, deadline_expired, get_deadline
+from utils.routing import stage_route
+from utils.config import get_api_base_url, get_api_base_urls, get_openai_key
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(base_url: str = None, api_key: str = None, default_headers: dict = None):
+    """
+    Return a cached OpenAI client for the given endpoint, creating it on first use.
+
+    Args:
+        base_url: API base URL (default: LLM_API_BASE_URL from configuration)
+        api_key: API key (default: OPENAI_API_KEY from configuration)
+        default_headers: Extra headers sent with every request (e.g. for OpenRouter)
+
+    Returns:
+        An OpenAI client instance shared by all callers with the same settings
+    """
+    base_url = base_url or get_api_base_url()
+    api_key = api_key or get_openai_key()
+    cache_key = (base_url, api_key, tuple(sorted((default_headers or {}).items())))
+
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(base_url=base_url, api_key=api_key, default_headers=default_headers)
+            _clients[cache_key] = client
+    return client
+
+
+class Backend:
+    """Routing state for one generator endpoint."""
+
+    # Smoothing factor for the latency moving average
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._client = None
+
+    @property
+    def client(self):
+        """Cached client for this backend; retries are left to the pool's failover."""
+        if self._client is None:
+            self._client = get_client(self.url).with_options(max_retries=0)
+        return self._client
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def load_score(self, policy: str) -> float:
+        if policy == "latency":
+            # Expected wait: queue depth times observed latency (unknown latency ranks first)
+            return (self.outstanding + 1) * (self.ewma_latency or 0.0)
+        return self.outstanding
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class BackendPool:
+    """
+    Load balancer across generator endpoints.
+
+    Args:
+        urls: Base URLs of the model servers
+        policy: "least_outstanding" or "latency" (latency-weighted)
+        eject_after: Consecutive failures before a backend is ejected
+        eject_seconds: How long an ejected backend is skipped before a health check
+        health_interval: Seconds between background health checks (0 disables them)
+    """
+
+    def __init__(self, urls: list, policy: str = "least_outstanding", eject_after: int = 3,
+                 eject_seconds: float = 30.0, health_interval: float = 10.0):
+        self.backends = [Backend(url) for url in urls]
+        self.policy = policy
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._health_thread = None
+        if len(self.backends) > 1 and health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="backend-health", daemon=True)
+            self._health_thread.start()
+
+    def acquire(self, exclude=()) -> Backend:
+        """Pick a backend for the next request and count it as outstanding."""
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude] or list(self.backends)
+            healthy = [b for b in candidates if b.healthy]
+            if healthy:
+                # Ties go to the backend with the best latency, then pool order
+                backend = min(healthy, key=lambda b: (b.load_score(self.policy), b.ewma_latency or 0.0))
+            else:
+                # Fail open: everything is ejected, use the one that recovers soonest
+                backend = min(candidates, key=lambda b: b.ejected_until)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, latency: float, ok: bool):
+        """Record the outcome of a request started with acquire(); latency=None for cancelled requests."""
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.consecutive_failures = 0
+                if latency is None:
+                    pass
+                elif backend.ewma_latency is None:
+                    backend.ewma_latency = latency
+                else:
+                    backend.ewma_latency += Backend.EWMA_ALPHA * (latency - backend.ewma_latency)
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if (backend.consecutive_failures >= self.eject_after and len(self.backends) > 1
+                        and backend.healthy):
+                    backend.ejected_until = time.monotonic() + self.eject_seconds
+                    print(f"Ejecting backend {backend.url} after {backend.consecutive_failures} consecutive failures")
+
+    def check_health(self, backend: Backend) -> bool:
+        """Probe a backend's /models endpoint and update its ejection state."""
+        try:
+            client = get_client(backend.url).with_options(timeout=5.0, max_retries=0)
+            client.models.list()
+            ok = True
+        except Exception:
+            ok = False
+        with self._lock:
+            if ok:
+                if not backend.healthy:
+                    print(f"Backend {backend.url} passed health check; re-admitting")
+                backend.ejected_until = 0.0
+                backend.consecutive_failures = 0
+            else:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+        return ok
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            for backend in self.backends:
+                # Probe ejected backends whose cooldown has passed, and idle ones
+                if backend.consecutive_failures or backend.outstanding == 0:
+                    self.check_health(backend)
+
+    def stats(self) -> list:
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_backend_pool() -> BackendPool:
+    """Return the process-wide generator backend pool built from configuration."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from utils.config import (
+                BACKEND_ROUTING, BACKEND_EJECT_AFTER, BACKEND_EJECT_SECONDS, BACKEND_HEALTH_INTERVAL
+            )
+            _pool = BackendPool(
+                get_api_base_urls(),
+                policy=BACKEND_ROUTING,
+                eject_after=BACKEND_EJECT_AFTER,
+                eject_seconds=BACKEND_EJECT_SECONDS,
+                health_interval=BACKEND_HEALTH_INTERVAL
+            )
+    return _pool
+
+def _is_backend_error(error: Exception) -> bool:
+    """True for errors that indicate the server (not the request) is at fault."""
+    from openai import APIConnectionError, APITimeoutError, InternalServerError
+    if deadline_expired():
+        # Cut off by the run deadline, not by the server
+        return False
+    return isinstance(error, (APIConnectionError, APITimeoutError, InternalServerError))
+
+def _bounded(client):
+    """The client, with requests timing out at the active run deadline and not retried past it."""
+    deadline = get_deadline()
+    if deadline is None:
+        return client
+    return client.with_options(timeout=max(0.01, deadline.remaining()), max_retries=0)
+
+
+_hedging = None
+
+def configure_hedging(percentile: float = None, min_samples: int = None, stages: list = None):
+    """
+    Override the hedging settings from configuration (HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES, HEDGE_STAGES) for this process.
+
+    Args:
+        percentile: Stage latency percentile after which a duplicate request is sent (0 disables)
+        min_samples: Successful calls a stage needs before it is hedged
+        stages: Stages eligible for hedging
+    """
+    settings = _hedging_settings()
+    if percentile is not None:
+        settings["percentile"] = percentile
+    if min_samples is not None:
+        settings["min_samples"] = min_samples
+    if stages is not None:
+        settings["stages"] = set(stages)
+
+def _hedging_settings() -> dict:
+    global _hedging
+    if _hedging is None:
+        from utils.config import HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_STAGES
+        _hedging = {"percentile": HEDGE_PERCENTILE, "min_samples": HEDGE_MIN_SAMPLES,
+                    "stages": set(HEDGE_STAGES)}
+    return _hedging
+
+def _hedge_delay(stage: str):
+    """Seconds to wait before hedging a call of this stage, or None to not hedge."""
+    settings = _hedging_settings()
+    if not settings["percentile"] or stage not in settings["stages"]:
+        return None
+    from utils.metrics import METRICS
+    if METRICS.samples(stage) < settings["min_samples"]:
+        return None
+    return METRICS.percentile(stage, settings["percentile"])
+
+
+def _pooled_completion(pool: BackendPool, **create_kwargs):
+    """Run one completion on the pool, failing over once on a backend error."""
+    attempts = min(2, len(pool.backends))
+    tried = []
+    for attempt in range(attempts):
+        backend = pool.acquire(exclude=tried)
+        tried.append(backend)
+        start = time.monotonic()
+        try:
+            pool_client = backend.client if len(pool.backends) > 1 else get_client(backend.url)
+            response = _bounded(pool_client).chat.completions.create(**create_kwargs)
+        except Exception as e:
+            backend_fault = _is_backend_error(e)
+            pool.release(backend, time.monotonic() - start, ok=not backend_fault)
+            if backend_fault and attempt + 1 < attempts:
+                print(f"Backend {backend.url} failed ({type(e).__name__}); failing over")
+                continue
+            raise
+        pool.release(backend, time.monotonic() - start, ok=True)
+        return response
+
+def _hedged_completion(pool: BackendPool, stage: str, hedge_after: float, validate, **create_kwargs) -> tuple:
+    """
+    Run a completion that is duplicated if it has not finished after
+    hedge_after seconds. Both attempts stream so the loser can be cancelled
+    by closing its connection; the first attempt with a valid result wins.
+
+    Returns:
+        (content, finish_reason, usage) where usage is None unless the server streams it
+    """
+    from utils.metrics import METRICS
+
+    outcomes = queue.Queue()
+    finished = threading.Event()
+    backends, streams = {}, {}
+
+    def attempt(index: int, exclude: tuple):
+        backend = pool.acquire(exclude=exclude)
+        backends[index] = backend
+        start = time.monotonic()
+        parts, finish_reason, usage = [], None, None
+        try:
+            stream = _bounded(backend.client).chat.completions.create(stream=True, **create_kwargs)
+            streams[index] = stream
+            try:
+                for chunk in stream:
+                    if finished.is_set():
+                        break
+                    if chunk.choices:
+                        if chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    usage = getattr(chunk, "usage", None) or usage
+            finally:
+                stream.close()
+        except Exception as e:
+            if finished.is_set():
+                # Cancelled by the other attempt closing our stream
+                pool.release(backend, None, ok=True)
+            else:
+                pool.release(backend, time.monotonic() - start, ok=not _is_backend_error(e))
+                outcomes.put((index, None, e))
+            return
+        if finished.is_set():
+            pool.release(backend, None, ok=True)
+            return
+        pool.release(backend, time.monotonic() - start, ok=True)
+        outcomes.put((index, ("".join(parts), finish_reason, usage), None))
+
+    threading.Thread(target=attempt, args=(0, ()), daemon=True).start()
+    try:
+        _, completion, error = outcomes.get(timeout=hedge_after)
+    except queue.Empty:
+        pass
+    else:
+        if error is None:
+            return completion
+        primary = backends.get(0)
+        if not _is_backend_error(error) or len(pool.backends) < 2:
+            raise error
+        # The original failed before the hedge delay: fail over once, like _pooled_completion
+        print(f"Backend {primary.url} failed ({type(error).__name__}); failing over")
+        threading.Thread(target=attempt, args=(1, (primary,)), daemon=True).start()
+        _, completion, error = outcomes.get()
+        if error is not None:
+            raise error
+        return completion
+
+    # The original is slower than the stage's usual tail: race a duplicate
+    primary = backends.get(0)
+    threading.Thread(target=attempt, args=(1, (primary,) if primary else ()), daemon=True).start()
+    result = None
+    for _ in range(2):
+        index, completion, error = outcomes.get()
+        if error is None and validate(completion[0]):
+            finished.set()
+            stream = streams.get(1 - index)
+            if stream is not None:
+                stream.close()
+            METRICS.record_hedge(stage, won=index == 1)
+            return completion
+        if result is None or error is None:
+            result = (completion, error)
+    finished.set()
+    METRICS.record_hedge(stage, won=False)
+    completion, error = result
+    if error is not None:
+        raise error
+    return completion
+
+def _non_empty(content: str) -> bool:
+    return bool(content and content.strip())
+
+def _close_fence(content: str, stop) -> str:
+    """Restore the closing code fence of an answer cut off by a stop sequence starting with one."""
+    if content and any(seq.startswith("```") for seq in stop or ()) and content.count("```") % 2:
+        return content.rstrip() + "\n```"
+    return content
+
+def stage_output_limits(stage: str, items: int = 1) -> dict:
+    """
+    Default max_tokens/stop arguments for a stage from configuration.
+
+    Args:
+        stage: Pipeline stage
+        items: Jokes produced or judged by the call (baseline and batched judge caps are per joke)
+
+    Returns:
+        Keyword arguments for chat.completions.create (empty if the stage has no limits)
+    """
+    from utils.config import STAGE_MAX_TOKENS, STAGE_STOP_SEQUENCES
+    limits = {}
+    max_tokens = STAGE_MAX_TOKENS.get(stage, 0)
+    if max_tokens > 0:
+        limits["max_tokens"] = max_tokens * max(1, items) + (100 if items > 1 else 0)
+    if STAGE_STOP_SEQUENCES.get(stage):
+        limits["stop"] = STAGE_STOP_SEQUENCES[stage]
+    return limits
+
+def _apply_route(stage: str, client, create_kwargs: dict):
+    """
+    Apply the stage's route to a request in place.
+
+    Routed sampling settings always apply; the routed model and endpoint
+    only replace the defaults of calls without an explicit client.
+
+    Returns:
+        The client to send the request with (None for the backend pool)
+    """
+    route = stage_route(stage)
+    for key in ("temperature", "top_p"):
+        if key in route:
+            create_kwargs[key] = route[key]
+    if client is None:
+        if "model" in route:
+            create_kwargs["model"] = route["model"]
+        if "base_url" in route:
+            client = get_client(route["base_url"])
+    return client
+
+def chat_completion(messages: list, model: str, temperature: float = 0.7, stage: str = None,
+                    client=None, validate=None, **kwargs) -> str:
+    """
+    Run a chat completion and return the raw message content.
+
+    Without an explicit client the call is routed through the generator
+    backend pool; if the chosen backend fails with a connection, timeout or
+    5xx error the call fails over once to another backend. When hedging is
+    enabled for the stage and the call outlives the stage's latency
+    percentile, a duplicate request is raced against it.
+
+    Unless the caller passes them, max_tokens and stop come from the stage's
+    configured output limits. A response cut off at max_tokens is retried
+    once with the cap raised by TRUNCATION_RETRY_FACTOR. The stage's route,
+    if any, overrides model, endpoint and sampling settings (see _apply_route).
+
+    Args:
+        messages: Chat messages to send
+        model: Model name
+        temperature: Sampling temperature
+        stage: Pipeline stage making the call (observations, ideas, rubrics,
+               critiques, jokes, baseline, judge)
+        client: Client to use, bypassing the backend pool (e.g. the judge endpoint)
+        validate: Predicate deciding whether a hedged attempt's content is
+                  usable (default: non-empty)
+        **kwargs: Extra arguments passed through to chat.completions.create
+
+    Returns:
+        The content of the first choice
+    """
+    from utils.metrics import METRICS
+
+    create_kwargs = dict(model=model, messages=messages, temperature=temperature,
+                         **{**stage_output_limits(stage), **kwargs})
+    client = _apply_route(stage, client, create_kwargs)
+    content, finish_reason = _recorded_completion(stage, client, validate, create_kwargs)
+    max_tokens = create_kwargs.get("max_tokens")
+    if finish_reason == "length" and max_tokens:
+        from utils.config import TRUNCATION_RETRY_FACTOR
+        METRICS.record_truncation(stage)
+        create_kwargs["max_tokens"] = int(max_tokens * TRUNCATION_RETRY_FACTOR)
+        print(f"Response for {stage or 'call'} truncated at {max_tokens} tokens; "
+              f"retrying once with max_tokens={create_kwargs['max_tokens']}")
+        content, finish_reason = _recorded_completion(stage, client, validate, create_kwargs)
+    return _close_fence(content, create_kwargs.get("stop"))
+
+def send_request(create_kwargs: dict, stage: str = None, client=None) -> tuple:
+    """
+    Send a fully prepared chat.completions.create request as-is, e.g. one
+    line of a batch request file; no route or output limits are applied.
+
+    Returns:
+        (content, finish_reason)
+    """
+    return _recorded_completion(stage, client, None, dict(create_kwargs))
+
+def _recorded_completion(stage: str, client, validate, create_kwargs: dict) -> tuple:
+    """Run one completion and record its latency and token usage; returns (content, finish_reason)."""
+    from utils.batch import get_batch
+    from utils.cassette import get_cassette
+    from utils.metrics import METRICS
+    from utils.profiling import span
+
+    if deadline_expired():
+        raise DeadlineExceeded(f"Run deadline passed before the {stage or 'call'} request")
+    batch = get_batch()
+    if batch is not None:
+        entry = batch.resolve(stage, create_kwargs)
+        METRICS.record(stage, 0.0, prompt_tokens=entry.get("prompt_tokens"),
+                       completion_tokens=entry.get("completion_tokens"))
+        return entry["content"], entry["finish_reason"]
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        entry = cassette.replay(stage, create_kwargs)
+        METRICS.record(stage, entry["latency"], prompt_tokens=entry.get("prompt_tokens"),
+                       completion_tokens=entry.get("completion_tokens"))
+        return entry["content"], entry["finish_reason"]
+
+    # The judge endpoint and the generator stages have separate limits
+    controller = get_controller("judge" if stage == "judge" else "generator")
+    if controller is not None:
+        ticket = controller.acquire()
+    start = time.monotonic()
+    try:
+        with span(f"{stage or 'call'} request", "llm", stage=stage, model=create_kwargs.get("model")) as info:
+            if client is not None:
+                response = _bounded(client).chat.completions.create(**create_kwargs)
+                choice = response.choices[0]
+                content, finish_reason, usage = choice.message.content, choice.finish_reason, response.usage
+            else:
+                pool = get_backend_pool()
+                hedge_after = _hedge_delay(stage)
+                if hedge_after is not None:
+                    content, finish_reason, usage = _hedged_completion(
+                        pool, stage, hedge_after, validate or _non_empty, **create_kwargs
+                    )
+                else:
+                    response = _pooled_completion(pool, **create_kwargs)
+                    choice = response.choices[0]
+                    content, finish_reason, usage = choice.message.content, choice.finish_reason, response.usage
+            info.update(finish_reason=finish_reason,
+                        completion_tokens=getattr(usage, "completion_tokens", None))
+    except Exception as e:
+        if controller is not None:
+            controller.release(ticket, stage, None, ok=not _is_backend_error(e))
+        METRICS.record(stage, time.monotonic() - start, ok=False)
+        if deadline_expired():
+            raise DeadlineExceeded(f"Run deadline passed during the {stage or 'call'} request") from e
+        raise
+    latency = time.monotonic() - start
+    if controller is not None:
+        controller.release(ticket, stage, latency, ok=True)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    METRICS.record(stage, latency, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    if cassette is not None:
+        cassette.record(stage, create_kwargs, content, finish_reason, latency, prompt_tokens, completion_tokens)
+    return content, finish_reason
+
+def stream_chat_completion(messages: list, model: str, temperature: float = 0.7, stage: str = None,
+                           on_delta=None, should_stop=None, **kwargs) -> str:
+    """
+    Stream a chat completion through the backend pool (or the stage's routed endpoint).
+
+    Args:
+        messages: Chat messages to send
+        model: Model name
+        temperature: Sampling temperature
+        stage: Pipeline stage making the call
+        on_delta: Called with each content fragment as it arrives
+        should_stop: Polled between fragments; returning True closes the
+                     stream (cancelling generation on the server)
+        **kwargs: Extra arguments passed through to chat.completions.create
+
+    Returns:
+        The content received (partial if stopped early)
+    """
+    from utils.batch import get_batch
+    from utils.cassette import get_cassette
+    from utils.metrics import METRICS
+    from utils.profiling import span
+
+    create_kwargs = dict(model=model, messages=messages, temperature=temperature,
+                         **{**stage_output_limits(stage), **kwargs})
+    routed_client = _apply_route(stage, None, create_kwargs)
+    if deadline_expired():
+        raise DeadlineExceeded(f"Run deadline passed before the {stage or 'call'} stream")
+    batch = get_batch()
+    if batch is not None:
+        entry = batch.resolve(stage, create_kwargs)
+        METRICS.record(stage, 0.0)
+        if on_delta is not None and entry["content"]:
+            on_delta(entry["content"])
+        return _close_fence(entry["content"], create_kwargs.get("stop"))
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        entry = cassette.replay(stage, create_kwargs)
+        METRICS.record(stage, entry["latency"])
+        if on_delta is not None and entry["content"]:
+            on_delta(entry["content"])
+        return _close_fence(entry["content"], create_kwargs.get("stop"))
+
+    controller = get_controller("generator")
+    if controller is not None:
+        ticket = controller.acquire()
+    pool = get_backend_pool()
+    backend = pool.acquire() if routed_client is None else None
+    start = time.monotonic()
+    parts = []
+    stopped = False
+    try:
+        with span(f"{stage or 'call'} stream", "llm", stage=stage, model=create_kwargs["model"]):
+            stream_client = backend.client if backend is not None else routed_client
+            stream = _bounded(stream_client).chat.completions.create(stream=True, **create_kwargs)
+            try:
+                for chunk in stream:
+                    if should_stop is not None and should_stop():
+                        stopped = True
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        if on_delta is not None:
+                            on_delta(chunk.choices[0].delta.content)
+            finally:
+                stream.close()
+    except Exception as e:
+        if backend is not None:
+            pool.release(backend, time.monotonic() - start, ok=not _is_backend_error(e))
+        if controller is not None:
+            controller.release(ticket, stage, None, ok=not _is_backend_error(e))
+        METRICS.record(stage, time.monotonic() - start, ok=False)
+        if deadline_expired():
+            raise DeadlineExceeded(f"Run deadline passed during the {stage or 'call'} stream") from e
+        raise
+    latency = time.monotonic() - start
+    if backend is not None:
+        pool.release(backend, latency, ok=True)
+    if controller is not None:
+        # A stream cancelled early says nothing about how loaded the server is
+        controller.release(ticket, stage, None if stopped else latency, ok=True)
+    METRICS.record(stage, latency)
+    content = "".join(parts)
+    if cassette is not None and not stopped:
+        # Cancelled streams are partial and not worth replaying
+        cassette.record(stage, create_kwargs, content, "stop", latency)
+    return _close_fence(content, create_kwargs.get("stop"))
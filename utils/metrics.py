@@ -0,0 +1,130 @@
+"""
+Per-stage call metrics for the joke generation pipeline.
+
+chat_completion records the latency (and token usage, when the server
+reports it) of every call under its pipeline stage. The recent window of
+latencies drives request hedging; the counters feed the run summary.
+"""
+
+import math
+import threading
+from collections import defaultdict, deque
+
+
+class StageMetrics:
+    """
+    Thread-safe sliding window of call latencies and token counts per stage.
+
+    Args:
+        window: Number of recent calls kept per stage for percentiles
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latencies = defaultdict(lambda: deque(maxlen=self.window))
+            self.calls = defaultdict(int)
+            self.latency_total = defaultdict(float)
+            self.token_calls = defaultdict(int)
+            self.errors = defaultdict(int)
+            self.prompt_tokens = defaultdict(int)
+            self.completion_tokens = defaultdict(int)
+            self.hedges = defaultdict(int)
+            self.hedge_wins = defaultdict(int)
+            self.truncations = defaultdict(int)
+
+    def record(self, stage: str, latency: float, ok: bool = True,
+               prompt_tokens: int = None, completion_tokens: int = None):
+        """Record one finished call."""
+        stage = stage or "unknown"
+        with self._lock:
+            self.calls[stage] += 1
+            if ok:
+                self._latencies[stage].append(latency)
+                self.latency_total[stage] += latency
+            else:
+                self.errors[stage] += 1
+            if prompt_tokens or completion_tokens:
+                self.token_calls[stage] += 1
+                self.prompt_tokens[stage] += prompt_tokens or 0
+                self.completion_tokens[stage] += completion_tokens or 0
+
+    def record_hedge(self, stage: str, won: bool):
+        """Record a duplicate request and whether it beat the original."""
+        stage = stage or "unknown"
+        with self._lock:
+            self.hedges[stage] += 1
+            if won:
+                self.hedge_wins[stage] += 1
+
+    def record_truncation(self, stage: str):
+        """Record a response cut off at its max_tokens cap."""
+        with self._lock:
+            self.truncations[stage or "unknown"] += 1
+
+    def samples(self, stage: str) -> int:
+        with self._lock:
+            return len(self._latencies.get(stage, ()))
+
+    def percentile(self, stage: str, q: float):
+        """
+        Latency percentile over the recent window.
+
+        Args:
+            stage: Pipeline stage
+            q: Percentile in [0, 100]
+
+        Returns:
+            Latency in seconds, or None if the stage has no successful calls yet
+        """
+        with self._lock:
+            values = sorted(self._latencies.get(stage, ()))
+        if not values:
+            return None
+        # Nearest-rank percentile
+        rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+        return values[rank]
+
+    def totals(self) -> dict:
+        """Raw per-stage sums, as merged into the planner's history file."""
+        with self._lock:
+            return {
+                stage: {
+                    "calls": self.calls[stage] - self.errors[stage],
+                    "latency_sum": self.latency_total[stage],
+                    "token_calls": self.token_calls[stage],
+                    "prompt_tokens": self.prompt_tokens[stage],
+                    "completion_tokens": self.completion_tokens[stage],
+                }
+                for stage in self.calls
+            }
+
+    def summary(self) -> dict:
+        """Per-stage calls, errors, tokens, hedges, truncations and p50/p95/p99 latency."""
+        with self._lock:
+            stages = sorted(set(self.calls) | set(self.hedges))
+        result = {}
+        for stage in stages:
+            entry = {
+                "calls": self.calls[stage],
+                "errors": self.errors[stage],
+                "prompt_tokens": self.prompt_tokens[stage],
+                "completion_tokens": self.completion_tokens[stage],
+            }
+            for q in (50, 95, 99):
+                value = self.percentile(stage, q)
+                entry[f"p{q}"] = round(value, 3) if value is not None else None
+            if self.hedges[stage]:
+                entry["hedges"] = self.hedges[stage]
+                entry["hedge_wins"] = self.hedge_wins[stage]
+            if self.truncations[stage]:
+                entry["truncations"] = self.truncations[stage]
+            result[stage] = entry
+        return result
+
+
+METRICS = StageMetrics()
@@ -0,0 +1,299 @@
+"""
+Run planner: estimate LLM calls, tokens and wall time for a pipeline config.
+
+Estimates come from historical per-stage metrics (average latency and
+prompt/completion tokens per call) that main.py merges into
+METRICS_HISTORY_FILE after every run, falling back to rough defaults for
+stages that have never run. Given a budget in tokens or seconds, the planner
+searches the --ideas/--rubrics/--critiques space for the fan-out that yields
+the most jokes within it.
+"""
+
+import json
+import math
+import re
+from pathlib import Path
+
+# Fan-out limits (previously hard-coded clamps in main.py)
+MAX_IDEAS = 10
+MAX_RUBRICS_PER_IDEA = 5
+MAX_CRITIQUES_PER_RUBRIC = 3
+
+# Per-call estimates used until a stage has history:
+# (seconds, prompt tokens, completion tokens)
+DEFAULT_STAGE_ESTIMATES = {
+    "observations": (4.0, 150, 150),
+    "ideas": (6.0, 400, 400),
+    "rubrics": (3.0, 250, 120),
+    "critiques": (4.0, 350, 150),
+    "jokes": (3.0, 300, 100),
+    "drafts": (2.0, 300, 80),
+    "refine": (3.0, 450, 100),
+    "baseline": (10.0, 300, 600),
+    "judge": (5.0, 400, 200),
+}
+
+# History is rescaled once a stage exceeds this many calls, so recent runs
+# (new models, new hardware) dominate the averages
+MAX_HISTORY_CALLS = 500
+
+
+def load_history(path: str = None) -> dict:
+    """Load per-stage sums from the history file ({} if it does not exist)."""
+    if path is None:
+        from utils.config import METRICS_HISTORY_FILE
+        path = METRICS_HISTORY_FILE
+    try:
+        with open(path) as f:
+            return json.load(f).get("stages", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_history(totals: dict, path: str = None) -> dict:
+    """
+    Merge one run's per-stage sums (StageMetrics.totals()) into the history file.
+
+    Returns:
+        The merged per-stage history
+    """
+    if path is None:
+        from utils.config import METRICS_HISTORY_FILE
+        path = METRICS_HISTORY_FILE
+    history = load_history(path)
+    for stage, run in totals.items():
+        merged = history.setdefault(stage, {key: 0 for key in run})
+        for key, value in run.items():
+            merged[key] = merged.get(key, 0) + value
+        if merged.get("calls", 0) > MAX_HISTORY_CALLS:
+            scale = MAX_HISTORY_CALLS / merged["calls"]
+            for key in merged:
+                merged[key] *= scale
+    try:
+        Path(path).write_text(json.dumps({"stages": history}, indent=2))
+    except OSError as e:
+        print(f"Warning: could not save stage metrics history to {path}: {e}")
+    return history
+
+
+def stage_estimates(history: dict = None) -> dict:
+    """
+    Per-call estimates for every stage.
+
+    Returns:
+        {stage: {"seconds", "prompt_tokens", "completion_tokens", "source"}}
+    """
+    history = history or {}
+    estimates = {}
+    for stage, (seconds, prompt_tokens, completion_tokens) in DEFAULT_STAGE_ESTIMATES.items():
+        estimate = {"seconds": seconds, "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens, "source": "default"}
+        past = history.get(stage, {})
+        if past.get("calls", 0) >= 1:
+            estimate["seconds"] = past["latency_sum"] / past["calls"]
+            estimate["source"] = "history"
+        if past.get("token_calls", 0) >= 1:
+            estimate["prompt_tokens"] = past["prompt_tokens"] / past["token_calls"]
+            estimate["completion_tokens"] = past["completion_tokens"] / past["token_calls"]
+        estimates[stage] = estimate
+    return estimates
+
+
+def _baseline_chunking() -> tuple:
+    from utils.config import BASELINE_CHUNK_SIZE, BASELINE_MAX_PARALLEL
+    return max(1, BASELINE_CHUNK_SIZE), max(1, BASELINE_MAX_PARALLEL)
+
+
+def refined_jokes_for(drafts: int, cascade_keep: float) -> int:
+    """Drafts the cascade refines: the cascade_keep fraction (at least one), as PrescreenScorer.screen keeps."""
+    return max(1, math.ceil(cascade_keep * drafts)) if drafts else 0
+
+
+def count_calls(num_ideas: int, rubrics_per_idea: int, critiques_per_rubric: int,
+                baseline_jokes: int = 0, judge_jokes: int = 0, cascade_keep: float = None) -> dict:
+    """
+    LLM calls per stage for a configuration (assuming no retries or pruning).
+
+    With cascade_keep set, Stage 5 writes drafts and the kept fraction is
+    refined (an upper bound: duds are discarded before the fraction is taken).
+    """
+    rubrics = num_ideas * rubrics_per_idea
+    jokes = rubrics * (1 + critiques_per_rubric)
+    calls = {
+        "observations": 2,
+        "ideas": 1,
+        "rubrics": rubrics,
+        "critiques": rubrics * critiques_per_rubric,
+    }
+    if cascade_keep is not None:
+        calls["drafts"] = jokes
+        calls["refine"] = refined_jokes_for(jokes, cascade_keep)
+    else:
+        calls["jokes"] = jokes
+    if baseline_jokes:
+        # One request per chunk of BASELINE_CHUNK_SIZE jokes
+        calls["baseline"] = math.ceil(baseline_jokes / _baseline_chunking()[0])
+    if judge_jokes:
+        calls["judge"] = judge_jokes
+    return calls
+
+
+def estimate_run(num_ideas: int, rubrics_per_idea: int, critiques_per_rubric: int,
+                 concurrency: int = 1, baseline_jokes: int = 0, judge_jokes: int = 0,
+                 estimates: dict = None, cascade_keep: float = None) -> dict:
+    """
+    Estimate calls, tokens and wall time for a pipeline configuration.
+
+    Stages 1-2 run serially; Stages 3-5 run one idea per worker, so ideas are
+    processed in ceil(num_ideas / concurrency) waves. In cascade mode Stage 5
+    writes drafts, and the refine calls run afterwards in waves of
+    concurrency. Baseline chunks run in
+    waves of BASELINE_MAX_PARALLEL requests; baseline generation and judging
+    run after generation.
+
+    Args:
+        num_ideas: Joke ideas to develop
+        rubrics_per_idea: Rubrics per idea
+        critiques_per_rubric: Critiques per rubric
+        concurrency: Ideas processed in parallel
+        baseline_jokes: Baseline jokes to generate (0 to skip)
+        judge_jokes: Jokes to judge (0 to skip)
+        estimates: Per-stage estimates from stage_estimates() (default: from history)
+        cascade_keep: Fraction of drafts the cascade refines (None without --cascade)
+
+    Returns:
+        Dictionary with calls, prompt/completion/total tokens, seconds (in total
+        and per phase: generation, baseline, judge) and jokes
+    """
+    if estimates is None:
+        estimates = stage_estimates(load_history())
+    calls = count_calls(num_ideas, rubrics_per_idea, critiques_per_rubric, baseline_jokes, judge_jokes,
+                        cascade_keep)
+    joke_stage = "drafts" if cascade_keep is not None else "jokes"
+
+    prompt_tokens = sum(n * estimates[stage]["prompt_tokens"] for stage, n in calls.items())
+    completion_tokens = sum(n * estimates[stage]["completion_tokens"] for stage, n in calls.items())
+
+    def stage_seconds(stage, n=None):
+        return (calls[stage] if n is None else n) * estimates[stage]["seconds"]
+
+    per_idea = (stage_seconds("rubrics", rubrics_per_idea)
+                + stage_seconds("critiques", rubrics_per_idea * critiques_per_rubric)
+                + stage_seconds(joke_stage, rubrics_per_idea * (1 + critiques_per_rubric)))
+    phase_seconds = {"generation": (stage_seconds("observations") + stage_seconds("ideas")
+                                    + math.ceil(num_ideas / max(1, concurrency)) * per_idea)}
+    if "refine" in calls:
+        phase_seconds["generation"] += math.ceil(calls["refine"] / max(1, concurrency)) * estimates["refine"]["seconds"]
+    if "baseline" in calls:
+        phase_seconds["baseline"] = math.ceil(calls["baseline"] / _baseline_chunking()[1]) * estimates["baseline"]["seconds"]
+    if "judge" in calls:
+        phase_seconds["judge"] = stage_seconds("judge")
+    seconds = sum(phase_seconds.values())
+
+    return {
+        "config": {"ideas": num_ideas, "rubrics": rubrics_per_idea,
+                   "critiques": critiques_per_rubric, "concurrency": concurrency,
+                   **({"cascade_keep": cascade_keep} if cascade_keep is not None else {})},
+        "calls": calls,
+        "total_calls": sum(calls.values()),
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens),
+        "total_tokens": int(prompt_tokens + completion_tokens),
+        "seconds": round(seconds, 1),
+        "phase_seconds": {phase: round(value, 1) for phase, value in phase_seconds.items()},
+        "jokes": calls["refine"] if "refine" in calls else calls["jokes"],
+    }
+
+
+def parse_budget(text: str) -> tuple:
+    """
+    Parse a budget such as "50000", "50k", "120k tokens", "300s", "10m" or "1.5h".
+
+    Returns:
+        ("tokens", amount) or ("seconds", amount)
+
+    Raises:
+        ValueError: If the budget cannot be parsed
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z ]*)", text or "")
+    if not match:
+        raise ValueError(f"Invalid budget: {text!r}")
+    amount, unit = float(match.group(1)), match.group(2).replace(" ", "").lower()
+    if unit in ("s", "sec", "secs", "seconds"):
+        return "seconds", amount
+    if unit in ("m", "min", "mins", "minutes"):
+        return "seconds", amount * 60
+    if unit in ("h", "hr", "hours"):
+        return "seconds", amount * 3600
+    if unit in ("", "t", "tok", "tokens"):
+        return "tokens", amount
+    if unit in ("k", "ktok", "ktokens"):
+        return "tokens", amount * 1000
+    raise ValueError(f"Unknown budget unit {unit!r} in {text!r}")
+
+
+def plan_for_budget(kind: str, amount: float, concurrency: int = 1, with_baseline: bool = False,
+                    with_judge: bool = False, judge_jokes_for=None, estimates: dict = None,
+                    cascade_keep: float = None):
+    """
+    Choose the fan-out that maximizes joke count within a budget.
+
+    Args:
+        kind: "tokens" or "seconds"
+        amount: Budget in that unit
+        concurrency: Ideas processed in parallel
+        with_baseline: Include baseline generation in the estimate
+        with_judge: Include judging in the estimate
+        judge_jokes_for: Function (multistage_jokes, baseline_jokes) -> jokes judged
+        estimates: Per-stage estimates (default: from history)
+        cascade_keep: Fraction of drafts the cascade refines (None without --cascade)
+
+    Returns:
+        The best estimate_run() result, or None if even the smallest run exceeds the budget
+    """
+    if estimates is None:
+        estimates = stage_estimates(load_history())
+    metric = "total_tokens" if kind == "tokens" else "seconds"
+
+    best = None
+    for ideas in range(1, MAX_IDEAS + 1):
+        for rubrics in range(1, MAX_RUBRICS_PER_IDEA + 1):
+            for critiques in range(0, MAX_CRITIQUES_PER_RUBRIC + 1):
+                jokes = ideas * rubrics * (1 + critiques)
+                if cascade_keep is not None:
+                    jokes = refined_jokes_for(jokes, cascade_keep)
+                baseline = baseline_jokes_for(ideas, rubrics, critiques) if with_baseline else 0
+                judged = judge_jokes_for(jokes, baseline) if with_judge and judge_jokes_for else 0
+                plan = estimate_run(ideas, rubrics, critiques, concurrency, baseline, judged, estimates,
+                                    cascade_keep)
+                if plan[metric] > amount:
+                    continue
+                # Most jokes first, then the cheaper plan
+                if best is None or (plan["jokes"], -plan[metric]) > (best["jokes"], -best[metric]):
+                    best = plan
+    return best
+
+
+def baseline_jokes_for(num_ideas: int, rubrics_per_idea: int, critiques_per_rubric: int = 0) -> int:
+    """Baseline jokes main.py generates for a configuration: as many as the multi-stage pipeline."""
+    return num_ideas * rubrics_per_idea * (1 + critiques_per_rubric)
+
+
+def format_duration(seconds: float) -> str:
+    return f"{seconds:.0f}s" if seconds < 90 else f"{seconds / 60:.1f} min"
+
+
+def format_plan(plan: dict) -> str:
+    """Human-readable multi-line summary of an estimate_run() result."""
+    config = plan["config"]
+    per_stage = ", ".join(f"{stage} {n}" for stage, n in plan["calls"].items() if n)
+    return (
+        f"ideas={config['ideas']} rubrics={config['rubrics']} critiques={config['critiques']} "
+        f"concurrency={config['concurrency']}"
+        + (f" cascade={config['cascade_keep']}" if "cascade_keep" in config else "")
+        + f" -> {plan['jokes']} jokes\n"
+        f"  LLM calls: {plan['total_calls']} ({per_stage})\n"
+        f"  Tokens: ~{plan['total_tokens']:,} ({plan['prompt_tokens']:,} prompt, "
+        f"{plan['completion_tokens']:,} completion)\n"
+        f"  Wall time: ~{format_duration(plan['seconds'])}"
+    )
@@ -0,0 +1,187 @@
+"""
+Opt-in profiling for pipeline runs (--profile in main.py and joke_judge.py).
+
+Two complementary views are recorded while the profiler is running:
+
+- cProfile statistics for every thread (the main thread and any thread
+  started while profiling, e.g. --concurrency workers), merged into one
+  .prof file for pstats, snakeviz or flameprof.
+- Trace spans per stage, per LLM request and per local step (parsing,
+  saving), exported as Chrome trace-event JSON (open in Perfetto,
+  chrome://tracing or speedscope). Each span carries its thread's CPU time,
+  so wall time splits into local CPU ("cpu_ms") and time spent blocked,
+  which for request spans is waiting on the server ("wait_ms").
+
+Spans are no-ops while profiling is off, so the hooks stay in place.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Profiler:
+    """Collects cProfile data and trace spans between start() and stop()."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._origin = 0.0
+        self._events = []
+        self._thread_names = {}
+        self._profiles = []
+        self._main_profile = None
+
+    def start(self):
+        self._origin = time.perf_counter()
+        self._events, self._thread_names, self._profiles = [], {}, []
+        self._main_profile = cProfile.Profile()
+        self._profiles.append(self._main_profile)
+        # The first profiler event in each new thread hands it over to its own profile
+        threading.setprofile(self._thread_hook)
+        self.enabled = True
+        self._main_profile.enable()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self._main_profile.disable()
+        threading.setprofile(None)
+        self.enabled = False
+
+    def _thread_hook(self, frame, event, arg):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    @contextmanager
+    def span(self, name: str, category: str = "local", **args):
+        """
+        Record a trace span around the body of the with statement.
+
+        Yields a dict of span arguments that the body can add to (e.g. token counts).
+        """
+        if not self.enabled:
+            yield {}
+            return
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield args
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu_start
+            thread = threading.current_thread()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round(wall * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": {**args, "cpu_ms": round(cpu * 1000, 3),
+                         "wait_ms": round(max(0.0, wall - cpu) * 1000, 3)},
+            }
+            with self._lock:
+                self._events.append(event)
+                self._thread_names[thread.ident] = thread.name
+
+    def trace_events(self) -> list:
+        """Recorded spans plus thread-name metadata in trace-event format."""
+        with self._lock:
+            events = list(self._events)
+            names = dict(self._thread_names)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in names.items()]
+        return metadata + sorted(events, key=lambda event: event["ts"])
+
+    def stats(self):
+        """Merged pstats.Stats of all profiled threads (None if nothing was profiled)."""
+        with self._lock:
+            profiles = list(self._profiles)
+        merged = None
+        for profile in profiles:
+            try:
+                stats = pstats.Stats(profile, stream=io.StringIO())
+            except TypeError:
+                # A thread that never ran any Python code after being handed its profile
+                continue
+            if merged is None:
+                merged = stats
+            else:
+                merged.add(stats)
+        return merged
+
+    def summary(self) -> dict:
+        """Per (category, name) totals: count, wall, local CPU and wait in seconds."""
+        totals = defaultdict(lambda: {"count": 0, "wall": 0.0, "cpu": 0.0, "wait": 0.0})
+        with self._lock:
+            events = list(self._events)
+        for event in events:
+            entry = totals[(event["cat"], event["name"])]
+            entry["count"] += 1
+            entry["wall"] += event["dur"] / 1e6
+            entry["cpu"] += event["args"]["cpu_ms"] / 1000
+            entry["wait"] += event["args"]["wait_ms"] / 1000
+        return {key: {name: round(value, 3) if isinstance(value, float) else value
+                      for name, value in entry.items()}
+                for key, entry in totals.items()}
+
+    def export(self, prefix: str = "profile", top: int = 15) -> dict:
+        """
+        Stop profiling, write <prefix>.trace.json and <prefix>.prof and print a summary.
+
+        Args:
+            prefix: Output path prefix
+            top: Functions to list by cumulative time
+
+        Returns:
+            Dictionary of the files written
+        """
+        self.stop()
+        written = {}
+        trace_path = f"{prefix}.trace.json"
+        try:
+            with open(trace_path, "w") as f:
+                json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+            written["trace"] = trace_path
+        except OSError as e:
+            print(f"Warning: could not write trace to {trace_path}: {e}")
+
+        stats = self.stats()
+        if stats is not None:
+            stats_path = f"{prefix}.prof"
+            try:
+                stats.dump_stats(stats_path)
+                written["cprofile"] = stats_path
+            except OSError as e:
+                print(f"Warning: could not write profile to {stats_path}: {e}")
+
+        print("\n===== PROFILE =====")
+        print(f"{'span':<36} {'count':>6} {'wall s':>9} {'cpu s':>9} {'wait s':>9}")
+        for (category, name), entry in sorted(self.summary().items(), key=lambda item: -item[1]["wall"]):
+            print(f"{(category + ': ' + name)[:36]:<36} {entry['count']:>6} {entry['wall']:>9.3f} "
+                  f"{entry['cpu']:>9.3f} {entry['wait']:>9.3f}")
+        if stats is not None:
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(top)
+            print(out.getvalue().strip())
+        for kind, path in written.items():
+            print(f"Wrote {kind} to {path}")
+        return written
+
+
+PROFILER = Profiler()
+
+
+def span(name: str, category: str = "local", **args):
+    """Trace span on the global profiler (a no-op unless profiling is running)."""
+    return PROFILER.span(name, category, **args)
@@ -0,0 +1,284 @@
+"""
+Compact in-memory record types for jokes, rubrics and judgments.
+
+The pipeline passes plain nested dicts around, which is fine for a single
+run but expensive for large sweeps: every joke repeats its theme and a
+metadata dict copying its rubric's type/tone/structure, and every judgment
+repeats the full joke text. The records below use __slots__, intern the
+low-cardinality strings (theme, type, tone, method, ...), share identical
+metadata/score layouts between the records of a RecordStore, and let a
+judgment reference its joke by id instead of copying its text.
+
+Every record converts losslessly to and from the existing JSON formats:
+key order and unknown keys are preserved, so
+json.dumps(Record.from_dict(d).to_dict()) == json.dumps(d).
+
+This is an opt-in library for tools that hold many runs in memory at once
+(see benchmarks/record_memory.py); the pipeline, joke_judge.py and
+joke_index.py still work on plain dicts.
+"""
+
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+def _share(value: tuple, shared: dict = None) -> tuple:
+    """
+    Return the canonical instance of an immutable tuple from a sharing table
+    (key layouts, metadata items, score keys), so equal tuples are stored once.
+    Tables belong to a RecordStore and are freed with it; without one nothing is shared.
+    """
+    return value if shared is None else shared.setdefault(value, value)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# Markers distinguishing frozen dicts/lists from plain tuples
+_DICT = object()
+_LIST = object()
+
+
+def _freeze(value):
+    """Convert nested JSON values into hashable tuples for sharing."""
+    if isinstance(value, dict):
+        return (_DICT,) + tuple((_intern(k), _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return (_LIST,) + tuple(_freeze(v) for v in value)
+    return _intern(value)
+
+
+def _thaw(value):
+    if isinstance(value, tuple):
+        if value and value[0] is _DICT:
+            return {k: _thaw(v) for k, v in value[1:]}
+        if value and value[0] is _LIST:
+            return [_thaw(v) for v in value[1:]]
+    return value
+
+
+class _Record:
+    """
+    Base for slotted records.
+
+    Subclasses list their JSON keys in _fields (JSON key -> slot name) and the
+    keys whose values should be interned in _interned. Keys not in _fields
+    are kept in `extra`; `_layout` remembers the original key order.
+    """
+
+    __slots__ = ("_layout", "extra")
+    _fields: Dict[str, str] = {}
+    _interned = frozenset()
+
+    def __init__(self):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+
+    def _decode(self, key: str, value, shared: dict = None):
+        """Hook for converting a JSON value into its compact form (tuples shared through shared)."""
+        return _intern(value) if key in self._interned else value
+
+    def _encode(self, key: str, value):
+        """Hook for converting a compact value back into its JSON form."""
+        return value
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], shared: dict = None, **context):
+        record = cls()
+        extra = None
+        for key, value in data.items():
+            slot = cls._fields.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                setattr(record, slot, record._decode(key, value, shared))
+        record.extra = extra
+        record._layout = _share(tuple(sys.intern(k) for k in data), shared)
+        return record
+
+    def to_dict(self, **context) -> Dict[str, Any]:
+        result = {}
+        for key in self._layout:
+            slot = self._fields.get(key)
+            if slot is None:
+                result[key] = self.extra[key]
+            else:
+                result[key] = self._encode(key, getattr(self, slot))
+        return result
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self._fields.values())
+        return f"{type(self).__name__}({fields})"
+
+
+class Rubric(_Record):
+    """A joke rubric (Stage 3) or critiqued/refined rubric (Stage 4)."""
+
+    __slots__ = ("id", "idea_id", "original_rubric_id", "type", "structure",
+                 "key_elements", "tone", "critique_of_original")
+    _fields = {name: name for name in __slots__}
+    _interned = frozenset({"idea_id", "original_rubric_id", "type", "tone"})
+
+    def _decode(self, key, value, shared=None):
+        if key == "key_elements" and isinstance(value, list):
+            return _share(_freeze(value), shared)
+        return super()._decode(key, value, shared)
+
+    def _encode(self, key, value):
+        if key == "key_elements":
+            return _thaw(value)
+        return value
+
+
+class Joke(_Record):
+    """A multi-stage joke (Stage 5). Metadata is a shared, interned tuple."""
+
+    __slots__ = ("id", "theme", "idea_id", "rubric_id", "text", "explanation", "metadata")
+    _fields = {name: name for name in __slots__}
+    _interned = frozenset({"theme", "idea_id", "rubric_id"})
+
+    def _decode(self, key, value, shared=None):
+        if key == "metadata" and isinstance(value, dict):
+            return _share(_freeze(value), shared)
+        return super()._decode(key, value, shared)
+
+    def _encode(self, key, value):
+        if key == "metadata":
+            return _thaw(value)
+        return value
+
+
+class BaselineJoke(_Record):
+    """A joke from the baseline generator."""
+
+    __slots__ = ("id", "prompt", "text", "type", "tone", "approach", "model", "method")
+    _fields = {name: name for name in __slots__}
+    _interned = frozenset({"prompt", "type", "tone", "model", "method"})
+
+
+class _Scores(NamedTuple):
+    """Compact form of a judgment's scores dict: shared key layout and values."""
+    keys: tuple
+    values: tuple
+
+
+class Judgment(_Record):
+    """
+    A judge verdict. The joke text is not stored: it is resolved from the
+    joke store by joke_id when the judgment is serialized.
+    """
+
+    __slots__ = ("joke_id", "method", "analysis", "scores", "overall", "_text_override")
+    _fields = {"joke_id": "joke_id", "method": "method", "text": "_text_override",
+               "analysis": "analysis", "scores": "scores", "overall": "overall"}
+    _interned = frozenset({"joke_id", "method"})
+
+    def _decode(self, key, value, shared=None):
+        if key == "scores" and isinstance(value, dict):
+            return _Scores(_share(tuple(sys.intern(k) for k in value), shared), tuple(value.values()))
+        return super()._decode(key, value, shared)
+
+    def _encode(self, key, value):
+        if key == "scores" and isinstance(value, _Scores):
+            return dict(zip(value.keys, value.values))
+        return value
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], store: "RecordStore" = None, **context):
+        record = super().from_dict(data, shared=store._shared if store is not None else None)
+        text = record._text_override
+        if text is not None and store is not None:
+            # Drop the copy when the store already holds the same text
+            known = store.text_for(record.joke_id)
+            if known is None:
+                store.add_text(record.joke_id, text)
+                record._text_override = None
+            elif known == text:
+                record._text_override = None
+        return record
+
+    def to_dict(self, store: "RecordStore" = None, **context) -> Dict[str, Any]:
+        result = super().to_dict()
+        if "text" in result and result["text"] is None:
+            result["text"] = store.text_for(self.joke_id) if store is not None else None
+        return result
+
+    def score(self, param: str, default=None):
+        if not isinstance(self.scores, _Scores):
+            return default
+        for key, value in zip(self.scores.keys, self.scores.values):
+            if key == param:
+                return value
+        return default
+
+
+class RecordStore:
+    """
+    Holds jokes by id so judgments can reference them instead of copying text.
+
+    Usage:
+        store = RecordStore()
+        results = store.load_results(json.load(open("results.json")))
+        judgments = store.load_judgments(json.load(open("joke_judgments.json")))
+        json.dump(store.dump_judgments(judgments), f, indent=2)
+    """
+
+    def __init__(self):
+        self.jokes: Dict[str, _Record] = {}
+        self._orphan_texts: Dict[str, str] = {}
+        # Sharing table for this store's records; freed with the store
+        self._shared: Dict[tuple, tuple] = {}
+
+    def text_for(self, joke_id: str) -> Optional[str]:
+        joke = self.jokes.get(joke_id)
+        if joke is not None:
+            return joke.text
+        return self._orphan_texts.get(joke_id)
+
+    def add_text(self, joke_id: str, text: str):
+        """Remember the text of a joke that is only known through its judgments."""
+        self._orphan_texts[joke_id] = text
+
+    def add_joke(self, joke: _Record) -> _Record:
+        if joke.id is not None:
+            self.jokes[joke.id] = joke
+            self._orphan_texts.pop(joke.id, None)
+        return joke
+
+    def load_results(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a multi-stage results file; rubrics and jokes become records."""
+        converted = dict(data)
+        if "rubrics" in data:
+            converted["rubrics"] = [Rubric.from_dict(r, shared=self._shared) for r in data["rubrics"]]
+        if "jokes" in data:
+            converted["jokes"] = [self.add_joke(Joke.from_dict(j, shared=self._shared)) for j in data["jokes"]]
+        return converted
+
+    def dump_results(self, converted: Dict[str, Any]) -> Dict[str, Any]:
+        data = dict(converted)
+        for key in ("rubrics", "jokes"):
+            if key in converted:
+                data[key] = [record.to_dict() for record in converted[key]]
+        return data
+
+    def load_baseline(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a baseline results file; jokes become BaselineJoke records."""
+        converted = dict(data)
+        if "jokes" in data:
+            converted["jokes"] = [self.add_joke(BaselineJoke.from_dict(j, shared=self._shared)) for j in data["jokes"]]
+        return converted
+
+    def dump_baseline(self, converted: Dict[str, Any]) -> Dict[str, Any]:
+        data = dict(converted)
+        if "jokes" in converted:
+            data["jokes"] = [record.to_dict() for record in converted["jokes"]]
+        return data
+
+    def load_judgments(self, data: Dict[str, Any]) -> List[Judgment]:
+        return [Judgment.from_dict(j, store=self) for j in data.get("judgments", [])]
+
+    def dump_judgments(self, judgments: List[Judgment]) -> Dict[str, Any]:
+        return {"judgments": [j.to_dict(store=self) for j in judgments]}
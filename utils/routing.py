@@ -0,0 +1,116 @@
+"""
+Per-stage model, endpoint and sampling routes.
+
+Every generation stage uses DEFAULT_MODEL on the generator backend pool, but
+observations and critique bookkeeping do not need the model that writes the
+final jokes. A route gives one stage its own model, endpoint (base URL) and
+sampling settings (temperature, top_p), so cheap stages can run on a small
+fast model.
+
+Routes come from MODEL_<STAGE>, BASE_URL_<STAGE>, TEMPERATURE_<STAGE> and
+TOP_P_<STAGE> in the environment, or from a JSON routing file (main.py
+--routing FILE) whose routes replace the environment's for the stages it
+names:
+
+    {"observations": {"model": "gemma-3-1b-it", "base_url": "http://localhost:1235/v1/"},
+     "critiques": {"model": "gemma-3-1b-it", "temperature": 0.5}}
+
+chat_completion and stream_chat_completion apply a stage's route to every
+call of that stage: routed sampling settings replace the caller's, and for
+generator stages the routed model and endpoint replace DEFAULT_MODEL and the
+backend pool. The judge keeps its own client; its route sets JokeJudge's
+default model and endpoint instead.
+"""
+
+import json
+import threading
+
+STAGES = ("observations", "ideas", "rubrics", "critiques", "jokes", "drafts", "refine", "baseline", "judge")
+ROUTE_KEYS = ("model", "base_url", "temperature", "top_p")
+
+# Stages whose routes change what the multi-stage pipeline generates
+GENERATION_STAGES = ("observations", "ideas", "rubrics", "critiques", "jokes", "drafts", "refine")
+
+_routes = None
+_routes_lock = threading.Lock()
+
+
+def _validate(routes: dict) -> dict:
+    """Check stage names and route keys; returns the routes with empty values dropped."""
+    if not isinstance(routes, dict):
+        raise ValueError("Routing must map stage names to routes")
+    validated = {}
+    for stage, route in routes.items():
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r} in routing (stages: {', '.join(STAGES)})")
+        if not isinstance(route, dict):
+            raise ValueError(f"Route for {stage!r} must be an object")
+        unknown = set(route) - set(ROUTE_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown route keys for {stage!r}: {', '.join(sorted(unknown))}")
+        route = {key: value for key, value in route.items() if value not in (None, "")}
+        for key in ("temperature", "top_p"):
+            if key in route:
+                route[key] = float(route[key])
+        if route:
+            validated[stage] = route
+    return validated
+
+
+def configure_routing(routes: dict = None):
+    """
+    Set the routes for this process, on top of the environment's.
+
+    Args:
+        routes: Mapping of stage to route ({"model", "base_url", "temperature", "top_p"});
+                None restores the environment's routes
+
+    Raises:
+        ValueError: Unknown stage or route key
+    """
+    global _routes
+    from utils.config import STAGE_ROUTES
+    merged = {stage: dict(route) for stage, route in STAGE_ROUTES.items()}
+    merged.update(_validate(routes or {}))
+    with _routes_lock:
+        _routes = merged
+
+
+def load_routing_file(path: str) -> dict:
+    """
+    Read routes from a JSON routing file.
+
+    Raises:
+        ValueError: The file is not valid JSON or names unknown stages or keys
+    """
+    with open(path) as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from e
+    return _validate(data)
+
+
+def stage_route(stage: str) -> dict:
+    """The route configured for a stage (empty if it has none)."""
+    if _routes is None:
+        with _routes_lock:
+            configured = _routes is not None
+        if not configured:
+            configure_routing()
+    return dict(_routes.get(stage, {}))
+
+
+def routing_signature() -> dict:
+    """Routes of the generation stages, for keying cached stage outputs."""
+    return {stage: route for stage in GENERATION_STAGES if (route := stage_route(stage))}
+
+
+def describe_routes() -> str:
+    """One line per routed stage, for the run configuration summary."""
+    lines = []
+    for stage in STAGES:
+        route = stage_route(stage)
+        if route:
+            lines.append(f"  - {stage}: " + ", ".join(f"{key}={route[key]}" for key in ROUTE_KEYS if key in route))
+    return "\n".join(lines)
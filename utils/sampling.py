@@ -0,0 +1,154 @@
+"""
+Judge-sample selection and sequential stopping.
+
+Judging every joke is expensive and judging the first few is biased towards
+whatever the pipeline produced first (usually the first idea). Instead,
+stratified_order() shuffles jokes within strata (idea, joke type, tone) and
+interleaves the strata proportionally, so every prefix of the order is an
+approximately proportional stratified sample. The judge walks that order
+round by round and a SequentialComparison decides when the confidence
+interval on the difference in mean Overall score between the two methods is
+narrow enough to stop.
+"""
+
+import math
+import random
+import re
+import statistics
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+
+def _tone_key(tone: str) -> str:
+    """Reduce a free-text tone ("Dry, slightly absurd, ...") to its leading word."""
+    words = re.findall(r"[a-z]+", (tone or "").lower())
+    return words[0] if words else ""
+
+
+def stratum_key(joke: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    Stratum of a joke in the standardized judge format: (idea, joke type, tone).
+
+    Multi-stage jokes carry their idea and rubric; baseline jokes only have
+    type and tone in their metadata.
+    """
+    metadata = joke.get("metadata") or {}
+    rubric = joke.get("rubric") or {}
+    idea = (joke.get("idea") or {}).get("concept", "")
+    joke_type = rubric.get("type") or metadata.get("joke_type") or metadata.get("type") or ""
+    tone = rubric.get("tone") or metadata.get("tone") or ""
+    return idea, joke_type.strip().lower(), _tone_key(tone)
+
+
+def stratified_order(jokes: List[Dict[str, Any]], seed: int = None) -> List[Dict[str, Any]]:
+    """
+    Order jokes so that every prefix is a proportional stratified sample.
+
+    Each stratum is shuffled, and its k-th joke is placed at position
+    (k + u) / stratum_size for a random offset u (systematic allocation), so a
+    prefix of length n holds about n * stratum_size / len(jokes) jokes from
+    every stratum.
+
+    Args:
+        jokes: Jokes in the standardized judge format
+        seed: Random seed for reproducible samples
+
+    Returns:
+        The jokes in sampling order
+    """
+    rng = random.Random(seed)
+    strata = defaultdict(list)
+    for joke in jokes:
+        strata[stratum_key(joke)].append(joke)
+
+    positioned = []
+    for members in strata.values():
+        rng.shuffle(members)
+        offset = rng.random()
+        for k, joke in enumerate(members):
+            positioned.append(((k + offset) / len(members), rng.random(), joke))
+    positioned.sort(key=lambda item: item[:2])
+    return [joke for _, _, joke in positioned]
+
+
+def stratified_sample(jokes: List[Dict[str, Any]], n: int, seed: int = None) -> List[Dict[str, Any]]:
+    """Proportional stratified sample of n jokes (all jokes if n <= 0 or n >= len(jokes))."""
+    ordered = stratified_order(jokes, seed)
+    return ordered if n <= 0 else ordered[:n]
+
+
+def _t_quantile(p: float, df: float) -> float:
+    """Student t quantile via the Cornish-Fisher expansion around the normal quantile."""
+    z = statistics.NormalDist().inv_cdf(p)
+    if df <= 0 or math.isinf(df):
+        return z
+    return (z + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+class SequentialComparison:
+    """
+    Welch confidence interval on the difference in mean score between two
+    methods, updated as judgments arrive.
+
+    Args:
+        method_a: First method (difference is a - b)
+        method_b: Second method
+        confidence: Confidence level of the interval
+        max_half_width: Stop once the interval's half-width is at most this
+        min_per_method: Judgments required per method before stopping
+    """
+
+    def __init__(self, method_a: str = "multi-stage", method_b: str = "baseline",
+                 confidence: float = 0.95, max_half_width: float = 0.5, min_per_method: int = 5):
+        self.method_a = method_a
+        self.method_b = method_b
+        self.confidence = confidence
+        self.max_half_width = max_half_width
+        self.min_per_method = max(2, min_per_method)
+        self.scores = {method_a: [], method_b: []}
+
+    def add(self, method: str, score: float):
+        if method in self.scores:
+            self.scores[method].append(float(score))
+
+    def interval(self):
+        """
+        Returns:
+            (difference, low, high), or None until both methods have 2+ scores
+        """
+        a, b = self.scores[self.method_a], self.scores[self.method_b]
+        if len(a) < 2 or len(b) < 2:
+            return None
+        var_a, var_b = statistics.variance(a) / len(a), statistics.variance(b) / len(b)
+        difference = statistics.mean(a) - statistics.mean(b)
+        se = math.sqrt(var_a + var_b)
+        if se == 0:
+            return difference, difference, difference
+        # Welch-Satterthwaite degrees of freedom
+        df = (var_a + var_b) ** 2 / (var_a ** 2 / (len(a) - 1) + var_b ** 2 / (len(b) - 1))
+        half_width = _t_quantile(1 - (1 - self.confidence) / 2, df) * se
+        return difference, difference - half_width, difference + half_width
+
+    def should_stop(self) -> bool:
+        if min(len(scores) for scores in self.scores.values()) < self.min_per_method:
+            return False
+        ci = self.interval()
+        return ci is not None and (ci[2] - ci[1]) / 2 <= self.max_half_width
+
+    def summary(self) -> Dict[str, Any]:
+        ci = self.interval()
+        result = {
+            "judged": {method: len(scores) for method, scores in self.scores.items()},
+            "confidence": self.confidence,
+            "max_half_width": self.max_half_width,
+        }
+        if ci is not None:
+            result.update({
+                "difference": round(ci[0], 3),
+                "ci_low": round(ci[1], 3),
+                "ci_high": round(ci[2], 3),
+                "half_width": round((ci[2] - ci[1]) / 2, 3),
+            })
+        return result
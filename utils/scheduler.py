@@ -0,0 +1,95 @@
+"""
+Priority scheduling of the per-idea stage calls (Stages 3-5).
+
+The pipeline's rubric, critique and joke calls form one small dependency
+tree per idea: an idea's rubrics unlock its critiques and a joke per
+rubric; its critiques unlock a joke per refined rubric. StageScheduler runs
+these calls on a fixed set of worker threads and, whenever a worker is
+free, starts the ready call with the best priority under the policy:
+
+- "depth": the deepest stage first (jokes, then critiques, then rubrics),
+  earlier ideas first. Chains complete as early as possible, so the first
+  joke arrives after one rubric call and one joke call.
+- "breadth": the earliest stage first, earlier ideas first. Same-stage calls
+  are sent together, which suits servers that batch similar requests, at
+  the cost of every joke arriving near the end.
+"""
+
+import heapq
+import itertools
+import threading
+
+POLICIES = ("depth", "breadth")
+
+# Depth of each stage in an idea's dependency tree
+STAGE_DEPTH = {"rubrics": 0, "critiques": 1, "jokes": 2}
+
+
+class StageScheduler:
+    """
+    Runs stage calls on worker threads, always starting the ready call with
+    the best priority under the policy.
+
+    Args:
+        workers: Number of calls run at once
+        policy: "depth" or "breadth"
+    """
+
+    def __init__(self, workers: int, policy: str = "depth"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy {policy!r}")
+        self.workers = max(1, workers)
+        self.policy = policy
+        self._ready = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._error = None
+        self._cond = threading.Condition()
+
+    def submit(self, stage: str, idea_index: int, fn, *args):
+        """
+        Queue fn(*args) as a call of the given stage for an idea.
+
+        Tasks may submit their follow-up calls; run() returns once no task
+        is queued or running.
+        """
+        depth = STAGE_DEPTH[stage]
+        priority = (-depth if self.policy == "depth" else depth, idea_index, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._ready, (priority, fn, args))
+            self._pending += 1
+            self._cond.notify()
+
+    def run(self):
+        """
+        Run queued tasks (and the tasks they submit) until none are left.
+
+        Raises:
+            The first exception raised by a task, once running tasks have finished
+        """
+        threads = [threading.Thread(target=self._work, name=f"stage-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and self._pending and self._error is None:
+                    self._cond.wait()
+                if not self._pending or self._error is not None:
+                    return
+                _, fn, args = heapq.heappop(self._ready)
+            try:
+                fn(*args)
+            except Exception as e:
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
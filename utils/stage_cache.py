@@ -0,0 +1,157 @@
+"""
+Content-addressed cache of stage outputs for incremental re-runs.
+
+Every stage call is keyed by a hash of its inputs (theme, upstream outputs,
+fan-out arguments), the generator model and stage routes, and the stage's
+prompt fingerprint: the PROMPT_VERSION of the stage module plus a hash of
+the stage function's source. A re-run with --incremental reuses the stored
+output when the key matches, so editing the Stage 5 prompt in
+generate_joke_from_rubric only recomputes jokes, while observations, ideas
+and rubrics come from the cache.
+Because downstream keys include upstream outputs, anything that is
+recomputed upstream invalidates exactly the items that depend on it.
+
+Only the stage function's own source is hashed, so a stage module's
+PROMPT_VERSION must be bumped after changing prompt text that lives outside
+the stage function (shared system prompts, helper functions); otherwise
+incremental re-runs keep serving outputs of the old prompt.
+
+Results that came back short are not stored, so one transient failure does
+not stick: empty outputs, fallbacks, and lists from which the stage pruned
+items or skipped calls. The file keeps at most STAGE_CACHE_MAX_ENTRIES
+entries, evicting the least recently used.
+"""
+
+import hashlib
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+CACHE_FORMAT = 1
+
+
+def stage_fingerprint(fn) -> str:
+    """PROMPT_VERSION of fn's module plus a short hash of fn's source."""
+    module = sys.modules.get(fn.__module__)
+    version = getattr(module, "PROMPT_VERSION", 0)
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        source = fn.__qualname__
+    return f"{version}:{hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _cacheable(result) -> bool:
+    from utils.fallback import is_fallback
+    if not result or is_fallback(result):
+        return False
+    if isinstance(result, tuple):
+        # Multi-output stages (speculative ideas): every output must be complete
+        return all(_cacheable(item) for item in result)
+    if isinstance(result, list):
+        return not any(is_fallback(item) for item in result)
+    return True
+
+
+class StageCache:
+    """
+    Thread-safe stage output cache persisted as JSON.
+
+    Args:
+        path: Cache file (default: STAGE_CACHE_FILE from configuration)
+        enabled: When False, call() always runs the stage and stores nothing
+        max_entries: Entries kept on save, least recently used evicted first
+                     (default: STAGE_CACHE_MAX_ENTRIES from configuration; 0 keeps all)
+    """
+
+    def __init__(self, path: str = None, enabled: bool = True, max_entries: int = None):
+        if path is None:
+            from utils.config import STAGE_CACHE_FILE
+            path = STAGE_CACHE_FILE
+        if max_entries is None:
+            from utils.config import STAGE_CACHE_MAX_ENTRIES
+            max_entries = STAGE_CACHE_MAX_ENTRIES
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.reused = Counter()
+        self.computed = Counter()
+        if enabled:
+            self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("format") == CACHE_FORMAT:
+            self._entries = data.get("entries", {})
+
+    def key(self, stage: str, fingerprint: str, inputs) -> str:
+        from utils.config import DEFAULT_MODEL
+        from utils.routing import routing_signature
+        key_parts = [stage, fingerprint, DEFAULT_MODEL, inputs]
+        routes = routing_signature()
+        if routes:
+            # Only routed runs key on their routes, so unrouted cache entries stay valid
+            key_parts.append(routes)
+        payload = json.dumps(key_parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def call(self, stage: str, fn, *args, **kwargs):
+        """
+        Return fn(*args, **kwargs), reusing the stored output for identical inputs.
+
+        Outputs that are empty, contain fallback placeholders or lost items
+        to pruning or skipped calls are never stored.
+        """
+        from utils.fallback import FALLBACKS
+        from utils.profiling import span
+
+        if not self.enabled:
+            with span(stage, "stage"):
+                return fn(*args, **kwargs)
+
+        key = self.key(stage, stage_fingerprint(fn), [args, kwargs])
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self.reused[stage] += 1
+                entry["used"] = time.time()
+            # Hand out a fresh copy so callers cannot mutate the stored output
+            return json.loads(json.dumps(entry["output"]))
+
+        dropped = FALLBACKS.dropped_in_thread()
+        with span(stage, "stage"):
+            result = fn(*args, **kwargs)
+        complete = FALLBACKS.dropped_in_thread() == dropped
+        with self._lock:
+            self.computed[stage] += 1
+            if complete and _cacheable(result):
+                self._entries[key] = {"stage": stage, "output": json.loads(json.dumps(result)), "used": time.time()}
+        return result
+
+    def save(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.max_entries and len(self._entries) > self.max_entries:
+                recent = sorted(self._entries.items(), key=lambda item: item[1].get("used", 0), reverse=True)
+                self._entries = dict(recent[:self.max_entries])
+            data = {"format": CACHE_FORMAT, "entries": self._entries}
+        try:
+            self.path.write_text(json.dumps(data))
+        except OSError as e:
+            print(f"Warning: could not save stage cache to {self.path}: {e}")
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = sorted(set(self.reused) | set(self.computed))
+            return {stage: {"reused": self.reused[stage], "computed": self.computed[stage]} for stage in stages}